@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2022 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+"""
+Microbenchmark of the JSON encoder used to format the log entries,
+against the previous encoder that post-processed the output of the
+standard JSON encoder with chained ``str.replace()`` calls.
+
+Run from the project folder with::
+
+    $ python benchmarks/bench_jsondec.py [-n NUMBER]
+"""
+
+import os, sys, argparse, timeit
+from datetime import datetime
+from uuid import UUID
+from bson import ObjectId, DBRef, regex, MinKey, Int64
+from bson.decimal128 import Decimal128
+from bson.timestamp import Timestamp
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mongotail.jsondec import JSONEncoder
+from tests.legacy import LegacyJSONEncoder
+
+
+def sample_docs():
+    oid = ObjectId("548b164144ae122dc430376b")
+    now = datetime(2023, 5, 12, 19, 17, 1, 194000)
+    small = {"_id": oid}
+    filter_doc = {
+        "active": {"$exists": True}, "firstName": regex.Regex("^mac"),
+        "created": {"$gte": now}, "score": {"$gt": 1.5, "$lt": Int64(10)},
+        "tags": {"$in": ["a", "b", "cé"]}, "deleted": None,
+    }
+    types_doc = {
+        "oid": oid, "uuid": UUID("3f9a1a4e-0b2d-4c1e-9a6b-1f2e3d4c5b6a"),
+        "ref": DBRef("users", oid), "ts": Timestamp(1683919021, 3),
+        "dec": Decimal128("1234.5678"), "min": MinKey(), "bin": b"\x00\x01binary",
+        "nan": float("nan"), "inf": float("inf"), "empty": {}, "list": [],
+    }
+    insert_batch = [{"_id": ObjectId(), "n": i, "name": "user%d" % i, "at": now,
+                     "address": {"street": "Main St", "number": i, "geo": [1.25, -3.5]}}
+                    for i in range(1000)]
+    pipeline = [{"$match": filter_doc}, {"$sort": {"created": -1}},
+                {"$group": {"_id": "$firstName", "total": {"$sum": 1}}},
+                {"$lookup": {"from": "orders", "localField": "_id",
+                             "foreignField": "user", "as": "orders"}},
+                {"$limit": 100}]
+    return [
+        ("small filter", small),
+        ("find filter", filter_doc),
+        ("bson types", types_doc),
+        ("pipeline", pipeline),
+        ("1000 docs insert", insert_batch),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSONEncoder microbenchmark")
+    parser.add_argument("-n", "--number", type=int, default=2000,
+                        help="number of encodings of each document (default 2000, "
+                             "and 1/100 of it for the big documents)")
+    args = parser.parse_args()
+
+    encoder = JSONEncoder()
+    legacy = LegacyJSONEncoder()
+    sys.stdout.write("%-18s %12s %12s %8s\n" % ("document", "legacy us", "current us", "speedup"))
+    for name, doc in sample_docs():
+        if encoder.encode(doc) != legacy.encode(doc):
+            sys.stderr.write("Output of %s differs from the legacy encoder\n" % name)
+            sys.exit(1)
+        number = args.number if len(encoder.encode(doc)) < 10000 else max(args.number // 100, 1)
+        legacy_time = min(timeit.repeat(lambda: legacy.encode(doc), number=number, repeat=5)) / number
+        current_time = min(timeit.repeat(lambda: encoder.encode(doc), number=number, repeat=5)) / number
+        sys.stdout.write("%-18s %12.2f %12.2f %7.2fx\n" % (name, legacy_time * 1e6, current_time * 1e6,
+                                                        legacy_time / current_time))
+
+
+if __name__ == "__main__":
+    main()
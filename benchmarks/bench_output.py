@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+"""
+Benchmark of the formatting of the log entries (``out.print_obj()``
+and the JSON encoder), with the synthetic corpora of :mod:`corpus`
+for each MongoDB version, operation and size class.
+
+Each case is measured in the default output, the verbose output
+(``-v``) and with metadata fields (``-m``), and the results are
+printed in records/sec and MB/sec of output. The results can
+be saved as a baseline and compared in the next runs to spot
+regressions. Run from the project folder with::
+
+    $ python benchmarks/bench_output.py --save baseline.json
+    ... after some changes:
+    $ python benchmarks/bench_output.py --baseline baseline.json
+"""
+
+import os, sys, json, argparse
+from timeit import default_timer
+import bson
+from bson.raw_bson import RawBSONDocument
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mongotail import out
+from mongotail.out import Output, print_obj, get_formatters
+from corpus import VERSIONS, OPERATIONS, SIZES, corpus
+
+
+MODES = {
+    # mode: (verbose, metadata)
+    "default": (False, None),
+    "verbose": (True, None),
+    "metadata": (False, ["millis", "docsExamined", "keysExamined", "planSummary", "locks"]),
+}
+ENTRIES = {
+    # Entries generated of each size class
+    "tiny": 1000,
+    "medium": 100,
+    "large": 2,
+}
+SERVER_VERSIONS = {"3.0": "3.0.15", "3.4": "3.4.24", "4.4": "4.4.22"}
+
+
+class CountingStream(object):
+    """
+    Output stream that discards the text written, counting the bytes.
+    """
+
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, text):
+        self.bytes += len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def run_case(entries, formatters, verbose, metadata, min_time):
+    """
+    Format `entries` until at least `min_time` seconds have elapsed,
+    three times, and return the best result as the tuple
+    ``(records/sec, bytes/sec)``.
+    """
+    best = None
+    for _ in range(3):
+        stream = CountingStream()
+        out.output = Output(stream, line_buffered=False)
+        records = 0
+        start = default_timer()
+        while True:
+            for obj in entries:
+                print_obj(obj, verbose, metadata, formatters)
+            records += len(entries)
+            elapsed = default_timer() - start
+            if elapsed >= min_time:
+                break
+        out.output.flush()
+        result = (records / elapsed, stream.bytes / elapsed)
+        if best is None or result[0] > best[0]:
+            best = result
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Log formatting benchmark")
+    parser.add_argument("--version", nargs="*", choices=VERSIONS, default=VERSIONS,
+                        help="MongoDB versions of the corpora (default all)")
+    parser.add_argument("--op", nargs="*", choices=OPERATIONS, default=OPERATIONS,
+                        help="operations of the corpora (default all)")
+    parser.add_argument("--size", nargs="*", choices=list(SIZES), default=list(SIZES),
+                        help="size classes of the corpora (default all)")
+    parser.add_argument("--mode", nargs="*", choices=list(MODES), default=list(MODES),
+                        help="output modes (default all)")
+    parser.add_argument("--lazy", action="store_true",
+                        help="format the entries as raw BSON documents, "
+                             "like when --lazy-decode is used")
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="minimum seconds to run each case (default 0.2)")
+    parser.add_argument("--save", metavar="FILE", help="save the results as a baseline in FILE")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="compare the results with the baseline saved in FILE")
+    parser.add_argument("--tolerance", type=float, default=10,
+                        help="percentage of records/sec lower than the baseline reported "
+                             "as a regression (default 10)")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        if saved["lazy"] != args.lazy:
+            parser.error("the baseline was saved %s --lazy" % ("with" if saved["lazy"] else "without"))
+        baseline = saved["results"]
+
+    results = {}
+    regressions = []
+    sys.stdout.write("%-34s %12s %10s %9s\n" % ("case", "records/s", "MB/s",
+                                                "baseline" if baseline else ""))
+    for version in args.version:
+        formatters = get_formatters(SERVER_VERSIONS[version])
+        for op in args.op:
+            for size in args.size:
+                entries = corpus(version, op, size, ENTRIES[size])
+                if args.lazy:
+                    entries = [RawBSONDocument(bson.encode(obj)) for obj in entries]
+                for mode in args.mode:
+                    verbose, metadata = MODES[mode]
+                    name = "%s %s %s %s" % (version, op, size, mode)
+                    records_sec, bytes_sec = run_case(entries, formatters, verbose, metadata,
+                                                      args.min_time)
+                    results[name] = {"records_sec": records_sec, "bytes_sec": bytes_sec}
+                    diff = ""
+                    if name in baseline:
+                        change = (records_sec / baseline[name]["records_sec"] - 1) * 100
+                        diff = "%+8.1f%%" % change
+                        if change < -args.tolerance:
+                            regressions.append(name)
+                            diff += " !"
+                    sys.stdout.write("%-34s %12.1f %10.2f %9s\n" % (name, records_sec,
+                                                                    bytes_sec / 1e6, diff))
+                    sys.stdout.flush()
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"python": sys.version.split()[0], "lazy": args.lazy, "results": results},
+                      f, indent=2, sort_keys=True)
+    if regressions:
+        sys.stderr.write("%d cases are more than %s%% slower than the baseline:\n  %s\n"
+                         % (len(regressions), args.tolerance, "\n  ".join(regressions)))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+
+"""
+Benchmark of the startup of the ``mongotail`` command, with the
+import times reported by ``python -X importtime``.
+
+Each case runs the command in a new process, like the console script
+does, and reports the time spent importing modules and the whole
+run. The commands that don't connect with a server (``--version``
+and ``--help``) must not import PyMongo, BSON or res-address, and the
+ones that don't print the log (``--level status`` and ``--advise``,
+run against a closed port) must not import the modules to format it:
+the exit status is 1 if they do, or if any case takes more than the
+limit given. Run from the project folder with::
+
+    $ python benchmarks/bench_startup.py
+    $ python benchmarks/bench_startup.py --max-ms 30 --modules 10
+"""
+
+import os, sys, time, argparse, subprocess
+
+PROJECT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Code run in each process, like the "mongotail" console script
+SCRIPT = "import sys; sys.argv[0] = 'mongotail'; from mongotail.mongotail import main; main()"
+
+# Server that is never there, the commands fail right after connecting
+ADDRESS = "mongodb://127.0.0.1:1/test?serverSelectionTimeoutMS=1"
+
+# Modules to format the log
+FORMAT_MODULES = ("mongotail.out", "mongotail.jsondec", "mongotail.filters")
+
+CASES = {
+    # case: (arguments, must not import the heavy modules, modules that must not be imported)
+    "version": (["--version"], True, ()),
+    "help": (["--help"], True, ()),
+    "level": ([ADDRESS, "--level", "status"], False, FORMAT_MODULES),
+    "advise": ([ADDRESS, "--advise"], False, FORMAT_MODULES),
+    # All the modules needed to print the log, for reference
+    "import-all": (None, False, ()),
+}
+IMPORT_ALL = ("import mongotail.mongotail, mongotail.conn, mongotail.out, mongotail.formats, "
+              "mongotail.top, mongotail.exporter, mongotail.capture, mongotail.sampling, mongotail.merge")
+HEAVY_MODULES = ("pymongo", "bson", "res_address")
+
+
+def run_case(arguments):
+    """
+    Run the command with `arguments` in a new process, and return the
+    tuple ``(wall seconds, import seconds, {module: cumulative seconds})``.
+    """
+    if arguments is None:
+        command = [sys.executable, "-X", "importtime", "-c", IMPORT_ALL]
+    else:
+        command = [sys.executable, "-X", "importtime", "-c", SCRIPT] + arguments
+    start = time.perf_counter()
+    proc = subprocess.run(command, cwd=PROJECT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+    wall = time.perf_counter() - start
+    imported = 0.0
+    modules = {}
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        imported += int(self_us) / 1e6
+        modules[name.strip()] = int(cumulative_us) / 1e6
+    return wall, imported, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup benchmark")
+    parser.add_argument("--case", nargs="*", choices=list(CASES), default=list(CASES),
+                        help="cases to run (default all)")
+    parser.add_argument("--runs", type=int, default=5,
+                        help="times each case is run, the best one is reported (default 5)")
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="max milliseconds importing modules in the cases that don't connect "
+                             "with a server, exit with status 1 if it's exceeded")
+    parser.add_argument("--modules", type=int, default=0, metavar="N",
+                        help="show the N modules that take more time to import in each case")
+    args = parser.parse_args()
+
+    failures = []
+    sys.stdout.write("%-12s %10s %12s %8s\n" % ("case", "wall ms", "imports ms", "modules"))
+    for case in args.case:
+        arguments, light, forbidden = CASES[case]
+        wall, imported, modules = min((run_case(arguments) for _ in range(args.runs)),
+                                      key=lambda result: result[0])
+        sys.stdout.write("%-12s %10.1f %12.1f %8d\n" % (case, wall * 1000, imported * 1000, len(modules)))
+        for name, seconds in sorted(modules.items(), key=lambda item: -item[1])[:args.modules]:
+            sys.stdout.write("    %-40s %8.1f ms\n" % (name, seconds * 1000))
+        unexpected = [name for name in (HEAVY_MODULES if light else ()) + forbidden if name in modules]
+        if unexpected:
+            failures.append("%s: imports %s" % (case, ", ".join(unexpected)))
+        if light and args.max_ms is not None and imported * 1000 > args.max_ms:
+            failures.append("%s: %.1f ms importing modules, more than %s ms"
+                            % (case, imported * 1000, args.max_ms))
+        sys.stdout.flush()
+
+    if failures:
+        sys.stderr.write("%d checks failed:\n  %s\n" % (len(failures), "\n  ".join(failures)))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+"""
+Synthetic corpora of profiler entries, used by the benchmarks.
+
+The entries are generated with the shape each MongoDB version
+records in the ``system.profile`` collection, so all the branches
+of the formatters are exercised:
+
+- ``3.0``: MongoDB < 3.2, the query is recorded in the ``query`` field
+  and updates in ``updateobj``.
+- ``3.4``: MongoDB 3.2 - 3.4, ``find`` and ``insert`` commands recorded
+  in the ``query`` field.
+- ``4.4``: MongoDB 3.6+, all the operations recorded in the ``command``
+  field.
+
+Each operation is generated in different size classes, from tiny
+filters to inserts of 10k documents and deep aggregation pipelines.
+The generator is seeded, so the same corpus is built on each run.
+"""
+
+import random
+from datetime import datetime, timedelta
+from bson import ObjectId, Int64, regex
+from bson.decimal128 import Decimal128
+
+
+VERSIONS = ("3.0", "3.4", "4.4")
+OPERATIONS = ("find", "update", "insert", "remove", "count", "distinct",
+              "aggregate", "findAndModify", "group", "mapReduce")
+SIZES = {
+    # size: (fields of the filters, documents inserted, stages of the pipelines)
+    "tiny": (1, 1, 1),
+    "medium": (8, 100, 6),
+    "large": (40, 10000, 30),
+}
+
+DB = "shop"
+COLLECTIONS = ("users", "orders", "products", "events", "sessions")
+WORDS = ("alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel")
+START = datetime(2023, 5, 12, 19, 17, 1, 194000)
+
+
+class ProfileGenerator(object):
+    """
+    Generate profiler entries of a MongoDB `version`, one of
+    :data:`VERSIONS`.
+    """
+
+    def __init__(self, version, seed=1):
+        self.version = version
+        self.rand = random.Random(seed)
+        self.ts = START
+
+    def oid(self):
+        return ObjectId(bytes(bytearray(self.rand.getrandbits(8) for _ in range(12))))
+
+    def word(self):
+        return self.rand.choice(WORDS)
+
+    def value(self, depth=0):
+        kind = self.rand.randint(0, 7 if depth < 2 else 5)
+        if kind == 0:
+            return self.rand.randint(0, 100000)
+        if kind == 1:
+            return Int64(self.rand.getrandbits(40))
+        if kind == 2:
+            return self.rand.random() * 1000
+        if kind == 3:
+            return "%s %s" % (self.word(), self.word())
+        if kind == 4:
+            return START - timedelta(seconds=self.rand.randint(0, 10 ** 7))
+        if kind == 5:
+            return self.oid()
+        if kind == 6:
+            return [self.value(depth + 1) for _ in range(self.rand.randint(1, 4))]
+        return {"%s%d" % (self.word(), i): self.value(depth + 1)
+                for i in range(self.rand.randint(1, 3))}
+
+    def document(self, fields):
+        doc = {"_id": self.oid()}
+        for i in range(fields):
+            doc["%s_%d" % (self.word(), i)] = self.value()
+        return doc
+
+    def condition(self):
+        kind = self.rand.randint(0, 5)
+        if kind == 0:
+            return self.value()
+        if kind == 1:
+            return {"$gte": self.value(2), "$lt": self.value(2)}
+        if kind == 2:
+            return {"$in": [self.value(2) for _ in range(self.rand.randint(2, 10))]}
+        if kind == 3:
+            return regex.Regex("^%s" % self.word(), "i")
+        if kind == 4:
+            return {"$exists": self.rand.random() > 0.5}
+        return {"$elemMatch": {"qty": {"$gt": self.rand.randint(0, 50)},
+                               "price": Decimal128("%d.99" % self.rand.randint(0, 99))}}
+
+    def filter(self, fields):
+        if fields == 1:
+            return {"_id": self.oid()}
+        filter_doc = {"%s_%d" % (self.word(), i): self.condition() for i in range(fields)}
+        filter_doc["$or"] = [{"status": self.word()}, {"deleted": None}]
+        return filter_doc
+
+    def update(self, fields):
+        return {
+            "$set": {"%s_%d" % (self.word(), i): self.value() for i in range(fields)},
+            "$inc": {"visits": 1},
+            "$currentDate": {"updated": True},
+        }
+
+    def pipeline(self, stages):
+        pipeline = [{"$match": self.filter(max(stages // 3, 1))}]
+        for i in range(1, stages):
+            kind = i % 5
+            if kind == 1:
+                pipeline.append({"$lookup": {
+                    "from": self.rand.choice(COLLECTIONS), "let": {"id": "$_id"},
+                    "pipeline": self.pipeline(stages // 3) if stages > 3 else
+                                [{"$match": {"$expr": {"$eq": ["$user", "$$id"]}}}],
+                    "as": "joined_%d" % i}})
+            elif kind == 2:
+                pipeline.append({"$group": {"_id": "$%s" % self.word(),
+                                            "total": {"$sum": "$amount"},
+                                            "avg": {"$avg": {"$multiply": ["$price", "$qty"]}}}})
+            elif kind == 3:
+                pipeline.append({"$facet": {
+                    "by_%s" % self.word(): [{"$sortByCount": "$%s" % self.word()}],
+                    "top": [{"$sort": {"total": -1}}, {"$limit": 10}]}})
+            elif kind == 4:
+                pipeline.append({"$project": {"%s_%d" % (self.word(), n): 1 for n in range(5)}})
+            else:
+                pipeline.append({"$sort": {"total": -1, "_id": 1}})
+        return pipeline
+
+    def entry(self, op, size):
+        """
+        Generate the entry of the operation `op` (one of :data:`OPERATIONS`)
+        in the size class `size` (one of the keys of :data:`SIZES`), with the
+        metadata fields recorded by the profiler.
+        """
+        fields, documents, stages = SIZES[size]
+        collection = self.rand.choice(COLLECTIONS)
+        self.ts += timedelta(milliseconds=self.rand.randint(0, 50))
+        obj = getattr(self, "_" + op.lower())(collection, fields, documents, stages)
+        obj.update({
+            "ts": self.ts,
+            "ns": "%s.%s" % (DB, collection),
+            "millis": self.rand.randint(0, 2000),
+            "client": "10.0.%d.%d" % (self.rand.randint(0, 255), self.rand.randint(1, 254)),
+            "user": "app@admin",
+            "responseLength": self.rand.randint(20, 100000),
+            "locks": {"Global": {"acquireCount": {"r": Int64(self.rand.randint(1, 10))}},
+                      "Database": {"acquireCount": {"r": Int64(1)}}},
+        })
+        if self.version != "3.0":
+            obj["appName"] = "MongoDB Shell"
+            obj["planSummary"] = "IXSCAN { %s: 1 }" % self.word()
+            obj["keysExamined"] = self.rand.randint(0, 10000)
+            obj["docsExamined"] = self.rand.randint(0, 10000)
+        else:
+            obj["nscanned"] = self.rand.randint(0, 10000)
+        return obj
+
+    def _command(self, command):
+        return {"op": "command", "command": command}
+
+    def _find(self, collection, fields, documents, stages):
+        filter_doc = self.filter(fields)
+        if self.version == "3.0":
+            return {"op": "query", "query": filter_doc, "nreturned": self.rand.randint(0, 100)}
+        command = {"find": collection, "filter": filter_doc, "sort": {"created": -1},
+                   "limit": 10.0, "skip": self.rand.randint(0, 100)}
+        key = "query" if self.version == "3.4" else "command"
+        return {"op": "query", key: command, "nreturned": self.rand.randint(0, 100)}
+
+    def _update(self, collection, fields, documents, stages):
+        filter_doc, update = self.filter(fields), self.update(fields)
+        if self.version == "4.4":
+            return {"op": "update", "command": {"q": filter_doc, "u": update, "multi": True},
+                    "nMatched": 1, "nModified": 1}
+        return {"op": "update", "query": filter_doc, "updateobj": update, "nMatched": 1}
+
+    def _insert(self, collection, fields, documents, stages):
+        docs = [self.document(fields) for _ in range(documents)]
+        if self.version == "3.0":
+            return {"op": "insert", "query": docs[0] if documents == 1 else docs,
+                    "ninserted": documents}
+        if self.version == "3.4":
+            return {"op": "insert", "query": {"insert": collection, "documents": docs},
+                    "ninserted": documents}
+        # MongoDB 3.6+ doesn't record the documents inserted
+        return {"op": "insert", "ninserted": documents}
+
+    def _remove(self, collection, fields, documents, stages):
+        filter_doc = self.filter(fields)
+        if self.version == "4.4":
+            return {"op": "remove", "command": {"q": filter_doc, "limit": 0},
+                    "ndeleted": self.rand.randint(0, 10)}
+        return {"op": "remove", "query": filter_doc, "ndeleted": self.rand.randint(0, 10)}
+
+    def _count(self, collection, fields, documents, stages):
+        return self._command({"count": collection, "query": self.filter(fields)})
+
+    def _distinct(self, collection, fields, documents, stages):
+        return self._command({"distinct": collection, "key": self.word(),
+                              "query": self.filter(fields)})
+
+    def _aggregate(self, collection, fields, documents, stages):
+        return self._command({"aggregate": collection, "pipeline": self.pipeline(stages),
+                              "cursor": {}, "allowDiskUse": True})
+
+    def _findandmodify(self, collection, fields, documents, stages):
+        return self._command({"findAndModify": collection, "query": self.filter(fields),
+                              "sort": {"created": 1}, "update": self.update(fields),
+                              "fields": {"_id": 1, "status": 1}, "new": True, "upsert": False})
+
+    def _group(self, collection, fields, documents, stages):
+        return self._command({"group": {
+            "ns": collection, "key": {"%s_%d" % (self.word(), i): 1 for i in range(fields)},
+            "initial": {"count": 0, "total": 0},
+            "$reduce": "function (cur, result) {\n    result.count++;\n    result.total += cur.amount;\n}",
+            "cond": self.filter(fields)}})
+
+    def _mapreduce(self, collection, fields, documents, stages):
+        return self._command({
+            "mapReduce": collection,
+            "map": "function () {\n    emit(this.%s, this.amount);\n}" % self.word(),
+            "reduce": "function (key, values) {\n    return Array.sum(values);\n}",
+            "query": self.filter(fields), "out": {"inline": 1}})
+
+
+def corpus(version, op, size, count, seed=1):
+    """
+    List of `count` entries of the operation `op` in the size class
+    `size`, with the format of the MongoDB `version`.
+    """
+    generator = ProfileGenerator(version, seed)
+    return [generator.entry(op, size) for _ in range(count)]
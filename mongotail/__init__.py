@@ -38,4 +38,6 @@ db address can be:
   "[::1]:9999/foo"              foo database on ::1 machine on port 9999 (IPv6)
   mongodb://10.0.0.4/foo        foo database at mongodb://10.0.0.4
   mongodb://user@host/foo       foo database at mongodb://host and username set
-  mongodb+srv://some.host/foo   foo database at mongodb+srv://some.host"""
+  mongodb+srv://some.host/foo   foo database at mongodb+srv://some.host
+  remotehost/foo,bar            foo and bar databases on remotehost machine
+  remotehost/*                  all the databases on remotehost machine"""
@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+"""
+Index advisor of ``--advise``: the operations logged that scanned the
+collection, or examined many more documents than returned, are grouped
+by the index that could serve them, and the indexes are suggested
+sorted by the time they could save.
+"""
+
+from __future__ import absolute_import
+import sys
+import json
+from collections import OrderedDict
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping   # Python 2.7
+from .err import warn
+
+MIN_RATIO = 10          # Documents examined by document returned to consider an operation inefficient
+MAX_CANDIDATES = 1000   # Indexes kept, the least recently seen are discarded
+MAX_REPORTED = 20
+
+# Query operators of the fields that match one value, the rest are considered ranges
+EQUALITY_OPERATORS = frozenset(["$eq", "$in"])
+
+# Top-level operators of the filters whose fields are not considered
+IGNORED_OPERATORS = frozenset(["$or", "$nor", "$expr", "$text", "$where", "$comment", "$jsonSchema"])
+
+# Fields with the number of documents returned or affected, in order of preference
+RETURNED_FIELDS = ('nreturned', 'nMatched', 'ndeleted')
+
+# Fields of the log entries used, besides the fields printed (see mongotail.LOG_FIELDS)
+ADVISE_FIELDS = ['docsExamined', 'nscannedObjects', 'planSummary']
+
+COLUMNS = "%10s %7s %9s %10s  %-24s %s"
+
+
+def get_query(obj):
+    """
+    Get the filter and the sort of the operation logged in `obj`.
+    :return: a tuple ``(collection, filter, sort)``, where `sort` may be
+             ``None``, or ``None`` if the operation has no filter
+    """
+    op = obj.get('op')
+    coll = obj['ns'].split(".", 1)[-1]
+    command = obj.get('command')
+    query = obj.get('query')
+    if not isinstance(command, Mapping):
+        command = None
+    if not isinstance(query, Mapping):
+        query = None
+    if op == "query":
+        cmd = command if command is not None and "find" in command else query   # MongoDB 3.6+, or 3.2 - 3.4
+        if cmd is not None and "find" in cmd:
+            return cmd['find'], cmd.get('filter') or {}, cmd.get('sort')
+        if query is not None:
+            # Before MongoDB 3.2
+            if "$query" in query:
+                return coll, query['$query'], query.get('$orderby')
+            return coll, query, None
+    elif op in ("update", "remove"):
+        if command is not None and "q" in command:
+            return coll, command['q'], None
+        if query is not None:
+            return coll, query, None
+    elif op == "command" and command is not None:
+        if "aggregate" in command:
+            pipeline = command.get('pipeline') or []
+            if pipeline and "$match" in pipeline[0]:
+                sort = pipeline[1].get('$sort') if len(pipeline) > 1 else None
+                return command['aggregate'], pipeline[0]['$match'], sort
+        elif "count" in command or "distinct" in command:
+            return command.get('count', command.get('distinct')), command.get('query') or {}, None
+        else:
+            for name in ("findAndModify", "findandmodify"):
+                if name in command:
+                    return command[name], command.get('query') or {}, command.get('sort')
+    return None
+
+
+def is_equality(value):
+    """
+    Whether the filter `value` of a field matches one value (or a list of values).
+    """
+    if isinstance(value, Mapping):
+        operators = [k for k in value if k.startswith("$")]
+        return not operators or all(k in EQUALITY_OPERATORS for k in operators)
+    # Regular expressions are ranges of strings
+    return not hasattr(value, "pattern")
+
+
+def get_index_key(query_filter, sort=None):
+    """
+    Get the key of the index that serves the `query_filter` and `sort`,
+    following the equality, sort, range rule: first the fields compared
+    by equality, then the fields of the sort, and last the fields with a
+    range of values. The key is a tuple of ``(field, direction)``, where
+    the direction is ``None`` for the fields that are not sorted.
+    The fields compared by equality can be in any order in the index,
+    so they are sorted by name, to get the same key for the same filter
+    whatever the order of its fields.
+    :return: a tuple ``(key, equality)``, where `equality` is the number
+             of fields compared by equality at the start of the key
+    """
+    equality, ranges = [], []
+    filters = [query_filter]
+    while filters:
+        for field, value in filters.pop(0).items():
+            if field == "$and":
+                filters.extend(f for f in value if isinstance(f, Mapping))
+            elif field.startswith("$"):
+                continue    # Eg. IGNORED_OPERATORS
+            elif is_equality(value):
+                if field not in equality:
+                    equality.append(field)
+            elif field not in ranges:
+                ranges.append(field)
+    equality.sort()
+    key = [(field, None) for field in equality]
+    for field, direction in (sort or {}).items():
+        if field not in equality and isinstance(direction, (int, float)):
+            key.append((field, 1 if direction > 0 else -1))
+    sorted_fields = set(field for field, _ in key)
+    key.extend((field, None) for field in ranges if field not in sorted_fields)
+    return tuple(key), len(equality)
+
+
+def format_key(key):
+    # The output of the JSON encoder of Mongotail, without loading it
+    return json.dumps(OrderedDict((field, direction or 1) for field, direction in key))
+
+
+def is_prefix(key, other, equality=0):
+    """
+    Whether all the fields of the index `key` are the first fields of the
+    index `other`, with the same sort directions, or all of them reversed
+    (the directions ``None`` match any direction). The first `equality`
+    fields of the keys are the ones compared by equality in the query,
+    so they match in any order.
+    """
+    if len(key) > len(other):
+        return False
+    fields = set(field for field, _ in other[:equality])
+    if not set(field for field, _ in key[:equality]) <= fields:
+        return False
+    directions = set()
+    for (field, direction), (other_field, other_direction) in zip(key[equality:], other[equality:]):
+        if field != other_field:
+            return False
+        if direction is None or other_direction is None:
+            continue
+        if not isinstance(direction, (int, float)) or not isinstance(other_direction, (int, float)):
+            return False    # Eg. "hashed" or "text" indexes
+        directions.add((direction > 0) == (other_direction > 0))
+    return len(directions) < 2
+
+
+class IndexStats(object):
+    """
+    Counters of the operations that a suggested index could serve.
+    """
+    __slots__ = ('count', 'collscans', 'millis', 'docs_examined', 'returned', 'saved')
+
+    def __init__(self):
+        self.count = 0
+        self.collscans = 0
+        self.millis = 0
+        self.docs_examined = 0
+        self.returned = 0
+        self.saved = 0.0
+
+    def add(self, obj, examined, returned):
+        millis = obj.get('millis', 0)
+        self.count += 1
+        if "COLLSCAN" in str(obj.get('planSummary', "")):
+            self.collscans += 1
+        self.millis += millis
+        self.docs_examined += examined
+        self.returned += returned
+        # The time spent examining documents that were not returned
+        self.saved += millis * (1 - float(min(returned, examined)) / examined) if examined else 0
+
+    @property
+    def ratio(self):
+        return float(self.docs_examined) / max(self.returned, 1)
+
+
+class Advisor(object):
+    """
+    Suggest indexes for the operations logged that scanned the collection, or
+    examined at least `min_ratio` documents for each document returned.
+
+    The operations are grouped by the key of the index that could serve them
+    (see :func:`get_index_key`), and the indexes are sorted by the time that
+    could be saved, estimated as the time of each operation spent examining
+    documents that were not returned. If `db` is set, the indexes of
+    its collections (with ``listIndexes``) that already start with the
+    suggested key, or that the suggested key extends, are reported too.
+    Only the `max_candidates` indexes seen more recently are kept.
+    """
+
+    def __init__(self, db=None, min_ratio=MIN_RATIO, max_candidates=MAX_CANDIDATES):
+        self.db = db
+        self.min_ratio = min_ratio
+        self.max_candidates = max_candidates
+        self.candidates = OrderedDict()
+        self.count = 0      # Operations added
+        self._indexes = {}
+
+    def add(self, obj):
+        """
+        Add the operation logged in `obj`, and return the key ``(ns, index_key, equality)``
+        of the index suggested for it (see :func:`get_index_key`), or ``None`` if it's efficient or
+        an index can't be suggested.
+        """
+        self.count += 1
+        examined = obj.get('docsExamined', obj.get('nscannedObjects', 0))
+        for field in RETURNED_FIELDS:
+            if field in obj:
+                returned = obj[field]
+                break
+        else:
+            returned = 0
+        if "COLLSCAN" not in str(obj.get('planSummary', "")) and examined < self.min_ratio * max(returned, 1):
+            return None
+        try:
+            query = get_query(obj)
+            if query is None or not isinstance(query[1], Mapping):
+                return None
+            coll, query_filter, sort = query
+            index_key, equality = get_index_key(query_filter, sort if isinstance(sort, Mapping) else None)
+        except (KeyError, TypeError, AttributeError):
+            return None
+        if not index_key or index_key[0][0] == "_id" or ("_id", None) in index_key[:equality]:
+            # The _id index, that always exists, already finds one document or a range of them
+            return None
+        key = ("%s.%s" % (obj['ns'].split(".", 1)[0], coll), index_key, equality)
+        stats = self.candidates.pop(key, None)
+        if stats is None:
+            stats = IndexStats()
+            if len(self.candidates) >= self.max_candidates:
+                self.candidates.popitem(last=False)     # The least recently seen
+        self.candidates[key] = stats
+        stats.add(obj, examined, returned)
+        return key
+
+    def get_indexes(self, coll):
+        """
+        Get the list of ``(name, key)`` of the indexes of the collection `coll`
+        of `db`, or ``None`` if they are unknown.
+        """
+        if coll not in self._indexes:
+            try:
+                self._indexes[coll] = [(index['name'], tuple(index['key'].items()))
+                                       for index in self.db[coll].list_indexes()]
+            except Exception as e:
+                # Eg. the user has no permission, or the collection was dropped
+                self._indexes[coll] = None
+                warn("Cannot list the indexes of the %s collection: %s" % (coll, e))
+        return self._indexes[coll]
+
+    def get_note(self, ns, key, equality=0):
+        """
+        Describe the existing indexes of the collection `ns` that relate to the index
+        `key`, that starts with `equality` fields compared by equality.
+        """
+        if self.db is None:
+            return ""
+        indexes = self.get_indexes(ns.split(".", 1)[-1])
+        if indexes is None:
+            return "(indexes unknown)"
+        for name, index_key in indexes:
+            if is_prefix(key, index_key, equality):
+                return "(exists: %s)" % name
+        extended = [name for name, index_key in indexes if is_prefix(index_key, key, equality)]
+        if extended:
+            return "(extends: %s)" % ", ".join(extended)
+        return ""
+
+    def advise(self, n=MAX_REPORTED):
+        """
+        Get a list of tuples ``(ns, index_key, equality, stats)`` with the `n`
+        indexes that could save more time.
+        """
+        items = sorted(self.candidates.items(), key=lambda item: item[1].saved, reverse=True)
+        return [(ns, key, equality, stats) for (ns, key, equality), stats in items[:n]]
+
+    def report(self, stream=None):
+        """
+        Write the indexes suggested in `stream` (the standard output by default).
+        """
+        stream = stream or sys.stdout
+        suggested = self.advise()
+        lines = ["%d operations analyzed, %d indexes suggested\n" % (self.count, len(self.candidates))]
+        if suggested:
+            lines.append(COLUMNS % ("SAVED ms", "OPS", "COLLSCANS", "EXAM/RET", "COLLECTION", "INDEX") + "\n")
+            for ns, key, equality, stats in suggested:
+                note = self.get_note(ns, key, equality)
+                lines.append(COLUMNS % ("%.0f" % stats.saved, stats.count, stats.collscans, "%.1f" % stats.ratio,
+                                        ns, format_key(key) + (" " + note if note else "")) + "\n")
+        stream.write("".join(lines))
+        stream.flush()
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+"""
+Capture files with the raw entries of the profile collection, recorded
+with ``--record`` and printed again with ``--replay``.
+
+A capture file is a sequence of BSON documents (each one starts with its
+length), like the files created by ``mongodump``: a header document with
+the version of the server, followed by the log entries as they were
+returned by the server. Files with the ``.gz`` or ``.zst`` extension are
+compressed with gzip or Zstandard (needs the ``zstandard`` package).
+
+Next to the capture, an index file with the ``.idx`` extension has pairs
+of little-endian 64 bits integers ``(ts, offset)``: the ``ts`` in milliseconds
+since the epoch of an entry, and its position in the uncompressed stream,
+one pair each second of log, used to start reading from a given time.
+"""
+
+from __future__ import absolute_import
+import bisect
+import gzip
+import mmap
+import struct
+from datetime import datetime
+import bson
+from bson.raw_bson import RawBSONDocument
+from bson.errors import InvalidBSON
+from .err import error
+
+INDEX_INTERVAL = 1000   # Milliseconds of log between index entries
+INDEX_FORMAT = "<qq"
+INDEX_SIZE = struct.calcsize(INDEX_FORMAT)
+LENGTH_FORMAT = "<i"
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def ts_millis(ts):
+    """
+    Milliseconds since the epoch of the naive UTC datetime `ts`.
+    """
+    delta = ts - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000 + delta.microseconds // 1000
+
+
+def open_file(path, mode):
+    """
+    Open the file `path` in binary `mode` ("r" or "w"), compressed if it
+    has the extension ``.gz`` or ``.zst``.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "b")
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            error("The zstandard package is needed for .zst files, install it "
+                  "with: pip install zstandard", 1)
+        if mode == "w":
+            return zstandard.ZstdCompressor().stream_writer(open(path, "wb"), closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, mode + "b")
+
+
+class Recorder(object):
+    """
+    Write the raw log entries in the capture file `path`.
+    """
+
+    def __init__(self, path, server_version, dbname):
+        self.path = path
+        self.file = open_file(path, "w")
+        self.index = open(path + ".idx", "wb")
+        self.offset = 0
+        self.count = 0
+        self._indexed = None
+        self._write(bson.encode({"mongotail": 1, "serverVersion": server_version, "db": dbname}))
+
+    def _write(self, data):
+        self.file.write(data)
+        self.offset += len(data)
+
+    def write(self, entry):
+        """
+        Write the log `entry`, a :class:`~bson.raw_bson.RawBSONDocument`.
+        """
+        millis = ts_millis(entry['ts'])
+        if self._indexed is None or millis - self._indexed >= INDEX_INTERVAL:
+            self.index.write(struct.pack(INDEX_FORMAT, millis, self.offset))
+            self._indexed = millis
+        self._write(entry.raw)
+        self.count += 1
+
+    def flush(self):
+        self.file.flush()
+        self.index.flush()
+
+    def close(self):
+        self.file.close()
+        self.index.close()
+
+
+def read_index(path):
+    """
+    Read the index of the capture `path`, returning a tuple with the
+    lists of ``ts`` and offsets. The lists are empty if there is no index.
+    """
+    timestamps, offsets = [], []
+    try:
+        with open(path + ".idx", "rb") as f:
+            data = f.read()
+    except IOError:
+        return timestamps, offsets
+    for pos in range(0, len(data) - INDEX_SIZE + 1, INDEX_SIZE):
+        millis, offset = struct.unpack_from(INDEX_FORMAT, data, pos)
+        timestamps.append(millis)
+        offsets.append(offset)
+    return timestamps, offsets
+
+
+def _iter_stream(f, offset):
+    """
+    Generator of tuples ``(offset, raw document)`` read from the stream `f`.
+    """
+    while True:
+        head = f.read(4)
+        if len(head) < 4:
+            return
+        length = struct.unpack(LENGTH_FORMAT, head)[0]
+        body = f.read(length - 4)
+        if len(body) < length - 4:
+            return      # Incomplete document, the capture was interrupted
+        yield offset, head + body
+        offset += length
+
+
+def _iter_mmap(data, offset):
+    """
+    Generator of tuples ``(offset, raw document)`` read from the memory map `data`.
+    """
+    size = len(data)
+    unpack_from = struct.unpack_from
+    while offset + 4 <= size:
+        length = unpack_from(LENGTH_FORMAT, data, offset)[0]
+        if offset + length > size:
+            return
+        yield offset, data[offset:offset + length]
+        offset += length
+
+
+def read_capture(path, since=None, until=None):
+    """
+    Read the capture file `path`.
+    :param since: naive UTC datetime of the first entry to read, the index
+                  is used to start reading close to it
+    :param until: naive UTC datetime of the last entry to read
+    :return: a tuple with the header of the capture (a dict with the
+             version of the server in ``serverVersion``), and a generator
+             of the log entries as :class:`~bson.raw_bson.RawBSONDocument`
+    """
+    compressed = path.endswith(".gz") or path.endswith(".zst")
+    f = open_file(path, "r")
+    data = None
+    if compressed:
+        documents = _iter_stream(f, 0)
+    else:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            data = b""  # Empty file
+        documents = _iter_mmap(data, 0)
+    try:
+        header = bson.decode(next(documents)[1])
+        if "serverVersion" not in header:
+            raise ValueError()
+    except (StopIteration, ValueError, InvalidBSON):
+        f.close()
+        raise ValueError("%s is not a capture file" % path)
+    start = None
+    if since is not None:
+        timestamps, offsets = read_index(path)
+        pos = bisect.bisect_right(timestamps, ts_millis(since)) - 1
+        if pos > 0:
+            start = offsets[pos]
+
+    def entries():
+        docs = documents
+        try:
+            if start is not None:
+                if compressed:
+                    f.seek(start)   # The compressed stream is read up to the offset
+                    docs = _iter_stream(f, start)
+                else:
+                    docs = _iter_mmap(data, start)
+            for offset, raw in docs:
+                entry = RawBSONDocument(raw)
+                ts = entry['ts']
+                if since is not None and ts < since:
+                    continue
+                if until is not None and ts > until:
+                    return
+                yield entry
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+            f.close()
+
+    return header, entries()
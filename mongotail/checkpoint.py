@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+from __future__ import absolute_import
+import os
+import json
+import time
+from datetime import datetime
+try:
+    from os import replace
+except ImportError:
+    from os import rename as replace    # Python 2.7, atomic only on POSIX
+
+SAVE_INTERVAL = 1.0     # Min seconds between writes of the checkpoint file
+
+TS_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+
+class Checkpoint(object):
+    """
+    Position of the last entry read from the log: its ``ts``, and the entries
+    read with that same ``ts``, used to re-open the log after the last entry
+    read without repeating or missing entries. If `path` is set, the position
+    is loaded from that file if it exists, and saved there while the log is read.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.ts = None
+        self.seen = []      # Entries read with the same ts
+        self.count = 0      # Number of entries read with the same ts, including entries read before loading
+        self._skip = []
+        self._skip_count = 0
+        self._saved = time.time()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.ts = datetime.strptime(state["ts"], TS_FORMAT)
+            self.count = int(state["count"])
+
+    def query(self, query):
+        """
+        Get `query` with the condition to read the log from the checkpoint,
+        and start to skip the entries already read with the same ``ts``.
+        """
+        self._skip = list(self.seen)
+        self._skip_count = self.count - len(self.seen)
+        if self.ts is None:
+            return query
+        query = dict(query)
+        query["ts"] = {"$gte": self.ts}
+        return query
+
+    def is_read(self, entry):
+        """
+        Check whether the entry was already read before the
+        last call to :meth:`query`.
+        """
+        if entry['ts'] != self.ts:
+            return False
+        if entry in self._skip:
+            self._skip.remove(entry)
+            return True
+        if self._skip_count > 0:
+            self._skip_count -= 1
+            return True
+        return False
+
+    def update(self, entry):
+        """
+        Move the checkpoint to `entry`, the last entry read.
+        """
+        if entry['ts'] == self.ts:
+            self.seen.append(entry)
+            self.count += 1
+        else:
+            self.ts = entry['ts']
+            self.seen = [entry]
+            self.count = 1
+        if self.path and time.time() - self._saved >= SAVE_INTERVAL:
+            self.save()
+
+    def save(self):
+        """
+        Write the checkpoint in the file, if it has a path.
+        """
+        if not self.path or self.ts is None:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"ts": self.ts.strftime(TS_FORMAT), "count": self.count}, f)
+        replace(tmp_path, self.path)     # Atomic, the file is never left half written
+        self._saved = time.time()
+
+
+class Gap(dict):
+    """
+    Marker of the entries lost in the log, because they were overwritten in
+    the capped profile collection before being read. Like a log entry, it has
+    the ``ts`` of the first entry that can be read after the gap, so it can
+    be merged in order with the entries of other logs. The other keys are
+    ``ns``, ``since`` (the ``ts`` of the last entry read before the gap),
+    ``seconds`` (the time of log lost) and ``entries`` (the estimated number
+    of entries lost, or ``None`` if it's unknown).
+    """
+
+    def __init__(self, ns, since, ts, entries=None):
+        super(Gap, self).__init__(ns=ns, since=since, ts=ts, seconds=(ts - since).total_seconds(),
+                                  entries=entries)
+
+    def __str__(self):
+        lost = "%.1f seconds" % self['seconds']
+        if self['entries'] is not None:
+            lost = "~%d entries / %s" % (self['entries'], lost)
+        return "%s lost, overwritten in the log before being read" % lost
@@ -22,12 +22,46 @@
 ##############################################################################
 
 from __future__ import absolute_import
+import re
 import getpass
-from .err import error, error_parsing, ECONNREFUSED
+import warnings
+from .err import error, error_parsing, ECONNREFUSED, EINVAL
 from pymongo import MongoClient
+from pymongo.common import validate_compressors
+from pymongo.uri_parser import parse_uri
 from res_address import get_res_address, AddressError
 
 
+# URI options that only apply to the hosts in the URI
+HOST_URI_OPTIONS = ("replicaset", "directconnection", "loadbalanced", "readpreference",
+                    "srvservicename", "srvmaxhosts")
+
+
+def split_databases(address):
+    """
+    Split an address with a list of databases separated by commas, or with
+    the ``*`` wildcard to select all the databases, eg. ``host/db1,db2`` or
+    ``host/*``.
+    :param address: a string representation with the db address
+    :return: a tuple with an address with only one database, that can be used
+             with :func:`connect`, and the list of databases, ``["*"]``
+             for all the databases, or ``None`` if `address` has only one database
+    """
+    base, sep, options = address.partition("?")
+    scheme_end = base.find("://")
+    slash = base.rfind("/", scheme_end + 3 if scheme_end >= 0 else 0)
+    if slash < 0 and scheme_end >= 0:
+        return address, None    # No database, and hosts may be separated by commas
+    dbnames = [name.strip() for name in base[slash + 1:].split(",") if name.strip()]
+    if "*" in dbnames:
+        dbnames = ["*"]
+    elif len(dbnames) < 2:
+        return address, None
+    # The first database is used to authenticate if no other is given
+    dbname = dbnames[0] if dbnames != ["*"] else "admin"
+    return base[:slash + 1] + dbname + sep + options, dbnames
+
+
 def connect(address, args):
     """
     Connect with `address`, and return a tuple with a :class:`~pymongo.MongoClient`,
@@ -40,8 +74,66 @@ def connect(address, args):
     - auth_database: authenticate the username and password against that database (optional).
       If not specified, the database specified in address will be used.
     - tls, tlsCertificateKeyFile, tlsAllowInvalidCertificates, ...: TSL authentication options
+    - compressors: wire compressors separated by commas, eg. "zstd,zlib" (optional).
+      They can also be set in the URI, eg. "mongodb://host/db?compressors=zstd".
     :return: a tuple with ``(client, db)``
     """
+    client, dbname, options = _connect(address, args)
+    return client, client[dbname]
+
+
+def connect_cluster(address, args):
+    """
+    Like :func:`connect`, but also connect directly with each member of
+    the cluster the server in `address` belongs to: each member of the replica set,
+    or each member of each shard if it's a ``mongos`` instance. If the
+    server is standalone, it's the only member.
+    :return: a tuple with ``(client, db, members)``, where ``members`` is a
+             list of tuples ``(name, client, db)`` for each member
+    """
+    client, dbname, options = _connect(address, args)
+    try:
+        hello = client.admin.command("isMaster")
+        if hello.get("msg") == "isdbgrid":
+            hosts = []
+            for shard in client.config.shards.find():
+                # Shard hosts are like "rs0/host1:27017,host2:27017"
+                for host in shard["host"].split("/")[-1].split(","):
+                    hosts.append(("%s/%s" % (shard["_id"], host), host))
+        elif "setName" in hello:
+            hosts = [(host, host) for host in hello.get("hosts", []) + hello.get("passives", [])]
+        else:
+            host = "%s:%s" % client.address
+            return client, client[dbname], [(host, client, client[dbname])]
+        members = []
+        for name, host in hosts:
+            member_client = MongoClient(host=host, directConnection=True, **options)
+            members.append((name, member_client, member_client[dbname]))
+    except Exception as e:
+        error("Error trying to connect with the cluster members: %s" % str(e), ECONNREFUSED)
+    return client, client[dbname], members
+
+
+def check_compressors(compressors):
+    """
+    Check the wire `compressors` of the connection, eg. ``"zstd,zlib"``, are
+    supported and their packages installed, otherwise the driver connects
+    without them only with a warning.
+    :return: the list of compressors
+    """
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        compressors = validate_compressors("compressors", compressors)
+    if caught:
+        error("Error in the compressors: %s" % " ".join(str(w.message) for w in caught), EINVAL)
+    return compressors
+
+
+def _connect(address, args):
+    """
+    Connect with `address`, and return a tuple with the client, the database
+    name, and the options used to connect, without the hosts.
+    """
     try:
         scheme, host, port, dbname, query, username, password = get_res_address(address)
     except AddressError as e:
@@ -61,6 +153,8 @@ def connect(address, args):
                 options["tlsCRLFile"] = args.tlsCRLFile
             if args.tlsAllowInvalidCertificates:
                 options["tlsAllowInvalidCertificates"] = args.tlsAllowInvalidCertificates
+        if args.compressors:
+            options["compressors"] = check_compressors(args.compressors)
         if args.auth_database:
             options["authSource"] = args.auth_database
         user = args.username or username
@@ -72,10 +166,17 @@ def connect(address, args):
             options["password"] = passw if passw != '' else None
 
         if scheme:
+            uri_compressors = re.search(r"[?&;]compressors=([^&;]*)", address, re.IGNORECASE)
+            if uri_compressors and "compressors" not in options:
+                check_compressors(uri_compressors.group(1))
             client = MongoClient(address, **options)
+            # Keep the options set in the URI to connect with other hosts
+            uri_options = dict((k, v) for k, v in parse_uri(address)["options"].items()
+                               if k.lower() not in HOST_URI_OPTIONS)
+            uri_options.update(options)
+            options = uri_options
         else:
             client = MongoClient(host=host, port=port, **options)
     except Exception as e:
         error("Error trying to connect: %s" % str(e), ECONNREFUSED)
-    db = client[dbname]
-    return client, db
+    return client, dbname, options
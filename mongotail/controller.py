@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+"""
+Adaptive profiling threshold set with ``--target-rate``: the ``slowms``
+threshold of the profiler is raised when the operations are logged faster
+than the target rate, and lowered when they are logged slower, so the
+overhead of the profiler in the server and the volume of log to process
+stay predictable.
+"""
+
+from __future__ import absolute_import
+import sys
+import time
+from datetime import datetime
+from .err import warn
+
+ADJUST_INTERVAL = 10    # Seconds of log measured between adjustments
+HYSTERESIS = 0.25       # Deviation from the target rate tolerated, as a fraction of it
+SLOWMS_RANGE = (0, 10000)
+
+
+def parse_slowms_range(value):
+    """
+    Parse the bounds of the threshold "MIN:MAX" in milliseconds.
+    """
+    try:
+        low, _, high = value.partition(":")
+        low, high = int(low), int(high)
+        if low < 0 or low > high:
+            raise ValueError()
+        return low, high
+    except ValueError:
+        raise ValueError('Invalid slowms range "%s", the format is MIN:MAX, e.g. 10:5000' % value)
+
+
+class SlowmsController(object):
+    """
+    Adjust the ``slowms`` threshold of the profiler of `db` to log about
+    `target_rate` entries per second, within the bounds `slowms_range`.
+
+    Every `interval` seconds the rate of the entries read (see :meth:`add`)
+    is compared with the target: if it's higher by more than
+    :data:`HYSTERESIS`, the threshold is raised to the duration that the
+    target rate of entries exceeded in the interval, and if it's lower, the
+    threshold is halved, because the operations faster than the threshold
+    are not logged to know how much lower it should be. Each adjustment is
+    written in `stream` (the standard error by default), and the original
+    threshold is restored with :meth:`close`.
+    """
+
+    def __init__(self, db, target_rate, slowms_range=SLOWMS_RANGE, interval=ADJUST_INTERVAL, stream=None):
+        self.db = db
+        self.target_rate = target_rate
+        self.min_slowms, self.max_slowms = slowms_range
+        self.interval = interval
+        self._stream = stream
+        profile = db.command("profile", -1)
+        if profile["was"] != 1:
+            raise ValueError("the profiling level is %s, the --target-rate option needs the level 1, "
+                             "set it with --level 1" % profile["was"])
+        self.original = self.slowms = profile["slowms"]
+        self.enabled = True
+        # Entries logged before the controller started are not measured
+        self._since = datetime.utcnow()
+        self._millis = []
+        self._start = time.time()
+        bounded = min(max(self.slowms, self.min_slowms), self.max_slowms)
+        if bounded != self.slowms:
+            self._set(bounded, "set within the range")
+
+    @property
+    def stream(self):
+        return self._stream or sys.stderr
+
+    def add(self, obj):
+        """
+        Measure the log entry `obj`, adjusting the threshold if it's time to do it.
+        """
+        if obj['ts'] >= self._since:
+            self._millis.append(obj.get('millis') or 0)
+        self.tick()
+
+    def tick(self):
+        """
+        Adjust the threshold if it's time to do it.
+        """
+        if self.enabled and time.time() - self._start >= self.interval:
+            self.adjust()
+
+    def adjust(self):
+        """
+        Compare the rate of the entries measured with the target rate,
+        raising or lowering the threshold, and start a new measure.
+        """
+        now = time.time()
+        elapsed = now - self._start
+        millis, self._millis = sorted(self._millis), []
+        self._start = now
+        rate = len(millis) / elapsed
+        slowms = self.slowms
+        if rate > self.target_rate * (1 + HYSTERESIS):
+            # Duration exceeded by the target number of entries in the interval
+            keep = int(self.target_rate * elapsed)
+            slowms = max(millis[len(millis) - keep - 1], self.slowms + 1)
+        elif rate < self.target_rate * (1 - HYSTERESIS):
+            slowms = self.slowms // 2
+        slowms = min(max(slowms, self.min_slowms), self.max_slowms)
+        if slowms != self.slowms:
+            self._set(slowms, "%s from %s ms: %.1f entries/s, target %g/s" % (
+                "raised" if slowms > self.slowms else "lowered", self.slowms, rate, self.target_rate))
+
+    def _set(self, slowms, reason):
+        try:
+            self.db.command({"profile": 1, "slowms": slowms})
+        except Exception as e:
+            # Eg. the user has no permission, the threshold is not adjusted anymore
+            warn("Error setting the profiling threshold to %s milliseconds, not adjusted anymore: %s"
+                 % (slowms, e))
+            self.enabled = False
+            return
+        self.slowms = slowms
+        self.stream.write("Mongotail SLOWMS - threshold %s ms, %s\n" % (slowms, reason))
+        self.stream.flush()
+
+    def close(self):
+        """
+        Restore the original threshold.
+        """
+        if self.enabled and self.slowms != self.original:
+            self._set(self.original, "restored")
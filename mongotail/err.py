@@ -23,7 +23,7 @@
 
 
 import sys
-from errno import EINVAL, EINTR, ECONNREFUSED, EFAULT, EDESTADDRREQ
+from errno import EINVAL, EINTR, ECONNREFUSED, EFAULT, EDESTADDRREQ, ENODATA
 
 
 def warn(msg):
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+"""
+Automatic explain of the slow operations logged, set with ``--explain``:
+the first time an operation with a new query shape takes at least the
+milliseconds given, the same operation is explained in the server, and
+the winning plan is printed with it, and with the next operations of
+the same shape.
+"""
+
+from __future__ import absolute_import
+import sys
+import time
+from collections import OrderedDict
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping   # Python 2.7
+from .shape import get_shape, IGNORED_ARGS
+from .out import json_encoder
+
+EXPLAIN_TTL = 600           # Seconds a plan is kept before the shape is explained again
+MAX_SHAPES = 1000           # Plans kept, the least recently used are discarded
+MAX_RATE = 1.0              # Explains per second
+MAX_LOAD = 0.05             # Fraction of the time that can be spent waiting explains
+EXPLAIN_TIMEOUT_MS = 1000   # maxTimeMS of all the operations explained, run with executionStats
+
+# Commands that can be explained, the collection name is the value of the first key
+EXPLAINABLE_COMMANDS = frozenset(["find", "aggregate", "count", "distinct", "findAndModify", "findandmodify"])
+
+def explain_command(obj):
+    """
+    Build the command to explain the operation logged in `obj`, without
+    the session and transaction arguments, or return ``None`` if it
+    can't be explained (eg. inserts, or servers older than MongoDB 3.6,
+    that don't log the whole command).
+    """
+    command = obj.get('command')
+    if not isinstance(command, Mapping):
+        return None
+    args = OrderedDict((k, v) for k, v in command.items() if not k.startswith("$") and k not in IGNORED_ARGS)
+    # The write commands are explained with the statement logged, and the time limit in the command
+    if obj['op'] == "update":
+        return OrderedDict([("update", obj['ns'].split(".", 1)[-1]), ("updates", [args]),
+                            ("maxTimeMS", EXPLAIN_TIMEOUT_MS)])
+    if obj['op'] == "remove":
+        return OrderedDict([("delete", obj['ns'].split(".", 1)[-1]), ("deletes", [args]),
+                            ("maxTimeMS", EXPLAIN_TIMEOUT_MS)])
+    if obj['op'] not in ("query", "command"):
+        return None
+    names = [name for name in args if name in EXPLAINABLE_COMMANDS]
+    if not names:
+        return None
+    if next(iter(args)) != names[0]:
+        # The name must be the first key, but with Python 2.7 the documents are decoded without order
+        args = OrderedDict([(names[0], args.pop(names[0]))] + list(args.items()))
+    args["maxTimeMS"] = EXPLAIN_TIMEOUT_MS
+    return args
+
+
+def get_winning_plan(result):
+    """
+    Get the winning plan of the `result` of an explain, where the
+    ``queryPlanner`` section is at the top, or for aggregations, in the
+    first stage of the pipeline. Returns a tuple ``(plan, execution_stats)``.
+    """
+    if "queryPlanner" not in result and result.get("stages"):
+        result = result["stages"][0].get("$cursor", {})
+    if "queryPlanner" not in result:
+        return None, None
+    return result["queryPlanner"].get("winningPlan"), result.get("executionStats")
+
+
+def format_plan(plan):
+    """
+    Format the tree of stages of `plan` in one line, from the
+    root to the leaves, eg. ``FETCH > IXSCAN {"status": 1}``.
+    """
+    if "queryPlan" in plan:
+        plan = plan["queryPlan"]    # Slot based execution engine, MongoDB 5.1+
+    text = plan.get("stage", "?")
+    if "keyPattern" in plan:
+        text += " " + json_encoder.encode(plan["keyPattern"])
+    children = []
+    if "inputStage" in plan:
+        children = [plan["inputStage"]]
+    elif "inputStages" in plan:
+        children = plan["inputStages"]
+    elif "shards" in plan:
+        children = [shard["winningPlan"] for shard in plan["shards"] if "winningPlan" in shard]
+    if len(children) == 1:
+        text += " > " + format_plan(children[0])
+    elif children:
+        text += " (" + ", ".join(format_plan(child) for child in children) + ")"
+    return text
+
+
+def format_explain(result):
+    """
+    Format the winning plan of the `result` of an explain, and with
+    the ``executionStats`` verbosity, the work done to execute it.
+    """
+    plan, execution_stats = get_winning_plan(result)
+    if plan is None:
+        return "unknown"
+    text = format_plan(plan)
+    if execution_stats:
+        text += " (%s keys, %s docs examined, %s returned, %s ms)" % (
+            execution_stats.get("totalKeysExamined"), execution_stats.get("totalDocsExamined"),
+            execution_stats.get("nReturned"), execution_stats.get("executionTimeMillis"))
+    return text
+
+
+class Explainer(object):
+    """
+    Explain in the server of `client` the operations logged that took at
+    least `min_millis`, once per query shape: the plans are kept in a LRU
+    cache of `max_shapes` shapes for `ttl` seconds, and the cached plan
+    is returned for the next operations with the same shape.
+
+    The operations are explained with the `verbosity` given, at most
+    `max_rate` per second, and waiting the explains at most the `max_load`
+    fraction of the time, so the load added to the server is bounded.
+    The shapes that can't be explained by the rate limit are explained
+    with the next operation of the same shape. A summary is written in
+    `stream` (the standard error by default) with :meth:`close`.
+    """
+
+    def __init__(self, client, min_millis, verbosity="queryPlanner", ttl=EXPLAIN_TTL, max_shapes=MAX_SHAPES,
+                 max_rate=MAX_RATE, max_load=MAX_LOAD, stream=None):
+        self.client = client
+        self.min_millis = min_millis
+        self.verbosity = verbosity
+        self.ttl = ttl
+        self.max_shapes = max_shapes
+        self.max_rate = max_rate
+        self.max_load = max_load
+        self._stream = stream
+        self.plans = OrderedDict()
+        self.explained = 0
+        self.failed = 0
+        self.limited = 0
+        self._next_explain = 0
+
+    @property
+    def stream(self):
+        return self._stream or sys.stderr
+
+    def get_plan(self, obj, formatters):
+        """
+        Get the winning plan of the operation logged in `obj`, formatted to
+        be printed, explaining it if its shape has no plan cached, or
+        ``None`` if the operation is fast or can't be explained.
+        :param formatters: the table of formatters of the server version
+               (see :func:`~mongotail.out.get_formatters`) used to
+               get the shape of the operation
+        """
+        if obj.get('millis', 0) < self.min_millis:
+            return None
+        try:
+            shape = get_shape(obj, formatters)
+        except (KeyError, TypeError):
+            shape = None
+        if shape is None:
+            return None
+        key = (obj['ns'].split(".", 1)[0],) + shape
+        now = time.time()
+        cached = self.plans.pop(key, None)
+        if cached is not None:
+            self.plans[key] = cached    # Now the most recently used
+            if cached[0] > now:
+                return cached[1]
+        if now < self._next_explain:
+            self.limited += 1
+            return cached and cached[1]     # The expired plan, if any
+        command = explain_command(obj)
+        if command is None:
+            plan = None
+        else:
+            plan = self.explain(obj['ns'].split(".", 1)[0], command)
+            elapsed = time.time() - now
+            self._next_explain = now + max(1.0 / self.max_rate, elapsed / self.max_load)
+        if cached is None and len(self.plans) >= self.max_shapes:
+            self.plans.popitem(last=False)     # The least recently used
+        self.plans[key] = (now + self.ttl, plan)
+        return plan
+
+    def explain(self, dbname, command):
+        try:
+            result = self.client[dbname].command({"explain": command, "verbosity": self.verbosity})
+        except Exception as e:
+            # Eg. the user has no permission, or the operation timed out
+            self.failed += 1
+            details = getattr(e, "details", None)
+            return "explain failed: %s" % (details and details.get("errmsg") or e)
+        self.explained += 1
+        return format_explain(result)
+
+    def close(self):
+        if self.explained or self.failed or self.limited:
+            self.stream.write("Mongotail EXPLAIN - %d shapes explained, %d failed, %d operations not "
+                              "explained over the rate limit\n" % (self.explained, self.failed, self.limited))
+            self.stream.flush()
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Metrics of the operations logged, exposed in the Prometheus text format
+with ``--serve``: a histogram of the duration of the operations and
+counters of the documents and keys examined, documents returned and
+collection scans, for each namespace and operation.
+"""
+
+from __future__ import absolute_import
+import bisect
+import threading
+from datetime import datetime
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler   # Python 2.7
+from .stats import stats
+from .err import error
+
+# Upper bounds of the buckets of the histogram, in milliseconds
+BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+EPOCH = datetime(1970, 1, 1)
+
+
+def parse_address(address):
+    """
+    Parse the address "[HOST]:PORT" where the metrics are served.
+    """
+    host, _, port = address.rpartition(":")
+    try:
+        port = int(port)
+        if not 0 < port < 65536:
+            raise ValueError()
+    except ValueError:
+        raise ValueError('Invalid address "%s", the format is [HOST]:PORT, e.g. :9216' % address)
+    return host.strip("[]"), port
+
+
+class OperationMetrics(object):
+    """
+    Metrics of the operations of a namespace and operation type. The
+    histogram has one counter for each of the :data:`BUCKETS` plus one for
+    the durations above the last bucket, and it's cumulated when rendered.
+    """
+    __slots__ = ('buckets', 'millis', 'count', 'docs_examined', 'keys_examined',
+                 'nreturned', 'collscans')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.millis = 0
+        self.count = 0
+        self.docs_examined = 0
+        self.keys_examined = 0
+        self.nreturned = 0
+        self.collscans = 0
+
+    def add(self, obj):
+        millis = obj.get('millis', 0)
+        self.buckets[bisect.bisect_left(BUCKETS, millis)] += 1
+        self.millis += millis
+        self.count += 1
+        self.docs_examined += obj.get('docsExamined', obj.get('nscannedObjects', 0))
+        self.keys_examined += obj.get('keysExamined', obj.get('nscanned', 0))
+        self.nreturned += obj.get('nreturned', 0)
+        if str(obj.get('planSummary', '')).startswith('COLLSCAN'):
+            self.collscans += 1
+
+
+def operation_name(obj):
+    """
+    Name of the operation of the log entry `obj`: the value of ``op``,
+    or the name of the command for commands, eg. "aggregate".
+    """
+    op = obj['op']
+    if op == "command":
+        for name in obj.get('command', ()):
+            return name
+    return op
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics(object):
+    """
+    Metrics of the log entries added with :meth:`add`, rendered in
+    the Prometheus text format with :meth:`render`.
+    """
+
+    def __init__(self):
+        self.operations = {}
+        self.entries = 0
+        self.last_ts = None
+        self.lock = threading.Lock()
+
+    def add(self, obj):
+        key = (obj.get('ns', ''), operation_name(obj))
+        with self.lock:
+            metrics = self.operations.get(key)
+            if metrics is None:
+                metrics = self.operations[key] = OperationMetrics()
+            metrics.add(obj)
+            self.entries += 1
+            self.last_ts = obj['ts']
+
+    def render(self):
+        with self.lock:
+            operations = [(key, list(m.buckets), m.millis, m.count, m.docs_examined, m.keys_examined,
+                           m.nreturned, m.collscans) for key, m in sorted(self.operations.items())]
+            entries, last_ts = self.entries, self.last_ts
+        lines = [
+            "# HELP mongotail_operation_duration_seconds Duration of the operations logged.",
+            "# TYPE mongotail_operation_duration_seconds histogram",
+        ]
+        for (ns, op), buckets, millis, count, _, _, _, _ in operations:
+            labels = 'ns="%s",op="%s"' % (escape(ns), escape(op))
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS, buckets):
+                cumulative += bucket
+                lines.append('mongotail_operation_duration_seconds_bucket{%s,le="%s"} %d'
+                             % (labels, bound / 1000.0, cumulative))
+            lines.append('mongotail_operation_duration_seconds_bucket{%s,le="+Inf"} %d' % (labels, count))
+            lines.append('mongotail_operation_duration_seconds_sum{%s} %s' % (labels, millis / 1000.0))
+            lines.append('mongotail_operation_duration_seconds_count{%s} %d' % (labels, count))
+        for index, name, help_text in (
+                (4, "docs_examined", "Documents examined by the operations logged."),
+                (5, "keys_examined", "Index keys examined by the operations logged."),
+                (6, "returned", "Documents returned by the operations logged."),
+                (7, "collscans", "Operations logged that scanned the whole collection.")):
+            lines.append("# HELP mongotail_%s_total %s" % (name, help_text))
+            lines.append("# TYPE mongotail_%s_total counter" % name)
+            for operation in operations:
+                (ns, op) = operation[0]
+                lines.append('mongotail_%s_total{ns="%s",op="%s"} %d'
+                             % (name, escape(ns), escape(op), operation[index]))
+        lines.append("# HELP mongotail_entries_total Entries read from the log.")
+        lines.append("# TYPE mongotail_entries_total counter")
+        lines.append("mongotail_entries_total %d" % entries)
+        lines.append("# HELP mongotail_gaps_total Times the log was overwritten before being read.")
+        lines.append("# TYPE mongotail_gaps_total counter")
+        lines.append("mongotail_gaps_total %d" % stats.gaps)
+        lines.append("# HELP mongotail_lost_seconds_total Seconds of log overwritten before being read.")
+        lines.append("# TYPE mongotail_lost_seconds_total counter")
+        lines.append("mongotail_lost_seconds_total %s" % stats.lost_seconds)
+        if last_ts is not None:
+            lines.append("# HELP mongotail_last_entry_timestamp_seconds Time of the last entry read from the log.")
+            lines.append("# TYPE mongotail_last_entry_timestamp_seconds gauge")
+            lines.append("mongotail_last_entry_timestamp_seconds %.3f" % (last_ts - EPOCH).total_seconds())
+        return "\n".join(lines) + "\n"
+
+
+def serve(entries, address):
+    """
+    Add the log entries of the iterable `entries` (``None`` items are ignored)
+    to the metrics, serving them in http://`address`/metrics, where `address`
+    is the tuple ``(host, port)``.
+    """
+    metrics = Metrics()
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404, "The metrics are in /metrics")
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = HTTPServer(address, MetricsHandler)
+    except (IOError, OSError) as e:
+        error('Cannot serve the metrics in "%s:%s": %s' % (address[0], address[1], e), 1)
+    server_thread = threading.Thread(target=server.serve_forever, name="mongotail-serve")
+    server_thread.daemon = True
+    server_thread.start()
+    try:
+        for entry in entries:
+            if entry is not None:
+                metrics.add(entry)
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+"""
+Filters of the log entries set from the command line, that are
+sent to the server within the query to the profile collection.
+"""
+
+from __future__ import absolute_import
+import re
+from .out import COMMAND_FORMATTERS
+from .jsondec import TEXT_TYPES
+
+# Values of the "op" field of the log entries
+OPERATIONS = {"query": "query", "find": "query", "insert": "insert", "update": "update",
+              "remove": "remove", "delete": "remove", "command": "command"}
+
+COMMAND_NAMES = sorted(set(name for name, _ in COMMAND_FORMATTERS if name != "map"))
+COMMAND_ALIASES = {"map": "mapreduce"}
+
+
+class LogFilter(object):
+    """
+    Filter of the log entries by operation, namespace, duration, plan,
+    application and user. :meth:`query` builds the query sent to the server,
+    and :meth:`match` is a predicate compiled from the same filter, to check
+    the entries read from sources that can't execute the query.
+    :param ops: list of operations, like ``query`` or ``update``, or
+           commands, like ``aggregate`` or ``count``
+    :param ns: namespace glob (e.g. ``test.user*``, or ``user*`` for
+           collections in any database), or a regular expression between
+           slashes (e.g. ``/^test\\.(users|orders)$/``)
+    :param min_millis: minimum duration of the operations in milliseconds
+    :param plan_summary: prefix of the plan summary, e.g. ``COLLSCAN`` or ``IXSCAN``
+    :param app_name: name of the application that sent the operations
+    :param user: user that executed the operations, with the form
+           ``name@database``, or only ``name`` for any database
+    """
+
+    def __init__(self, ops=None, ns=None, min_millis=None, plan_summary=None, app_name=None, user=None):
+        self.conditions = []
+        self.predicates = []
+        if ops:
+            self._add_ops(ops)
+        if ns:
+            if len(ns) > 1 and ns.startswith("/") and ns.endswith("/"):
+                pattern = ns[1:-1]
+            else:
+                if "." not in ns:
+                    ns = "*." + ns
+                pattern = "^" + re.escape(ns).replace(r"\*", ".*").replace(r"\?", ".") + "$"
+            self._add("ns", {"$regex": pattern}, _search(re.compile(pattern), "ns"))
+        if min_millis is not None:
+            # Like the server, the entries without "millis" are skipped
+            self._add("millis", {"$gte": min_millis},
+                      lambda obj: "millis" in obj and obj["millis"] >= min_millis)
+        if plan_summary:
+            pattern = "^" + re.escape(plan_summary)
+            self._add("planSummary", {"$regex": pattern}, _search(re.compile(pattern), "planSummary"))
+        if app_name:
+            self._add("appName", app_name, lambda obj: obj.get("appName") == app_name)
+        if user:
+            if "@" in user:
+                self._add("user", user, lambda obj: obj.get("user") == user)
+            else:
+                pattern = "^" + re.escape(user) + "@"
+                self._add("user", {"$regex": pattern}, _search(re.compile(pattern), "user"))
+
+    def __bool__(self):
+        return bool(self.conditions)
+
+    __nonzero__ = __bool__  # Python 2.7
+
+    def _add(self, field, condition, predicate):
+        self.conditions.append({field: condition})
+        self.predicates.append(predicate)
+
+    def _add_ops(self, ops):
+        operations = set()
+        commands = set()
+        for op in ops:
+            if op.lower() in OPERATIONS:
+                operations.add(OPERATIONS[op.lower()])
+            else:
+                command = COMMAND_ALIASES.get(op.lower(), op.lower())
+                names = [name for name in COMMAND_NAMES if name.lower() == command]
+                if not names:
+                    raise ValueError('Unknown operation "%s"' % op)
+                commands.update(names)
+        alternatives = []
+        if operations:
+            alternatives.append({"op": {"$in": sorted(operations)}})
+        for name in sorted(commands):
+            alternatives.append({"op": "command", "command.%s" % name: {"$exists": True}})
+        self.conditions.append({"$or": alternatives})
+
+        def predicate(obj):
+            if obj.get("op") in operations:
+                return True
+            if obj.get("op") == "command":
+                command = obj.get("command", {})
+                return any(name in command for name in commands)
+            return False
+        self.predicates.append(predicate)
+
+    def query(self, base):
+        """
+        Get the query `base` with the conditions of the filter.
+        """
+        if not self.conditions:
+            return base
+        query = dict(base)
+        query["$and"] = list(self.conditions)
+        return query
+
+    def match(self, obj):
+        """
+        Check whether the log entry `obj` pass the filter.
+        """
+        for predicate in self.predicates:
+            if not predicate(obj):
+                return False
+        return True
+
+
+def _search(regex, field):
+    def predicate(obj):
+        value = obj.get(field)
+        return isinstance(value, TEXT_TYPES) and regex.search(value) is not None
+    return predicate
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Machine-readable output formats, selected with ``--format``: each log
+entry is printed as a record with the fields ``ts``, ``op``, ``ns``,
+``millis`` and ``shape`` (a document, see
+:func:`~mongotail.shape.get_shape_document`), plus the metadata fields
+given with ``-m``, or all the fields of the entry with ``-v``. The BSON types are written as MongoDB Extended JSON (relaxed mode),
+eg. ``{"$oid": "548b164144ae122dc430376b"}``, instead of the Mongo shell
+syntax used by the default output.
+
+The JSON records are serialized with orjson if it's installed, and
+MessagePack needs the ``msgpack`` package.
+"""
+
+from __future__ import absolute_import
+import csv
+import json
+from datetime import datetime
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping   # Python 2.7
+from bson import json_util
+from bson.binary import UuidRepresentation
+from .jsondec import TEXT_TYPES, INTEGER_TYPES
+from .shape import get_shape, get_shape_document
+from .checkpoint import Gap
+from .err import error
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+RECORD_FIELDS = ["ts", "op", "ns", "millis", "shape"]
+GAP_FIELDS = ["lost_entries", "lost_seconds"]      # Fields of the records of the entries lost
+EPOCH = datetime(1970, 1, 1)
+
+JSON_OPTIONS = json_util.JSONOptions(json_mode=json_util.JSONMode.RELAXED,
+                                     uuid_representation=UuidRepresentation.STANDARD)
+
+
+def get_record(obj, verbose, metadata, formatters, source=None):
+    """
+    Build the record printed for the log entry `obj`: a dict with
+    the :data:`RECORD_FIELDS` and the `metadata` fields found in
+    `obj`, or all the fields of `obj` if `verbose` is ``True``.
+    If `source` is set, it's added as the first field.
+    """
+    record = {"source": source} if source else {}
+    if isinstance(obj, Gap):
+        # Marker of entries lost, see :func:`~mongotail.out.print_gap`
+        record.update(ts=obj['ts'], op="gap", ns=obj['ns'], millis=None, shape=None,
+                      lost_entries=obj['entries'], lost_seconds=obj['seconds'])
+        return record
+    if verbose:
+        record.update(obj)
+        return record
+    try:
+        shape = get_shape(obj, formatters)
+    except (KeyError, TypeError):
+        shape = None
+    record["ts"] = obj.get("ts")
+    record["op"] = shape[0] if shape else obj.get("op")
+    record["ns"] = obj.get("ns")
+    record["millis"] = obj.get("millis")
+    record["shape"] = get_shape_document(obj) if shape else None
+    if metadata:
+        for m in metadata:
+            if m in obj and m not in record:
+                record[m] = obj[m]
+    return record
+
+
+def to_json(o):
+    """
+    Convert the BSON types that are not serializable in JSON.
+    """
+    if isinstance(o, Mapping):
+        return dict(o)      # RawBSONDocument
+    return json_util.default(o, JSON_OPTIONS)
+
+
+class NDJSONFormat(object):
+    """
+    One JSON document per line.
+    """
+    binary = False
+
+    if orjson:
+        def dumps(self, record):
+            return orjson.dumps(record, default=to_json,
+                                option=orjson.OPT_PASSTHROUGH_DATETIME).decode("utf-8")
+    else:
+        def dumps(self, record):
+            return json.dumps(record, default=to_json, ensure_ascii=False, separators=(",", ":"))
+
+    def encode(self, obj, verbose, metadata, formatters, source=None):
+        return self.dumps(get_record(obj, verbose, metadata, formatters, source)) + "\n"
+
+
+class CSVFormat(object):
+    """
+    Comma-separated values, with a header line with the names of the
+    fields: the ``source`` of the entries if `source` is ``True``, the
+    :data:`RECORD_FIELDS`, the `metadata` fields and the :data:`GAP_FIELDS`,
+    the same for all the records. The values that aren't numbers or
+    strings are written in JSON.
+    """
+    binary = False
+
+    def __init__(self, metadata=None, source=False):
+        self._writer = csv.writer(self, lineterminator="\n")
+        self._json = NDJSONFormat()
+        self._line = None
+        self._header = (["source"] if source else []) + RECORD_FIELDS
+        self._header += [m for m in metadata or () if m not in self._header] + GAP_FIELDS
+        self._started = False
+
+    def write(self, line):
+        self._line = line
+
+    def value(self, value):
+        if value is None or isinstance(value, TEXT_TYPES + INTEGER_TYPES + (float,)):
+            return value
+        if isinstance(value, datetime):
+            return value.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+        return self._json.dumps(value)
+
+    def encode(self, obj, verbose, metadata, formatters, source=None):
+        record = get_record(obj, verbose, metadata, formatters, source)
+        text = ""
+        if not self._started:
+            self._started = True
+            self._writer.writerow(self._header)
+            text = self._line
+        self._writer.writerow([self.value(record.get(field)) for field in self._header])
+        return text + self._line
+
+
+class MsgpackFormat(object):
+    """
+    A stream of MessagePack maps, with the ``ts`` as a MessagePack timestamp.
+    """
+    binary = True
+
+    def __init__(self):
+        try:
+            import msgpack
+        except ImportError:
+            error("The msgpack package is needed for the msgpack format, install it "
+                  "with: pip install msgpack", 1)
+        self._packer = msgpack.Packer(default=self.default)
+        self._timestamp = msgpack.Timestamp
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            delta = o - EPOCH
+            return self._timestamp(delta.days * 86400 + delta.seconds, delta.microseconds * 1000)
+        return to_json(o)
+
+    def encode(self, obj, verbose, metadata, formatters, source=None):
+        return self._packer.pack(get_record(obj, verbose, metadata, formatters, source))
+
+
+def get_record_format(name, metadata=None, source=False):
+    """
+    Get the object that encodes the log entries in the format `name`,
+    one of :data:`mongotail.mongotail.FORMATS`, with the `metadata`
+    fields, and the ``source`` field if `source` is ``True``.
+    """
+    if name == "ndjson":
+        return NDJSONFormat()
+    if name == "csv":
+        return CSVFormat(metadata, source)
+    if name == "msgpack":
+        return MsgpackFormat()
+    raise ValueError('Unknown format "%s"' % name)
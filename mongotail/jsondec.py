@@ -22,7 +22,14 @@
 ##############################################################################
 
 
-import re, json
+
+import re
+import json
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping   # Python 2.7
+from json.encoder import encode_basestring_ascii, c_make_encoder
 from bson import ObjectId, DBRef, regex, MinKey, MaxKey
 from bson.decimal128 import Decimal128
 from bson.timestamp import Timestamp
@@ -32,59 +39,98 @@ import base64
 
 REGEX_TYPE = type(re.compile(""))
 
+try:
+    TEXT_TYPES = (str, unicode)         # Python 2.7
+    INTEGER_TYPES = (int, long)
+except NameError:
+    TEXT_TYPES = (str,)
+    INTEGER_TYPES = (int,)
+
+INFINITY = float("inf")
+
+# Placeholder of the BSON values for the standard JSON encoder, and
+# how it's printed, with the control chars escaped
+PLACEHOLDER = "\x00bson\x00"
+ENCODED_PLACEHOLDER = encode_basestring_ascii(PLACEHOLDER)
+
+MORE_BYTES = u"\u2026(%d more bytes)"
+MORE_ITEMS = u"\u2026(%d%s more items)"
+
+
+def slice_size(max_bytes):
+    """
+    Max number of elements of an array that can be printed
+    within ``max_bytes``: all the elements but the first one take
+    at least 3 chars, the ", " separator and the value itself.
+    """
+    return max_bytes // 3 + 2
+
+
+class JSONEncoder(object):
+    """
+    Encode the objects returned by MongoDB in JSON, but
+    with the BSON types printed like in the Mongo shell, eg.
+    ``ObjectId("...")``, ``ISODate("...")``, ``Timestamp(t, i)`` ...
+
+    The object is encoded by the standard JSON encoder (written in C),
+    with the BSON values replaced by a placeholder, and then the output
+    is split by the placeholder and joined with the BSON values encoded,
+    in the same order. The function to encode each BSON value is chosen
+    by its type, caching the function chosen for each class found.
 
-class JSONEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, ObjectId):
-            return "ObjectId(%sObjectId)" % str(o)
-        if isinstance(o, UUID): 
-            return "UUID(%sUUID)" % str(o)
-        if isinstance(o, DBRef):
-            return "DBRef(Field(%sField), ObjectId(%sObjectId)DBRef)" % (o.collection, str(o.id))
-        if isinstance(o, datetime):
-            try:
-                return "ISODate(" + o.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "ZISODate)"
-            except ValueError:
-                return "ISODate(" + o.isoformat()[:-3] + "ZISODate)"
-        if isinstance(o, Timestamp):
-            return "Timestamp(%s, %sTimestamp)" % (o.time, o.inc)
-        if isinstance(o, (REGEX_TYPE, regex.Regex)):
-            return {"$regex": o.pattern}
-        if isinstance(o, Decimal128):
-            return "NumberDecimal(" + str(o) + "NumberDecimal)"
-        if isinstance(o, MinKey):
-            return "MinKey(MinKey)"
-        if isinstance(o, MaxKey):
-            return "MinKey(MinKey)"
-        if isinstance(o, bytes):
-            return 'BinData(0,' + base64.b64encode(o).decode('utf-8') + 'BinData)'
-        return json.JSONEncoder.default(self, o)
+    With ``max_bytes`` set, each object is encoded up to
+    ``max_bytes`` chars, the strings that exceed the limit are cut
+    with a ``…(N more bytes)`` marker, and the rest of the
+    items of the dicts and arrays are skipped with a
+    ``…(N more items)`` marker, so the values skipped are
+    never encoded.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self._encoders = {
+            str: encode_basestring_ascii,
+            int: int.__repr__,
+            float: self._encode_float,
+            bool: self._encode_bool,
+            type(None): self._encode_none,
+            dict: self._encode_dict,
+            list: self._encode_list,
+            tuple: self._encode_list,
+            ObjectId: self._encode_objectid,
+            datetime: self._encode_datetime,
+        }
+        for cls in TEXT_TYPES:
+            self._encoders[cls] = encode_basestring_ascii
 
     def encode(self, o):
-        result = super(JSONEncoder, self).encode(o)
-        result = result.replace('Field(', '"')
-        result = result.replace("Field)", '"')
-        result = result.replace('ObjectId(', 'ObjectId("')
-        result = result.replace('"ObjectId(', 'ObjectId(')
-        result = result.replace('ObjectId)"', '")')
-        result = result.replace('ObjectId)', '")')
-        result = result.replace('"DBRef(', 'DBRef(')
-        result = result.replace('DBRef)"', ')')
-        result = result.replace('"ISODate(', 'ISODate("')
-        result = result.replace('ISODate)"', '")')
-        result = result.replace('"Timestamp(', 'Timestamp(')
-        result = result.replace('Timestamp)"', ')')
-        result = result.replace('"UUID(', 'UUID("')
-        result = result.replace('UUID)"', '")')
-        result = result.replace('"NumberDecimal(', 'NumberDecimal("')
-        result = result.replace('NumberDecimal)"', '")')
-        result = result.replace('"MinKey(', 'MinKey(')
-        result = result.replace('MinKey)"', ')')
-        result = result.replace('"MaxKey(', 'MaxKey(')
-        result = result.replace('MaxKey)"', ')')
-        result = result.replace('"BinData(0,', 'BinData(0,"')
-        result = result.replace('BinData)"', '")')
-        return result
+        if self.max_bytes is not None:
+            parts = []
+            self._encode_limited(o, parts, [self.max_bytes])
+            return "".join(parts)
+        values = []
+
+        def default(v):
+            enc = self._encoders.get(v.__class__) or self._lookup(v.__class__)
+            if enc == self._encode_dict:
+                return dict(v.items())      # Eg. RawBSONDocument
+            if enc == self._encode_regex:
+                return {"$regex": v.pattern}
+            values.append(enc(v))
+            return PLACEHOLDER
+
+        if c_make_encoder is not None:
+            result = "".join(c_make_encoder(None, default, encode_basestring_ascii, None,
+                                            ": ", ", ", False, False, True)(o, 0))
+        else:
+            result = json.JSONEncoder(check_circular=False, default=default).encode(o)
+        if not values:
+            return result
+        pieces = result.split(ENCODED_PLACEHOLDER)
+        if len(pieces) != len(values) + 1:
+            # A string of the object has the placeholder, encoded one value at a time
+            return (self._encoders.get(o.__class__) or self._lookup(o.__class__))(o)
+        return "".join([s for piece in zip(pieces, values) for s in piece]) + pieces[-1]
 
     def encode_number(self, num):
         """
@@ -94,3 +140,190 @@ class JSONEncoder(json.JSONEncoder):
         if isinstance(num, float) and num.is_integer():
             return str(int(num))
         return str(num)
+
+    def _lookup(self, cls):
+        """
+        Find the function to encode objects of class `cls`, checking
+        the types in the same order than the standard JSON encoder,
+        and cache it for the next objects of the same class.
+        """
+        if issubclass(cls, TEXT_TYPES):
+            enc = encode_basestring_ascii
+        elif issubclass(cls, bool):
+            enc = self._encode_bool
+        elif issubclass(cls, INTEGER_TYPES):
+            enc = self._encode_int
+        elif issubclass(cls, float):
+            enc = self._encode_float
+        elif issubclass(cls, (list, tuple)):
+            enc = self._encode_list
+        elif issubclass(cls, Mapping):
+            # dict, and also RawBSONDocument, decoded while is encoded
+            enc = self._encode_dict
+        elif issubclass(cls, ObjectId):
+            enc = self._encode_objectid
+        elif issubclass(cls, UUID):
+            enc = self._encode_uuid
+        elif issubclass(cls, DBRef):
+            enc = self._encode_dbref
+        elif issubclass(cls, datetime):
+            enc = self._encode_datetime
+        elif issubclass(cls, Timestamp):
+            enc = self._encode_timestamp
+        elif issubclass(cls, (REGEX_TYPE, regex.Regex)):
+            enc = self._encode_regex
+        elif issubclass(cls, Decimal128):
+            enc = self._encode_decimal
+        elif issubclass(cls, MinKey):
+            enc = self._encode_minkey
+        elif issubclass(cls, MaxKey):
+            enc = self._encode_maxkey
+        elif issubclass(cls, bytes):
+            enc = self._encode_bytes
+        else:
+            raise TypeError("Object of type %s is not JSON serializable" % cls.__name__)
+        self._encoders[cls] = enc
+        return enc
+
+    def _encode_dict(self, o):
+        if not o:
+            return "{}"
+        get, lookup = self._encoders.get, self._lookup
+        try:
+            return "{" + ", ".join([encode_basestring_ascii(k) + ": " + (get(v.__class__) or lookup(v.__class__))(v)
+                                    for k, v in o.items()]) + "}"
+        except TypeError:
+            # Not all the keys are strings
+            return "{" + ", ".join([encode_basestring_ascii(k if isinstance(k, TEXT_TYPES) else self._encode_key(k))
+                                    + ": " + (get(v.__class__) or lookup(v.__class__))(v)
+                                    for k, v in o.items()]) + "}"
+
+    def _encode_list(self, o):
+        if not o:
+            return "[]"
+        get, lookup = self._encoders.get, self._lookup
+        return "[" + ", ".join([(get(v.__class__) or lookup(v.__class__))(v) for v in o]) + "]"
+
+    def _encode_limited(self, o, parts, budget):
+        """
+        Append to `parts` the encoded `o`, discounting from
+        ``budget[0]`` the chars appended.
+        """
+        enc = self._encoders.get(o.__class__) or self._lookup(o.__class__)
+        if enc == self._encode_dict:
+            items = o.items()
+            opening, closing = "{", "}"
+        elif enc == self._encode_list:
+            items = o
+            opening, closing = "[", "]"
+        elif enc is encode_basestring_ascii:
+            keep = max(budget[0] - 2, 0)
+            if len(o) > keep:
+                # Escaped chars make the string a bit longer, but the extra is bounded
+                s = encode_basestring_ascii(o[:keep])[:-1] \
+                    + MORE_BYTES % len(o[keep:].encode("utf-8", "surrogatepass")) + '"'
+            else:
+                s = encode_basestring_ascii(o)
+            parts.append(s)
+            budget[0] -= len(s)
+            return
+        else:
+            s = enc(o)
+            parts.append(s)
+            budget[0] -= len(s)
+            return
+        parts.append(opening)
+        budget[0] -= 1
+        i = 0
+        for item in items:
+            if budget[0] <= 0:
+                n = len(o)
+                # Arrays of `slice_size` elements are probably sliced by the query projection
+                sliced = "+" if closing == "]" and n == slice_size(self.max_bytes) else ""
+                parts.append((", " if i else "") + MORE_ITEMS % (n - i, sliced))
+                break
+            if i:
+                parts.append(", ")
+                budget[0] -= 2
+            if closing == "}":
+                k, item = item
+                key = encode_basestring_ascii(k if isinstance(k, TEXT_TYPES) else self._encode_key(k)) + ": "
+                parts.append(key)
+                budget[0] -= len(key)
+            self._encode_limited(item, parts, budget)
+            i += 1
+        parts.append(closing)
+        budget[0] -= 1
+
+    def _encode_key(self, k):
+        if isinstance(k, float):
+            return self._encode_float(k)
+        if k is True or k is False or k is None:
+            return self.encode(k)
+        if isinstance(k, INTEGER_TYPES):
+            return self._encode_int(k)
+        raise TypeError("keys must be str, int, float, bool or None, not %s" % k.__class__.__name__)
+
+    @staticmethod
+    def _encode_int(o):
+        return "%d" % o
+
+    @staticmethod
+    def _encode_float(o):
+        if o != o:
+            return "NaN"
+        if o == INFINITY:
+            return "Infinity"
+        if o == -INFINITY:
+            return "-Infinity"
+        return float.__repr__(o)
+
+    @staticmethod
+    def _encode_bool(o):
+        return "true" if o else "false"
+
+    @staticmethod
+    def _encode_none(o):
+        return "null"
+
+    @staticmethod
+    def _encode_objectid(o):
+        return 'ObjectId("%s")' % o
+
+    @staticmethod
+    def _encode_uuid(o):
+        return 'UUID("%s")' % o
+
+    @staticmethod
+    def _encode_dbref(o):
+        return 'DBRef(%s, ObjectId("%s"))' % (encode_basestring_ascii(o.collection), o.id)
+
+    @staticmethod
+    def _encode_datetime(o):
+        try:
+            return 'ISODate("' + o.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + 'Z")'
+        except ValueError:
+            return 'ISODate("' + o.isoformat()[:-3] + 'Z")'
+
+    @staticmethod
+    def _encode_timestamp(o):
+        return "Timestamp(%s, %s)" % (o.time, o.inc)
+
+    def _encode_regex(self, o):
+        return '{"$regex": ' + self.encode(o.pattern) + '}'
+
+    @staticmethod
+    def _encode_decimal(o):
+        return 'NumberDecimal("%s")' % o
+
+    @staticmethod
+    def _encode_minkey(o):
+        return "MinKey()"
+
+    @staticmethod
+    def _encode_maxkey(o):
+        return "MaxKey()"
+
+    @staticmethod
+    def _encode_bytes(o):
+        return 'BinData(0,"' + base64.b64encode(o).decode('utf-8') + '")'
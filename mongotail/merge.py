@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+import heapq
+import threading
+import time
+from datetime import datetime
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty     # Python 2.7
+
+
+class LogMerger(object):
+    """
+    Merge the log entries read concurrently from several sources,
+    eg. the profile collections of different databases, in ``ts`` order.
+
+    Each source is an iterable of log entries read in its own thread. The
+    entries are held at most `window` seconds (or until more than `max_size`
+    entries are waiting) to reorder them with the entries of the other
+    sources, before being returned by the iterator.
+    Like the log readers, the iterator returns ``None`` each time there
+    are no more entries for now, eg. to flush the output.
+    New sources can be added while the merger is iterated.
+    """
+
+    def __init__(self, window=0.5, max_size=10000):
+        self.window = window
+        self.max_size = max_size
+        self._queue = Queue(10000)
+        self._heap = []
+        self._count = 0     # Untie entries with the same ts, keeping the order of arrival
+        self._sources = 0
+
+    def add_source(self, name, entries):
+        """
+        Start reading the iterable `entries` in a new thread.
+        The entries are returned by the merger as tuples ``(name, entry)``.
+        """
+        self._sources += 1
+        thread = threading.Thread(target=self._read, args=(name, entries), name="mongotail-%s" % name)
+        thread.daemon = True
+        thread.start()
+
+    def _read(self, name, entries):
+        try:
+            for entry in entries:
+                if entry is not None:
+                    self._queue.put((name, entry, None))
+        except Exception as e:
+            self._queue.put((name, None, e))
+        self._queue.put((name, None, None))     # Source finished
+
+    def __iter__(self):
+        """
+        Iterate over tuples ``(name, entry)``, or ``(name, exception)`` when
+        the source `name` fails, or ``None`` when there are no entries for now.
+        """
+        heap = self._heap
+        while self._sources:
+            try:
+                name, entry, error = self._queue.get(timeout=min(self.window / 2, 1))
+            except Empty:
+                expire = time.time() - self.window
+                while heap and heap[0][2] <= expire:
+                    yield heapq.heappop(heap)[3:]
+                yield None
+                continue
+            if error is not None:
+                yield name, error
+            elif entry is None:
+                self._sources -= 1
+            else:
+                self._count += 1
+                heapq.heappush(heap, (entry['ts'], self._count, time.time(), name, entry))
+                expire = time.time() - self.window
+                while heap and (heap[0][2] <= expire or len(heap) > self.max_size):
+                    yield heapq.heappop(heap)[3:]
+        while heap:     # All the sources finished, there are no more entries to wait for
+            yield heapq.heappop(heap)[3:]
+
+
+class SortedLogMerger(object):
+    """
+    Merge in ``ts`` order the log entries of sources that are already
+    sorted by ``ts``, eg. the last N entries of each log (without follow mode).
+
+    Unlike :class:`LogMerger`, the sources are read in the thread that
+    iterates the merger, one entry at a time when it's the next one to
+    return, so only one entry of each source is held in memory.
+    The iterator returns ``None`` at the end, when there are no more entries.
+    """
+
+    def __init__(self):
+        self._sources = []
+
+    def add_source(self, name, entries):
+        """
+        Add the iterable `entries`, returned by the merger as tuples ``(name, entry)``.
+        """
+        self._sources.append(self._read(len(self._sources), name, entries))
+
+    @staticmethod
+    def _read(i, name, entries):
+        # Tuples sorted by ts, then by source and order of arrival, never comparing the entries
+        ts = datetime.min
+        count = 0
+        try:
+            for entry in entries:
+                if entry is not None:
+                    ts = entry['ts']
+                    count += 1
+                    yield ts, i, count, name, entry
+        except Exception as e:
+            yield ts, i, count + 1, name, e
+
+    def __iter__(self):
+        """
+        Iterate over tuples ``(name, entry)``, or ``(name, exception)`` when the source `name` fails.
+        """
+        for item in heapq.merge(*self._sources):
+            yield item[3:]
+        yield None
@@ -24,18 +24,43 @@
 
 
 from __future__ import absolute_import
-import sys, re, argparse
+import sys, re, time, argparse
+from datetime import datetime, timedelta
 from errno import ECONNREFUSED
 
-from .conn import connect
-from .out import print_obj
-from .err import error, error_parsing, EINTR, EDESTADDRREQ
-from pymongo.read_preferences import ReadPreference
-from pymongo.errors import ConnectionFailure, OperationFailure
+# Only light modules are imported here, so the command starts fast when it
+# doesn't need to connect, eg. with --help. The modules of PyMongo, and the
+# ones that depend on it, are imported in the functions that use them
+from .checkpoint import Checkpoint, Gap
+from .err import error, error_parsing, warn, EINTR, EINVAL, EDESTADDRREQ, ENODATA
 
 from . import __version__, __doc__, __url__, __usage__
 
 DEFAULT_LIMIT = 10
+DISCOVERY_INTERVAL = 10     # Seconds between checks for new databases to log
+RETRY_DELAY = 1             # Seconds to wait before re-opening the log, doubled on each retry
+MAX_RETRY_DELAY = 60
+UNTIL_SLACK = 1             # Seconds the entries can be out of ts order in the log, read after --until
+TIME_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+PROFILE_WINDOW = 3600       # Seconds of log the suggested size of the profile collection can hold
+SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+FORMATS = ("ndjson", "csv", "msgpack")     # Formats of --format, see mongotail.formats
+EXPLAIN_VERBOSITIES = ("queryPlanner", "executionStats")    # Of --explain, see mongotail.explain
+
+# Errors reading a tailable cursor that can be fixed re-opening it, eg.
+# CappedPositionLost: the entries were overwritten before being read
+RESUMABLE_ERRORS = (
+    43,     # CursorNotFound
+    91,     # ShutdownInProgress
+    96,     # OperationFailed (CappedPositionLost before MongoDB 3.2)
+    136,    # CappedPositionLost
+    175,    # QueryPlanKilled
+    189,    # PrimarySteppedDown
+    237,    # CursorKilled
+    11600,  # InterruptedAtShutdown
+    11602,  # InterruptedDueToReplStateChange
+    13436,  # NotPrimaryOrSecondary
+)
 LOG_QUERY = {
         "ns": re.compile(r"^((?!(admin\.\$cmd|\.system|\.tmp\.)).)*$"),
         "command.profile": {"$exists": False},
@@ -53,33 +78,478 @@ LOG_QUERY = {
         "op": re.compile(r"^((?!(getmore|killcursors)).)", re.IGNORECASE),
 }
 
-LOG_FIELDS = ['ts', 'op', 'ns', 'query', 'updateobj', 'command', 'ninserted', 'ndeleted', 'nMatched', 'nreturned']
+LOG_FIELDS = ['ts', 'op', 'ns', 'query', 'updateobj', 'command', 'ninserted', 'ndeleted', 'nMatched', 'nreturned',
+              'millis']
+# Arrays that can be huge, eg. the documents inserted, trimmed with --max-doc-bytes in verbose mode
+BIG_ARRAY_FIELDS = ['query.documents', 'command.documents', 'command.pipeline', 'command.updates',
+                    'command.deletes']
+
+
+def tail(client, db, lines, follow, verbose, metadata, lazy=False, query=LOG_QUERY, checkpoint=None,
+         sampler=None, since=None, until=None, controller=None, explainer=None, batch_size=None,
+         max_await_time_ms=None):
+    from .out import print_obj, print_gap, get_formatters, output
+    fields = get_fields(verbose, metadata)
+    lines = parse_lines(lines)
+    formatters = get_formatters(client.server_info()['version'])
+    try:
+        for result in read_log(db, lines, follow, fields, lazy, query, checkpoint, report_gaps=True,
+                               since=since, until=until, batch_size=batch_size,
+                               max_await_time_ms=max_await_time_ms):
+            if result is None:
+                output.flush()
+                if sampler:
+                    sampler.tick()
+                if controller:
+                    controller.tick()
+            elif isinstance(result, Gap):
+                print_gap(result, verbose, metadata, formatters)
+            else:
+                if controller:
+                    controller.add(result)
+                if not sampler or sampler.accept(result, formatters):
+                    print_obj(result, verbose, metadata, formatters,
+                              plan=explainer and explainer.get_plan(result, formatters))
+    finally:
+        if sampler:
+            output.flush()
+            sampler.close()
+        if controller:
+            controller.close()
+        if explainer:
+            output.flush()
+            explainer.close()
+
+
+def tail_databases(client, dbnames, lines, follow, verbose, metadata, lazy=False, query=LOG_QUERY,
+                   sampler=None, since=None, until=None, explainer=None, batch_size=None,
+                   max_await_time_ms=None):
+    """
+    Like :func:`tail`, but reading concurrently the logs of all the databases
+    in `dbnames` (all the databases of the server if it's ``["*"]``), and
+    printing them merged in ``ts`` order. The last N `lines` are printed
+    for each database.
+    In `follow` mode, the databases that start being profiled after
+    the command is launched are also logged as they are found.
+    """
+    from pymongo.errors import OperationFailure
+    from .out import print_obj, print_gap, get_formatters, output
+    from .merge import LogMerger, SortedLogMerger
+    fields = get_fields(verbose, metadata)
+    lines = parse_lines(lines)
+    formatters = get_formatters(client.server_info()['version'])
+    # Without follow each log is read in ts order, and they are merged as they are read
+    merger = LogMerger() if follow else SortedLogMerger()
+    started = set()
+
+    def discover(lines):
+        names = client.list_database_names() if dbnames == ["*"] else dbnames
+        for name in names:
+            if name in started or name in ("local", "config"):
+                continue
+            try:
+                profiled = client[name].list_collection_names(filter={"name": "system.profile"})
+            except OperationFailure as e:
+                warn('Cannot read the log of the "%s" database: %s' % (name, e))
+                started.add(name)
+                continue
+            if profiled:
+                started.add(name)
+                merger.add_source(name, read_log(client[name], lines, follow, fields, lazy, query,
+                                                 report_gaps=True, since=since, until=until,
+                                                 batch_size=batch_size, max_await_time_ms=max_await_time_ms))
+
+    discover(lines)
+    next_discovery = time.time() + DISCOVERY_INTERVAL
+    try:
+        while True:
+            for item in merger:
+                if item is None:
+                    output.flush()
+                    if sampler:
+                        sampler.tick()
+                elif isinstance(item[1], Exception):
+                    warn('Error reading the log of the "%s" database: %s' % item)
+                elif isinstance(item[1], Gap):
+                    print_gap(item[1], verbose, metadata, formatters, full_ns=True)
+                elif not sampler or sampler.accept(item[1], formatters):
+                    print_obj(item[1], verbose, metadata, formatters, full_ns=True,
+                              plan=explainer and explainer.get_plan(item[1], formatters))
+                if follow and time.time() >= next_discovery:
+                    discover(None)      # Databases found later are logged from the beginning
+                    next_discovery = time.time() + DISCOVERY_INTERVAL
+            output.flush()
+            if not follow:
+                break
+            time.sleep(max(next_discovery - time.time(), 0))
+            discover(None)
+            next_discovery = time.time() + DISCOVERY_INTERVAL
+    finally:
+        if sampler:
+            output.flush()
+            sampler.close()
+        if explainer:
+            output.flush()
+            explainer.close()
+
+
+def tail_cluster(members, lines, follow, verbose, metadata, lazy=False, query=LOG_QUERY, sampler=None,
+                 since=None, until=None, batch_size=None, max_await_time_ms=None):
+    """
+    Like :func:`tail`, but reading concurrently the logs of all the
+    `members` of a cluster (see :func:`~mongotail.conn.connect_cluster`),
+    and printing them merged in ``ts`` order, with the name of the member
+    after the time. The last N `lines` are printed for each member.
+    """
+    from pymongo.errors import PyMongoError
+    from .out import print_obj, print_gap, get_formatters, output
+    from .merge import LogMerger, SortedLogMerger
+    fields = get_fields(verbose, metadata)
+    lines = parse_lines(lines)
+    # Without follow each log is read in ts order, and they are merged as they are read
+    merger = LogMerger() if follow else SortedLogMerger()
+    formatters = {}
+    for name, member_client, db in members:
+        try:
+            # Each member may run a different version during an upgrade
+            formatters[name] = get_formatters(member_client.server_info()['version'])
+        except PyMongoError as e:
+            warn('Cannot connect with "%s": %s' % (name, e))
+            continue
+        merger.add_source(name, read_log(db, lines, follow, fields, lazy, query, report_gaps=True,
+                                         since=since, until=until, batch_size=batch_size,
+                                         max_await_time_ms=max_await_time_ms))
+    try:
+        for item in merger:
+            if item is None:
+                output.flush()
+                if sampler:
+                    sampler.tick()
+            elif isinstance(item[1], Exception):
+                warn('Error reading the log of "%s": %s' % item)
+            elif isinstance(item[1], Gap):
+                print_gap(item[1], verbose, metadata, formatters[item[0]], source=item[0])
+            elif not sampler or sampler.accept(item[1], formatters[item[0]]):
+                print_obj(item[1], verbose, metadata, formatters[item[0]], source=item[0])
+    finally:
+        output.flush()
+        if sampler:
+            sampler.close()
+
+
+def tail_top(client, db, lines, lazy=False, query=LOG_QUERY, batch_size=None, max_await_time_ms=None):
+    """
+    Show the live view of the query shapes of the operations logged
+    (see :func:`~mongotail.top.top`), starting with the last N `lines`.
+    """
+    from .out import get_formatters
+    from .shape import STATS_FIELDS
+    from .top import top
+    lines = parse_lines(lines)
+    formatters = get_formatters(client.server_info()['version'])
+    top(read_log(db, lines, True, LOG_FIELDS + STATS_FIELDS, lazy, query, batch_size=batch_size,
+                 max_await_time_ms=max_await_time_ms), formatters, db.name)
+
+
+def tail_serve(client, db, lines, address, lazy=False, query=LOG_QUERY, batch_size=None,
+               max_await_time_ms=None):
+    """
+    Serve the metrics of the operations logged in the Prometheus format
+    (see :func:`~mongotail.exporter.serve`), starting with the last N `lines`.
+    """
+    from .shape import STATS_FIELDS
+    from .exporter import serve
+    lines = parse_lines(lines)
+    sys.stderr.write("Serving the metrics of %s in http://%s:%s/metrics\n"
+                     % (db.name, address[0] or "localhost", address[1]))
+    sys.stderr.flush()
+    serve(read_log(db, lines, True, LOG_FIELDS + STATS_FIELDS + ['planSummary'], lazy, query,
+                   batch_size=batch_size, max_await_time_ms=max_await_time_ms), address)
+
+
+def tail_advise(client, db, lines, follow, lazy=False, query=LOG_QUERY, since=None, until=None, batch_size=None,
+                max_await_time_ms=None):
+    """
+    Print the indexes suggested for the operations logged (see
+    :class:`~mongotail.advisor.Advisor`) in the last N `lines`, or in
+    `follow` mode, when the command is stopped.
+    """
+    from .advisor import Advisor, ADVISE_FIELDS
+    lines = parse_lines(lines)
+    advisor = Advisor(db)
+    try:
+        for result in read_log(db, lines, follow, LOG_FIELDS + ADVISE_FIELDS, lazy, query,
+                               since=since, until=until, batch_size=batch_size,
+                               max_await_time_ms=max_await_time_ms):
+            if result is not None:
+                advisor.add(result)
+    except KeyboardInterrupt:
+        sys.stdout.write("\n")
+    advisor.report()
+
+
+def record(client, db, path, lines, follow, query=LOG_QUERY, since=None, until=None, batch_size=None,
+           max_await_time_ms=None):
+    """
+    Write in the capture file `path` the raw entries of the log, with
+    all their fields, instead of printing them (see :mod:`mongotail.capture`).
+    """
+    from .capture import Recorder
+    lines = parse_lines(lines)
+    recorder = Recorder(path, client.server_info()['version'], db.name)
+    try:
+        for result in read_log(db, lines, follow, None, True, query, since=since, until=until,
+                               batch_size=batch_size, max_await_time_ms=max_await_time_ms):
+            if result is None:
+                recorder.flush()
+            else:
+                recorder.write(result)
+    finally:
+        recorder.close()
+        sys.stderr.write("%d entries recorded in %s\n" % (recorder.count, path))
+
+
+def replay(path, verbose, metadata, log_filter=None, since=None, until=None, sampler=None, advise=False):
+    """
+    Print the entries of the capture file `path` recorded with :func:`record`,
+    between the datetimes `since` and `until` (optional), that
+    pass the `log_filter` (a :class:`~mongotail.filters.LogFilter`).
+    With `advise`, the indexes suggested for the entries are printed
+    instead, like with :func:`tail_advise`.
+    """
+    from .out import print_obj, get_formatters, output
+    from .capture import read_capture
+    try:
+        header, entries = read_capture(path, since, until)
+    except (IOError, ValueError) as e:
+        error('Error reading the capture file "%s": %s' % (path, e), EINVAL)
+    if advise:
+        from .advisor import Advisor
+        advisor = Advisor()
+        for result in entries:
+            if not log_filter or log_filter.match(result):
+                advisor.add(result)
+        advisor.report()
+        return
+    formatters = get_formatters(header['serverVersion'])
+    for result in entries:
+        if (not log_filter or log_filter.match(result)) and (not sampler or sampler.accept(result, formatters)):
+            print_obj(result, verbose, metadata, formatters)
+    output.flush()
+    if sampler:
+        sampler.close()
+
+
+def parse_time(value):
+    """
+    Parse the datetime `value` in UTC, e.g. "2023-01-02 14:02" or "2023-01-02T14:02:30.500",
+    or a time ago in seconds, minutes, hours or days, e.g. "15m" or "-15m".
+    """
+    match = re.match(r"^-?(\d+(?:\.\d+)?)([smhd])$", value.strip())
+    if match:
+        return datetime.utcnow() - timedelta(seconds=float(match.group(1)) * TIME_UNITS[match.group(2)])
+    for time_format in ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S",
+                        "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value.rstrip("Z"), time_format)
+        except ValueError:
+            pass
+    error_parsing('Invalid date "%s"' % value)
 
 
-def tail(client, db, lines, follow, verbose, metadata):
+def get_fields(verbose, metadata):
+    from .out import json_encoder
+    from .jsondec import slice_size
     if verbose:
-        fields = None   # All fields
+        if json_encoder.max_bytes is not None:
+            # All fields, but only the elements of the big arrays that can be printed.
+            # Can't be done with the inclusion projections below, MongoDB 4.4+
+            # rejects eg. "command" and "command.documents" in the same projection
+            size = slice_size(json_encoder.max_bytes)
+            return dict((field, {"$slice": size}) for field in BIG_ARRAY_FIELDS)
+        return None     # All fields
     elif metadata:
-        fields = LOG_FIELDS + metadata
-    else:
-        fields = LOG_FIELDS
+        return LOG_FIELDS + metadata
+    return LOG_FIELDS
+
+
+def parse_lines(lines):
+    """
+    Parse the number of lines to output, or ``None`` for "ALL".
+    """
+    if lines.upper() == "ALL":
+        return None
+    try:
+        return int(lines)
+    except ValueError:
+        error_parsing('Invalid lines number "%s"' % lines)
+
+
+def read_log(db, lines, follow, fields, lazy=False, query=LOG_QUERY, checkpoint=None, report_gaps=False,
+             since=None, until=None, batch_size=None, max_await_time_ms=None):
+    """
+    Generator of the entries logged in the profile collection of `db` that
+    match `query`: the last `lines` entries (all if ``None``), and if `follow`
+    is true, the new entries as they are logged. ``None`` is generated
+    each time there are no more entries for now.
+    If `checkpoint` has a position (see :class:`~mongotail.checkpoint.Checkpoint`),
+    the entries are read from there instead of the last `lines` entries. The
+    checkpoint is moved to each entry as it is generated, and saved also when
+    the reading is interrupted, eg. with Ctrl+C or when the generator is closed.
+    In `follow` mode, if the cursor is closed or the connection is lost, the
+    log is re-opened after the last entry read, waiting between retries.
+    Each time the log is opened from a position, if the entries after it
+    were overwritten (the profile collection is capped), the gap is counted
+    in the stats and a warning is printed, or if `report_gaps` is true,
+    a :class:`~mongotail.checkpoint.Gap` is generated.
+    With `since` (a datetime), the entries are read from there instead of the
+    last `lines` entries, with a ``ts`` condition in the query. With `until`
+    (not in `follow` mode), the last `lines` entries are the ones before it,
+    and the log stops being read after it: the log is read in natural order,
+    that is ``ts`` order except for the entries logged at the same time, so
+    it stops at the first entry logged :data:`UNTIL_SLACK` seconds after it,
+    instead of scanning the rest of the profile collection.
+    """
+    from pymongo import CursorType
+    from pymongo.errors import ConnectionFailure, OperationFailure
+    from bson.raw_bson import DEFAULT_RAW_BSON_OPTIONS
+    from .stats import stats
     profile_collection = db.system.profile
-    cursor = profile_collection.find(LOG_QUERY, projection=fields)
-    if lines.upper() != "ALL":
-        try:
-            lines = int(lines)
-        except ValueError:
-            error_parsing('Invalid lines number "%s"' % lines)
-        skip = profile_collection.count_documents(LOG_QUERY) - lines
-        if skip > 0:
-            cursor.skip(skip)
-    if follow:
-        cursor.add_option(2)   # Set the tailable flag
-        cursor.add_option(32)  # Set the await data flag.
-    server_version = client.server_info()['version']
+    codec_options = profile_collection.codec_options
+    # With the stats enabled, the entries are decoded here to measure the time spent
+    decode = stats.enabled and not lazy
+    if lazy or decode:
+        # Entries are returned as RawBSONDocument objects, that are decoded
+        # as their fields are accessed, and the subdocuments not printed
+        # (execStats, lockStats, ...) are never decoded
+        profile_collection = profile_collection.with_options(codec_options=DEFAULT_RAW_BSON_OPTIONS)
+    if checkpoint is None:
+        checkpoint = Checkpoint()
+    try:
+        if checkpoint.ts is None and lines is not None and since is None:
+            # Read the newest entries backward instead of counting and skipping the whole
+            # collection, so the startup cost depends on N and not on the profile size.
+            # At least one entry is fetched to know from where to follow the log.
+            last_query = query if until is None else dict(query, ts={"$lte": until})
+            last_entries = list(profile_collection.find(last_query, projection=fields)
+                                                  .sort("$natural", -1)
+                                                  .limit(max(lines, 1)))
+            last_entries.reverse()
+            shown = last_entries[-lines:] if lines > 0 else []
+            for result in last_entries[:len(last_entries) - len(shown)]:
+                checkpoint.update(result)
+            read_count = len(last_entries)
+            first_ts = last_entries[0]['ts'] if last_entries else None
+            for result in shown:
+                checkpoint.update(result)
+                yield stats.decode(result, codec_options) if decode else result
+            yield None
+            if not follow:
+                return
+        else:
+            read_count = 0
+            first_ts = None
+        delay = RETRY_DELAY
+        while True:
+            cursor = None
+            try:
+                if checkpoint.ts is not None:
+                    rate = None
+                    if first_ts is not None and checkpoint.ts > first_ts:
+                        rate = (read_count - 1) / (checkpoint.ts - first_ts).total_seconds()
+                    gap = find_gap(profile_collection, checkpoint, rate)
+                    if gap:
+                        stats.add_gap(gap)
+                        if report_gaps:
+                            yield gap
+                        else:
+                            warn(str(gap))
+                cursor_query = checkpoint.query(query)
+                if checkpoint.ts is None and since is not None:
+                    cursor_query = dict(cursor_query, ts={"$gte": since})
+                cursor = profile_collection.find(cursor_query, projection=fields,
+                                                 cursor_type=CursorType.TAILABLE_AWAIT if follow
+                                                 else CursorType.NON_TAILABLE,
+                                                 batch_size=batch_size or 0)
+                if follow and max_await_time_ms is not None:
+                    # How long the server waits for new entries before returning an empty batch
+                    cursor.max_await_time_ms(max_await_time_ms)
+                for result in iter_cursor(cursor):
+                    if result is None:
+                        checkpoint.save()
+                    elif checkpoint.is_read(result):
+                        continue
+                    elif until is not None and result['ts'] > until:
+                        if result['ts'] > until + timedelta(seconds=UNTIL_SLACK):
+                            yield None      # No more entries
+                            break
+                        continue
+                    else:
+                        checkpoint.update(result)
+                        read_count += 1
+                        if first_ts is None:
+                            first_ts = result['ts']
+                        delay = RETRY_DELAY
+                        if decode:
+                            result = stats.decode(result, codec_options)
+                    yield result
+                # The cursor was closed, eg. the profile collection is empty or was dropped
+                wait = RETRY_DELAY
+            except (ConnectionFailure, OperationFailure) as e:
+                if not follow or isinstance(e, OperationFailure) and e.code not in RESUMABLE_ERRORS:
+                    raise
+                warn("Error reading the log, retrying in %s seconds: %s" % (delay, e))
+                wait = delay
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+            finally:
+                if cursor is not None:
+                    cursor.close()
+            if not follow:
+                break
+            time.sleep(wait)
+    finally:
+        # Also when the reading is interrupted, eg. with Ctrl+C or a broken pipe
+        checkpoint.save()
+
+
+def find_gap(profile_collection, checkpoint, rate=None):
+    """
+    Check whether the entries logged after the `checkpoint` position were
+    overwritten, that is, the oldest entry of the capped `profile_collection`
+    is newer than the position.
+    :param rate: entries per second read, used to estimate the entries lost
+    :return: a :class:`~mongotail.checkpoint.Gap` or ``None``
+    """
+    oldest = list(profile_collection.find({}, projection={"ts": 1}).sort("$natural", 1).limit(1))
+    if not oldest or oldest[0]['ts'] <= checkpoint.ts:
+        return None
+    gap = Gap(profile_collection.full_name, checkpoint.ts, oldest[0]['ts'])
+    if rate is not None:
+        gap['entries'] = int(round(rate * gap['seconds']))
+    return gap
+
+
+def iter_cursor(cursor):
+    """
+    Generator of the entries returned by `cursor`, waiting for new
+    entries while the cursor is alive (tailable cursors), and
+    generating ``None`` each time the cursor has no more entries for now:
+    when all the entries of the batch fetched were returned, because the
+    next batch may take until the server has new entries, or when the
+    server returns an empty batch.
+    """
+    from .stats import stats
+    count = 0
     while cursor.alive:
-        for result in cursor:
-            print_obj(result, verbose, metadata, server_version)
+        drained = False
+        for result in (stats.timed("cursor", cursor) if stats.enabled else cursor):
+            count += 1
+            yield result
+            drained = count >= cursor.retrieved
+            if drained:
+                yield None
+        if not drained:
+            yield None
 
 
 def show_profiling_level(client, db):
@@ -109,6 +579,7 @@ def set_slowms_level(client, db, slowms):
 
 
 def show_slowms_level(client, db):
+    from pymongo.read_preferences import ReadPreference
     try:
         level = db.command("profile", -1, read_preference=ReadPreference.PRIMARY)
         sys.stdout.write("Threshold profiling currently in %s milliseconds\n" % level['slowms'])
@@ -116,6 +587,122 @@ def show_slowms_level(client, db):
         error('Error trying to get threshold profiling level. %s' % e, EINTR)
 
 
+def parse_size(size):
+    """
+    Parse a size in bytes, or with the units KB, MB or GB, e.g. "16MB".
+    """
+    match = re.match(r"^\s*(\d+(?:\.\d+)?)\s*([KMG]?B)?\s*$", size, re.IGNORECASE)
+    if not match:
+        error_parsing('Invalid size "%s", e.g. 16MB' % size)
+    return int(float(match.group(1)) * SIZE_UNITS[(match.group(2) or "B").upper()])
+
+
+def format_size(size):
+    for unit in ("GB", "MB", "KB"):
+        if size >= SIZE_UNITS[unit]:
+            return "%.1f %s" % (float(size) / SIZE_UNITS[unit], unit)
+    return "%d B" % size
+
+
+def get_profile_stats(db):
+    """
+    Get the size, number of entries and average entry size of the
+    profile collection, and the rate of entries logged per second,
+    or ``None`` if the collection doesn't exist.
+    """
+    if not db.list_collection_names(filter={"name": "system.profile"}):
+        return None
+    coll_stats = db.command("collStats", "system.profile")
+    profile_stats = {
+        "maxSize": coll_stats.get("maxSize", coll_stats.get("storageSize", 0)),
+        "count": coll_stats.get("count", 0),
+        "avgObjSize": coll_stats.get("avgObjSize", 0),
+        "seconds": 0,
+        "rate": None,
+    }
+    projection = {"ts": 1, "_id": 0}
+    oldest = list(db.system.profile.find({}, projection=projection).sort("$natural", 1).limit(1))
+    newest = list(db.system.profile.find({}, projection=projection).sort("$natural", -1).limit(1))
+    if oldest and newest:
+        profile_stats["seconds"] = (newest[0]['ts'] - oldest[0]['ts']).total_seconds()
+        if profile_stats["seconds"] > 0:
+            profile_stats["rate"] = profile_stats["count"] / profile_stats["seconds"]
+    return profile_stats
+
+
+def suggest_profile_size(profile_stats):
+    """
+    Size of the profile collection that can hold :data:`PROFILE_WINDOW`
+    seconds of log at the rate observed, rounded up to MB, or ``None``
+    if the rate is unknown.
+    """
+    if not profile_stats or not profile_stats["rate"] or not profile_stats["avgObjSize"]:
+        return None
+    size = profile_stats["rate"] * profile_stats["avgObjSize"] * PROFILE_WINDOW
+    return int(-(-size // SIZE_UNITS["MB"])) * SIZE_UNITS["MB"]
+
+
+def show_profile_size(client, db):
+    try:
+        profile_stats = get_profile_stats(db)
+    except Exception as e:
+        error('Error trying to get the size of the profile collection. %s' % e, EINTR)
+    if profile_stats is None:
+        sys.stdout.write("The profile collection doesn't exist yet\n")
+        return
+    out = "Profile collection size: %s, %d entries of %s on average, with %.1f minutes of log\n" % (
+        format_size(profile_stats["maxSize"]), profile_stats["count"],
+        format_size(profile_stats["avgObjSize"]), profile_stats["seconds"] / 60)
+    suggested = suggest_profile_size(profile_stats)
+    if suggested:
+        out += "Suggested size to keep %d minutes of log at %.1f entries per second: %s\n" % (
+            PROFILE_WINDOW // 60, profile_stats["rate"], format_size(suggested))
+    sys.stdout.write(out)
+
+
+def set_profile_size(client, db, size):
+    """
+    Re-create the profile collection with `size` bytes. The profiler is
+    disabled while the collection is dropped and created again, and the
+    previous configuration is restored after that, even if it fails.
+    If the new collection cannot be created, the previous one is created
+    again with its size.
+    """
+    from pymongo.read_preferences import ReadPreference
+    try:
+        profile = db.command("profile", -1, read_preference=ReadPreference.PRIMARY)
+        profile_stats = get_profile_stats(db)
+    except Exception as e:
+        error('Error trying to get the profiling configuration. %s' % e, EINTR)
+    restore = {"profile": profile["was"], "slowms": profile["slowms"]}
+    for option in ("sampleRate", "filter"):
+        if option in profile:
+            restore[option] = profile[option]
+    failure = None
+    try:
+        db.command("profile", 0)
+        if profile_stats is not None:
+            db.drop_collection("system.profile")
+        try:
+            db.create_collection("system.profile", capped=True, size=size)
+        except Exception:
+            if profile_stats is not None:
+                db.create_collection("system.profile", capped=True, size=profile_stats["maxSize"])
+            raise
+    except Exception as e:
+        failure = e
+    finally:
+        try:
+            db.command(restore)
+        except Exception as e:
+            error('Error restoring the profiling level "%s" and threshold "%s" milliseconds. %s'
+                  % (restore["profile"], restore["slowms"], e), EINTR)
+    if failure:
+        error('Error resizing the profile collection to %s. %s' % (format_size(size), failure), EINTR)
+    sys.stdout.write("Profile collection resized to %s, profiling level %s and threshold %s "
+                     "milliseconds restored\n" % (format_size(size), restore["profile"], restore["slowms"]))
+
+
 def show_server_info(client, db):
     try:
         info = client.server_info()
@@ -148,62 +735,285 @@ def show_server_info(client, db):
         error('Error trying to get server info. %s' % e, EINTR)
 
 
+def get_parser():
+    """
+    Parser of the command line options.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, usage=__usage__)
+    egroup = parser.add_mutually_exclusive_group()
+    parser.add_argument("-u", "--username", dest="username", default=None,
+                        help="username for authentication")
+    parser.add_argument("-p", "--password", dest="password", default=None,
+                        help="password for authentication. If username is given and password isn't, "
+                             "it's asked from tty")
+    parser.add_argument("-b", "--authenticationDatabase", dest="auth_database", default=None,
+                        help="database to use to authenticate the user. If not specified, the user "
+                             "will be authenticated against the database specified in the [db address]")
+    parser.add_argument("-n", "--lines", dest="n", default=None,
+                        help="output the last N lines, instead of the last 10. Use ALL value to show all lines")
+    parser.add_argument("-f", "--follow", dest="follow", action="store_true", default=False,
+                        help="output appended data as the log grows")
+    parser.add_argument("-l", "--level", dest="level", default=None,
+                        help="specifies the profiling level, which is either 0 for no profiling, "
+                             "1 for only slow operations, or 2 for all operations. Or use with 'status' word "
+                             "to show the current level configured. "
+                             "Uses this option once before logging the database")
+    parser.add_argument("-s", "--slowms", dest="ms", default=None,
+                        help="sets the threshold in milliseconds for the profile to consider a query "
+                             "or operation to be slow (use with `--level 1`). Or use with 'status' word "
+                             "to show the current milliseconds configured")
+    parser.add_argument("--target-rate", dest="target_rate", default=None, metavar="N/s",
+                        help="in follow mode, raise or lower the threshold of the profiler (slowms) to log "
+                             "about N operations per second, writing each change in the standard error, "
+                             "and restore the threshold at the end. Needs the profiling level 1")
+    parser.add_argument("--slowms-range", dest="slowms_range", default=None, metavar="MIN:MAX",
+                        help="with --target-rate, min and max milliseconds of the threshold (default 0:10000)")
+    parser.add_argument("--profile-size", dest="profile_size", default=None, metavar="SIZE",
+                        help="re-creates the profile collection with SIZE bytes, or with units, e.g. 16MB, "
+                             "disabling the profiler meanwhile and restoring its level and threshold after. "
+                             "Or use with 'status' word to show the current size, and a size suggested "
+                             "from the rate of operations logged")
+    parser.add_argument("-m","--metadata", nargs="*",
+                        help="extra metadata fields to show. "
+                             "Known fields (may vary depending of the operation and the MongoDB version): "
+                             "millis, nscanned, docsExamined, execStats, lockStats ...")
+    parser.add_argument("--op", dest="op", default=None,
+                        help="output only these operations, separated by commas. Operations can be: "
+                             "query, insert, update, remove, command, or the name of a command, "
+                             "eg. aggregate, count, distinct, findAndModify, mapReduce ...")
+    parser.add_argument("--ns", dest="ns", default=None,
+                        help="output only the operations of the collections matching this pattern, "
+                             "eg. 'user*', or 'mydb.user*' including the database name. Or use a "
+                             "regular expression between slashes, eg. '/^mydb\\.(users|orders)$/'")
+    parser.add_argument("--min-millis", dest="min_millis", type=int, default=None,
+                        help="output only the operations that took at least these milliseconds")
+    parser.add_argument("--planSummary", dest="plan_summary", default=None,
+                        help="output only the operations with this plan, eg. COLLSCAN or IXSCAN")
+    parser.add_argument("--appName", dest="app_name", default=None,
+                        help="output only the operations sent by the application with this name")
+    parser.add_argument("--authUser", dest="auth_user", default=None,
+                        help="output only the operations executed by this user, as 'name@database', "
+                             "or only 'name' for any database")
+    parser.add_argument("--sample", dest="sample", default=None,
+                        help="print only 1/N of the query shapes (the queries without the literal values), "
+                             "eg. '1/10'. The same shapes are always chosen, so all the executions of "
+                             "the queries sampled are printed")
+    parser.add_argument("--max-rate", dest="max_rate", default=None,
+                        help="print at most R operations per second, eg. '100/s', dropping the rest. "
+                             "With --sample or --max-rate, the number of operations seen and dropped "
+                             "in each collection is written periodically in the standard error")
+    parser.add_argument("--stats-interval", dest="stats_interval", type=float, default=None,
+                        metavar="SECONDS",
+                        help="write every SECONDS stats about Mongotail itself in the standard error: "
+                             "lag between the last entry printed and the current time, latency between "
+                             "each entry is logged and printed, records and bytes printed per second, "
+                             "time of the getMore round trips, and percentage of time spent reading "
+                             "the cursor, decoding, formatting, encoding and writing")
+    parser.add_argument("--stats-file", dest="stats_file", default=None, metavar="FILE",
+                        help="with --stats-interval, append the stats to FILE instead of the standard error")
+    parser.add_argument("--checkpoint", dest="checkpoint", default=None,
+                        help="file where the position of the last entry printed is saved. If the file "
+                             "exists, the log is printed from that position instead of the last N lines, "
+                             "so a new execution continues where the previous one stopped")
+    parser.add_argument("--record", dest="record", default=None, metavar="FILE",
+                        help="write the log entries in FILE instead of printing them, to print "
+                             "them later with --replay. Use the .gz or .zst extension to compress the file")
+    parser.add_argument("--replay", dest="replay", default=None, metavar="FILE",
+                        help="print the log entries recorded in FILE with --record, "
+                             "instead of reading them from a server")
+    parser.add_argument("--since", dest="since", default=None,
+                        help="print the entries logged since this UTC date, eg. '2023-01-02 14:02', "
+                             "or since a time ago in seconds, minutes, hours or days, eg. '15m' (or "
+                             "--since=-15m), instead of the last N lines")
+    parser.add_argument("--until", dest="until", default=None,
+                        help="print the entries logged until this UTC date, or until a time ago, "
+                             "eg. '5m'. The last N lines before it are printed, unless --since is used")
+    parser.add_argument("-i", "--info", dest="info", action="store_true", default=False,
+                        help="get information about the MongoDB server we're connected to")
+    parser.add_argument("-v", "--verbose", dest="verbose", action="store_true", default=False,
+                        help="verbose mode (not recommended). All the operations will printed in JSON without "
+                             "format and with all the information available from the log")
+    parser.add_argument("--format", dest="format", choices=FORMATS, default=None,
+                        help="print the log entries as records for other programs, with the fields ts, op, "
+                             "ns, millis, shape (the query without the literal values) and the metadata "
+                             "fields: 'ndjson' for one JSON document per line, 'csv', or 'msgpack'. With "
+                             "--verbose all the fields are printed (except in CSV)")
+    parser.add_argument("--explain", dest="explain", type=int, default=None, metavar="MS",
+                        help="explain in the server the operations that took at least MS milliseconds, "
+                             "once for each query shape (the query without the literal values) every "
+                             "10 minutes, and at most one per second, printing the winning plan at the end "
+                             "of the line of all the operations of the shape")
+    parser.add_argument("--explain-verbosity", dest="explain_verbosity", default=None,
+                        choices=EXPLAIN_VERBOSITIES,
+                        help="with --explain, 'queryPlanner' (default) only chooses the plan, and "
+                             "'executionStats' also executes it, printing the keys and documents "
+                             "examined, documents returned and milliseconds spent")
+    parser.add_argument("--top", dest="top", action="store_true", default=False,
+                        help="show a live view of the shapes of the operations logged (the queries "
+                             "without the literal values), sorted by the total time spent on each one")
+    parser.add_argument("--serve", dest="serve", default=None, metavar="[HOST]:PORT",
+                        help="instead of printing the operations, serve metrics of them in the Prometheus "
+                             "format in http://HOST:PORT/metrics, eg. ':9216': a histogram of the duration, "
+                             "and the documents and keys examined, documents returned and collection "
+                             "scans of each collection and operation")
+    parser.add_argument("--advise", dest="advise", action="store_true", default=False,
+                        help="instead of printing the operations, print the indexes suggested for the ones "
+                             "that scanned the collection or examined 10 times more documents than returned, "
+                             "sorted by the time they could save, and the existing indexes that start with "
+                             "them or that they extend. Use it with -n ALL, --since, --replay, or with "
+                             "--follow to print them when it's stopped")
+    parser.add_argument("--cluster", dest="cluster", action="store_true", default=False,
+                        help="log all the members of the replica set or the sharded cluster "
+                             "(connecting to a mongos instance) of the server, printing the "
+                             "name of the member in each line")
+    parser.add_argument("--lazy-decode", dest="lazy", action="store_true", default=False,
+                        help="decode only the fields of the log entries that are printed. Reduces CPU and "
+                             "memory usage when the operations logged have big documents")
+    parser.add_argument("--max-doc-bytes", dest="max_doc_bytes", type=int, default=None, metavar="BYTES",
+                        help="print each document (the query, the update, the documents inserted, or "
+                             "with --verbose the whole entry) up to about BYTES chars, cutting the rest "
+                             "of the long strings and arrays. In verbose mode the big arrays are also "
+                             "trimmed in the query to the server")
+    parser.add_argument("--batch-size", dest="batch_size", type=int, default=None, metavar="N",
+                        help="number of entries fetched from the server in each round trip. Bigger "
+                             "batches get more throughput, and smaller ones less latency")
+    parser.add_argument("--max-await-ms", dest="max_await_ms", type=int, default=None, metavar="MS",
+                        help="in follow mode, max time the server waits for new entries before "
+                             "returning an empty batch (the server default is 1000)")
+    parser.add_argument("--line-buffered", dest="line_buffered", action="store_true", default=None,
+                        help="flush the output on every line. By default the output is buffered "
+                             "when it isn't a terminal, eg. redirected to a file or piped to other command")
+    parser.add_argument("--compressors", dest="compressors", default=None,
+                        help="compress the data sent and received from the server with one of these "
+                             "compressors, in order of preference and separated by commas: zstd, snappy "
+                             "or zlib, eg. 'zstd,zlib'. zstd and snappy need extra packages")
+    parser.add_argument("--tls", action="store_true", default=False,
+                        help ="creates the connection to the server using transport layer security")
+    parser.add_argument("--tlsCertificateKeyFile", dest="tlsCertificateKeyFile", default=None,
+                        help="client certificate to connect against MongoDB. It's the concatenation of "
+                             "both the private key and and the certificate file")
+    parser.add_argument("--tlsAllowInvalidCertificates", dest="tlsAllowInvalidCertificates",
+                        action="store_true", default=False,
+                        help="disable the requirement of a certificate from the server when TLS is enabled")
+    parser.add_argument("--tlsCAFile", dest="tlsCAFile", default=None,
+                        help="file that contains a set of concatenated CA "
+                             "certificates, which are used to validate certificates passed from the other "
+                             "end of the connection")
+    parser.add_argument("--tlsCertificateKeyFilePassword", dest="tlsCertificateKeyFilePassword", default=None,
+                        help="password or passphrase to decrypt the encrypted private keys if the "
+                             "private key contained in the certificate keyfile is encrypted")
+    parser.add_argument("--tlsCRLFile", dest="tlsCRLFile", default=None,
+                        help="path to a PEM or DER formatted certificate revocation list")
+    parser.add_argument("-V", "--version", action="version",
+                        version="%(prog)s " + __version__ + " <" + __url__ + "> (python " + sys.version.split(" ")[0] + ")")
+    return parser
+
+
+def setup_log(args):
+    """
+    Check the options to filter and print the log, and set up with them the
+    output and the stats. Only the modules needed by the options
+    are imported, eg. the filters only if the log is filtered.
+    :return: a tuple ``(log_filter, query, sampler)``, where `log_filter`
+             is ``None`` if there are no filters
+    """
+    log_filter = None
+    query = LOG_QUERY
+    if args.op or args.ns or args.min_millis is not None or args.plan_summary or args.app_name \
+            or args.auth_user:
+        from .filters import LogFilter
+        try:
+            log_filter = LogFilter(args.op and args.op.split(","), args.ns, args.min_millis,
+                                   args.plan_summary, args.app_name, args.auth_user)
+        except ValueError as e:
+            error_parsing(str(e))
+        query = log_filter.query(LOG_QUERY)
+    if args.line_buffered:
+        from .out import output
+        output.line_buffered = True
+    sampler = None
+    if args.sample or args.max_rate:
+        from .sampling import Sampler, parse_sample, parse_rate
+        try:
+            sampler = Sampler(args.sample and parse_sample(args.sample),
+                              args.max_rate and parse_rate(args.max_rate))
+        except ValueError as e:
+            error_parsing(str(e))
+        if args.top or args.record or args.serve or args.advise:
+            error_parsing("the --sample and --max-rate options can't be used with --top, --record, "
+                          "--serve or --advise")
+    if args.stats_file and not args.stats_interval:
+        error_parsing("the --stats-file option can only be used with --stats-interval")
+    if args.stats_interval:
+        if args.stats_interval <= 0:
+            error_parsing("the --stats-interval must be greater than 0")
+        try:
+            stats_stream = args.stats_file and open(args.stats_file, "a")
+        except IOError as e:
+            error('Error opening the stats file "%s": %s' % (args.stats_file, e), EINVAL)
+        from .stats import stats
+        from .out import json_encoder
+        stats.start(args.stats_interval, stats_stream)
+        json_encoder.encode = stats.wrap("encode", json_encoder.encode)
+    if args.batch_size is not None:
+        if args.batch_size <= 0:
+            error_parsing("the --batch-size must be greater than 0")
+    if args.max_await_ms is not None:
+        if args.max_await_ms <= 0:
+            error_parsing("the --max-await-ms must be greater than 0")
+    if args.max_doc_bytes is not None:
+        if args.max_doc_bytes <= 0:
+            error_parsing("the --max-doc-bytes must be greater than 0")
+        if args.format or args.record:
+            error_parsing("the --max-doc-bytes option can't be used with --format or --record")
+        from .out import json_encoder
+        json_encoder.max_bytes = args.max_doc_bytes
+    if args.format:
+        if args.format == "csv" and args.verbose:
+            error_parsing("the --verbose option can't be used with the csv format")
+        if args.top or args.record or args.serve or args.advise:
+            error_parsing("the --format option can't be used with --top, --record, --serve or --advise")
+        from .out import output
+        from .formats import get_record_format
+        output.record_format = get_record_format(args.format, args.metadata, bool(args.cluster))
+    return log_filter, query, sampler
+
+
 def main():
+    args, address = get_parser().parse_known_args()
+    stats = None
     try:
-        # Parsing command line options
-        parser = argparse.ArgumentParser(description=__doc__, usage=__usage__)
-        egroup = parser.add_mutually_exclusive_group()
-        parser.add_argument("-u", "--username", dest="username", default=None,
-                            help="username for authentication")
-        parser.add_argument("-p", "--password", dest="password", default=None,
-                            help="password for authentication. If username is given and password isn't, "
-                                 "it's asked from tty")
-        parser.add_argument("-b", "--authenticationDatabase", dest="auth_database", default=None,
-                            help="database to use to authenticate the user. If not specified, the user "
-                                 "will be authenticated against the database specified in the [db address]")
-        parser.add_argument("-n", "--lines", dest="n", default=str(DEFAULT_LIMIT),
-                            help="output the last N lines, instead of the last 10. Use ALL value to show all lines")
-        parser.add_argument("-f", "--follow", dest="follow", action="store_true", default=False,
-                            help="output appended data as the log grows")
-        parser.add_argument("-l", "--level", dest="level", default=None,
-                            help="specifies the profiling level, which is either 0 for no profiling, "
-                                 "1 for only slow operations, or 2 for all operations. Or use with 'status' word "
-                                 "to show the current level configured. "
-                                 "Uses this option once before logging the database")
-        parser.add_argument("-s", "--slowms", dest="ms", default=None,
-                            help="sets the threshold in milliseconds for the profile to consider a query "
-                                 "or operation to be slow (use with `--level 1`). Or use with 'status' word "
-                                 "to show the current milliseconds configured")
-        parser.add_argument("-m","--metadata", nargs="*",
-                            help="extra metadata fields to show. "
-                                 "Known fields (may vary depending of the operation and the MongoDB version): "
-                                 "millis, nscanned, docsExamined, execStats, lockStats ...")
-        parser.add_argument("-i", "--info", dest="info", action="store_true", default=False,
-                            help="get information about the MongoDB server we're connected to")
-        parser.add_argument("-v", "--verbose", dest="verbose", action="store_true", default=False,
-                            help="verbose mode (not recommended). All the operations will printed in JSON without "
-                                 "format and with all the information available from the log")
-        parser.add_argument("--tls", action="store_true", default=False,
-                            help ="creates the connection to the server using transport layer security")
-        parser.add_argument("--tlsCertificateKeyFile", dest="tlsCertificateKeyFile", default=None,
-                            help="client certificate to connect against MongoDB. It's the concatenation of "
-                                 "both the private key and and the certificate file")
-        parser.add_argument("--tlsAllowInvalidCertificates", dest="tlsAllowInvalidCertificates",
-                            action="store_true", default=False,
-                            help="disable the requirement of a certificate from the server when TLS is enabled")
-        parser.add_argument("--tlsCAFile", dest="tlsCAFile", default=None,
-                            help="file that contains a set of concatenated CA "
-                                 "certificates, which are used to validate certificates passed from the other "
-                                 "end of the connection")
-        parser.add_argument("--tlsCertificateKeyFilePassword", dest="tlsCertificateKeyFilePassword", default=None,
-                            help="password or passphrase to decrypt the encrypted private keys if the "
-                                 "private key contained in the certificate keyfile is encrypted")
-        parser.add_argument("--tlsCRLFile", dest="tlsCRLFile", default=None,
-                            help="path to a PEM or DER formatted certificate revocation list")
-        parser.add_argument("-V", "--version", action="version",
-                            version="%(prog)s " + __version__ + " <" + __url__ + "> (python " + sys.version.split(" ")[0] + ")")
-        args, address = parser.parse_known_args()
+        # The commands that only configure the profiler don't print the log
+        log_filter, query, sampler = None, LOG_QUERY, None
+        if args.replay or not (args.level or args.ms or args.profile_size or args.info):
+            log_filter, query, sampler = setup_log(args)
+            from .stats import stats
 
+        since = args.since and parse_time(args.since)
+        until = args.until and parse_time(args.until)
+        if since and until and since > until:
+            error_parsing("the --since date must be before the --until date")
+        if until and args.follow:
+            error_parsing("the --until option can't be used with --follow")
+        if (since or until) and (args.top or args.serve or args.checkpoint):
+            error_parsing("the --since and --until options can't be used with --top, --serve or --checkpoint")
+        if args.advise and (args.top or args.serve or args.record or args.checkpoint or args.explain is not None):
+            error_parsing("the --advise option can't be used with --top, --serve, --record, --checkpoint "
+                          "or --explain")
+        if args.replay:
+            if args.explain is not None:
+                error_parsing("the --explain option can't be used with --replay")
+            if address:
+                error_parsing("the --replay option reads the log from a file, db address not expected")
+            if args.n is not None or args.follow or args.top or args.serve or args.record or args.checkpoint \
+                    or args.cluster or args.target_rate or args.level or args.ms or args.profile_size or args.info:
+                error_parsing("the --replay option can't be used with -n, --follow, --top, --serve, --record, "
+                              "--checkpoint, --cluster, --target-rate or the profiler options")
+            replay(args.replay, args.verbose, args.metadata, log_filter, since, until, sampler, args.advise)
+            return
+
+        if args.n is None:
+            args.n = str(DEFAULT_LIMIT)
         if address and len(address) and address[0] == sys.argv[1]:
             address = address[0]
         elif len(address) == 0:
@@ -213,8 +1023,60 @@ def main():
         if address.startswith("-"):
             error_parsing()
 
+        from .conn import connect, connect_cluster, split_databases
+        address, dbnames = split_databases(address)
+        if dbnames and (args.level or args.ms or args.profile_size or args.cluster or args.top or args.serve
+                        or args.advise):
+            error_parsing("only one database can be used with the --level, --slowms, --profile-size, "
+                          "--cluster, --top, --serve and --advise options")
+        if args.slowms_range and not args.target_rate:
+            error_parsing("the --slowms-range option can only be used with --target-rate")
+        if args.target_rate:
+            from .sampling import parse_rate
+            from .controller import parse_slowms_range, SLOWMS_RANGE
+            try:
+                target_rate = parse_rate(args.target_rate)
+                slowms_range = parse_slowms_range(args.slowms_range) if args.slowms_range else SLOWMS_RANGE
+            except ValueError as e:
+                error_parsing(str(e))
+            if not args.follow or dbnames or args.cluster or args.top or args.serve or args.record or args.advise:
+                error_parsing("the --target-rate option can only be used with --follow to log one "
+                              "database, without --cluster, --top, --serve, --record or --advise")
+        if args.explain_verbosity and args.explain is None:
+            error_parsing("the --explain-verbosity option can only be used with --explain")
+        if args.explain is not None:
+            if args.explain < 0:
+                error_parsing("the --explain milliseconds can't be negative")
+            if args.verbose or args.format or args.cluster or args.top or args.serve or args.record:
+                error_parsing("the --explain option can't be used with --verbose, --format, --cluster, "
+                              "--top, --serve or --record")
+        if args.profile_size and args.profile_size.lower() != "status":
+            profile_size = parse_size(args.profile_size)
+        if (args.top or args.serve or args.advise) and args.cluster:
+            error_parsing("the --top, --serve and --advise options can't be used with --cluster")
+        if args.top and args.serve:
+            error_parsing("the --top and --serve options can't be used together")
+        if args.checkpoint and (dbnames or args.cluster or args.top or args.serve):
+            error_parsing("the --checkpoint option can only be used to log one database")
+        if args.record and (dbnames or args.cluster or args.top or args.serve):
+            error_parsing("the --record option can only be used to log one database")
+        if args.serve:
+            from .exporter import parse_address
+            try:
+                serve_address = parse_address(args.serve)
+            except ValueError as e:
+                error_parsing(str(e))
+
         # Getting connection
-        client, db = connect(address, args)
+        if args.cluster:
+            client, db, members = connect_cluster(address, args)
+        else:
+            client, db = connect(address, args)
+
+        explainer = None
+        if args.explain is not None:
+            from .explain import Explainer
+            explainer = Explainer(client, args.explain, args.explain_verbosity or "queryPlanner")
 
         # Execute command
         if args.level:
@@ -227,25 +1089,72 @@ def main():
                 show_slowms_level(client, db)
             else:
                 set_slowms_level(client, db, args.ms)
+        elif args.profile_size:
+            if args.profile_size.lower() == "status":
+                show_profile_size(client, db)
+            else:
+                set_profile_size(client, db, profile_size)
         elif args.info:
             show_server_info(client, db)
+        elif args.record:
+            record(client, db, args.record, args.n, args.follow, query, since, until, args.batch_size,
+                   args.max_await_ms)
+        elif args.top:
+            tail_top(client, db, args.n, args.lazy, query, args.batch_size, args.max_await_ms)
+        elif args.serve:
+            tail_serve(client, db, args.n, serve_address, args.lazy, query, args.batch_size, args.max_await_ms)
+        elif args.advise:
+            tail_advise(client, db, args.n, args.follow, args.lazy, query, since, until, args.batch_size,
+                        args.max_await_ms)
+        elif args.cluster:
+            tail_cluster(members, args.n, args.follow, args.verbose, args.metadata, args.lazy, query, sampler,
+                         since, until, args.batch_size, args.max_await_ms)
+        elif dbnames:
+            tail_databases(client, dbnames, args.n, args.follow, args.verbose, args.metadata, args.lazy, query,
+                           sampler, since, until, explainer, args.batch_size, args.max_await_ms)
         else:
-            tail(client, db, args.n, args.follow, args.verbose, args.metadata)
+            checkpoint = None
+            if args.checkpoint:
+                try:
+                    checkpoint = Checkpoint(args.checkpoint)
+                except (IOError, ValueError, KeyError) as e:
+                    error('Error reading the checkpoint file "%s": %s' % (args.checkpoint, e), EINVAL)
+            controller = None
+            if args.target_rate:
+                from .controller import SlowmsController
+                try:
+                    controller = SlowmsController(db, target_rate, slowms_range)
+                except ValueError as e:
+                    error("Error adjusting the profiling threshold: %s" % e, EINVAL)
+            tail(client, db, args.n, args.follow, args.verbose, args.metadata, args.lazy, query, checkpoint,
+                 sampler, since, until, controller, explainer, args.batch_size, args.max_await_ms)
     except KeyboardInterrupt:
+        from .out import output
         try:
-            sys.stdout.write("\n")
+            output.flush()
+            if not output.record_format:
+                sys.stdout.write("\n")
             sys.stdout.flush()
             sys.stderr.flush()
         except IOError:
             pass    # Avoid `IOError: [Errno 32] Broken pipe` that sometimes is launched when `Ctrl+C` is used
-    except ConnectionFailure as e:
-        error("Error trying to authenticate: %s" % str(e), ECONNREFUSED)
-    except OperationFailure as e:
+    except Exception as e:
+        # PyMongo is imported only if it's used, and also its errors
+        from pymongo.errors import ConnectionFailure, OperationFailure
+        if isinstance(e, ConnectionFailure):
+            error("Error trying to authenticate: %s" % str(e), ECONNREFUSED)
+        if not isinstance(e, OperationFailure):
+            raise
         if 'errmsg' in e.details:
             sys.stderr.write("Operation failure: %s\n" % e.details['errmsg'])
             sys.stderr.flush()
             exit(e.details['code'])
         error("Error trying to authenticate: %s" % str(e), 3)
+    if stats is not None and stats.gaps:
+        # Entries were lost in the log, the exit status tells it to scripts
+        sys.stderr.write("Mongotail - %s\n" % stats.lost())
+        sys.stderr.flush()
+        exit(ENODATA)
 
 
 if __name__ == "__main__":
@@ -23,186 +23,452 @@
 
 
 from __future__ import absolute_import
-import collections
+import re
 import sys
-from .jsondec import JSONEncoder
+import time
+try:
+    from time import perf_counter
+except ImportError:
+    from time import time as perf_counter   # Python 2.7
+try:
+    from collections.abc import Iterable, Mapping
+except ImportError:
+    from collections import Iterable, Mapping   # Python 2.7
+from .jsondec import JSONEncoder, TEXT_TYPES
+from .stats import stats
 from .err import warn
 
 
 json_encoder = JSONEncoder()
 
 
-def print_obj(obj, verbose, metadata, mongo_version):
+class Output(object):
+    """
+    Output sink that buffers the lines written and sends them
+    in big chunks to `stream` (the standard output by default),
+    reducing the number of writes and flushes when the output is
+    redirected to a file or another program.
+
+    The buffer is flushed when it's full, when the last flush
+    was more than `flush_interval` seconds ago, or when
+    :meth:`flush` is called, eg. each time all the entries
+    of the batch fetched from the cursor were printed.
+    If `line_buffered` is ``True``, each line is flushed as is written,
+    and if it's ``None``, it's the case only if `stream` is a terminal.
+
+    If `record_format` is set (see :mod:`~mongotail.formats`), the log
+    entries are printed with it, and if the format is binary, the
+    buffer receives ``bytes`` that are written to the binary stream
+    underlying `stream`.
+    """
+
+    BUFFER_SIZE = 64 * 1024
+    FLUSH_INTERVAL = 0.2
+
+    def __init__(self, stream=None, line_buffered=None,
+                 buffer_size=BUFFER_SIZE, flush_interval=FLUSH_INTERVAL):
+        self._stream = stream
+        self.line_buffered = line_buffered
+        self.record_format = None
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._size = 0
+        self._last_flush = time.time()
+
+    @property
+    def stream(self):
+        return self._stream or sys.stdout
+
+    @property
+    def binary(self):
+        return self.record_format is not None and self.record_format.binary
+
+    def write(self, line):
+        if self.line_buffered is None:
+            try:
+                self.line_buffered = self.stream.isatty()
+            except (AttributeError, ValueError):
+                self.line_buffered = False
+        if stats.enabled:
+            stats.bytes += len(line)
+        if self.line_buffered:
+            self._write(line)
+            return
+        self._buffer.append(line)
+        self._size += len(line)
+        if self._size >= self.buffer_size or time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            buffer = self._buffer
+            self._buffer = []
+            self._size = 0
+            self._write(b"".join(buffer) if self.binary else "".join(buffer))
+        else:
+            self._write(None)
+        self._last_flush = time.time()
+
+    def _write(self, data):
+        """
+        Write `data` (if not ``None``) and flush the stream.
+        """
+        start = stats.enabled and perf_counter()
+        if data is not None:
+            if self.binary:
+                getattr(self.stream, "buffer", self.stream).write(data)
+            else:
+                self.stream.write(data)
+        self.stream.flush()
+        if start:
+            stats.add("write", perf_counter() - start)
+
+
+output = Output()
+
+
+def print_obj(obj, verbose, metadata, formatters, full_ns=False, source=None, plan=None):
     """
     Print the dict returned by a MongoDB Query in the standard output.
+    :param formatters: the table of formatters by operation returned
+           by :func:`get_formatters` for the MongoDB version of the server
+    :param full_ns: print the collection name with the database name
+    :param source: name of the server the entry comes from, printed
+           after the time if it is set
+    :param plan: the winning plan of the operation, printed at the
+           end of the line if it is set (see :mod:`~mongotail.explain`)
     """
+    if stats.enabled:
+        start = perf_counter()
+        _print_obj(obj, verbose, metadata, formatters, full_ns, source, plan)
+        stats.add("print_obj", perf_counter() - start)
+        stats.add_record(obj)
+    else:
+        _print_obj(obj, verbose, metadata, formatters, full_ns, source, plan)
+
+
+def _print_obj(obj, verbose, metadata, formatters, full_ns, source, plan):
+    if output.record_format:
+        output.write(output.record_format.encode(obj, verbose, metadata, formatters, source))
+        return
     if verbose:
-        sys.stdout.write(json_encoder.encode(obj) + '\n')
-        sys.stdout.flush()
+        if source:
+            output.write(source + " " + json_encoder.encode(obj) + '\n')
+        else:
+            output.write(json_encoder.encode(obj) + '\n')
     else:
         try:
             ts_time = obj['ts']
             operation = obj['op']
-            doc = None
-            if operation == 'query':
-                if mongo_version < "3.2":
-                    doc = obj['ns'].split(".")[-1]
-                    query = json_encoder.encode(obj['query']) if 'query' in obj else "{}"
-                else:
-                    if "query" in obj:
-                        cmd = obj['query']      # Mongo 3.2 - 3.4
-                    else:
-                        cmd = obj['command']    # Mongo 3.6+
-                    doc = cmd['find']
-                    query = json_encoder.encode(cmd['filter']) if 'filter' in cmd else "{}"
-                    if 'sort' in cmd:
-                        query += ', sort: ' + json_encoder.encode(cmd['sort'])
-                    if 'limit' in cmd:
-                        query += ', limit: ' + json_encoder.encode_number(cmd['limit'])
-                    if 'skip' in cmd:
-                        query += ', skip: ' + json_encoder.encode_number(cmd['skip'])
-                if 'nreturned' in obj:
-                    # If a query fails Mongo doesn't record nreturned
-                    query += '. %s returned.' % obj['nreturned']
-            elif operation == 'update':
-                doc = obj['ns'].split(".")[-1]
-                if mongo_version < "3.6":
-                    query = json_encoder.encode(obj['query']) if 'query' in obj else "{}"
-                    query += ', ' + json_encoder.encode(obj['updateobj'])
-                else:
-                    query = json_encoder.encode(obj['command']['q']) if 'command' in obj and 'q' in obj['command'] else "{}"
-                    query += ', ' + json_encoder.encode(obj['command']['u'])
-                if 'nModified' in obj:
-                    query += '. %s updated.' % obj['nModified']
-                elif 'nMatched' in obj:
-                    query += '. %s updated.' % obj['nMatched']
-            elif operation == 'insert':
-                if mongo_version < "3.2":
-                    doc = obj['ns'].split(".")[-1]
-                    query = json_encoder.encode(obj['query']) if 'query' in obj else "{}"
-                else:
-                    if 'query' in obj:
-                        doc = obj['query']['insert']
-                        if 'documents' in obj['query']:
-                            if isinstance(obj['query']['documents'], collections.Iterable) \
-                                    and len(obj['query']['documents']) > 1:
-                                query = json_encoder.encode(obj['query']['documents']) + ". "
-                            else:
-                                query = json_encoder.encode(obj['query']['documents'][0]) + ". "
-                        else:
-                            query = ""
-                    else:
-                        # Mongo 3.6+ profiler looks like doens't record insert details (document object), and
-                        # some tools like Robo 3T (formerly Robomongo) allows to duplicate collections
-                        # but the profiler doesn't record the element inserted
-                        doc = obj['ns'].split(".")[-1]
-                        query = ""
-                query += '%s inserted.' % obj['ninserted']
-            elif operation == 'remove':
-                doc = obj['ns'].split(".")[-1]
-                if mongo_version < "3.6":
-                    query = json_encoder.encode(obj['query']) if 'query' in obj else "{}"
-                else:
-                    query = json_encoder.encode(obj['command']['q']) if 'command' in obj and 'q' in obj['command'] else "{}"
-                query += '. %s deleted.' % obj['ndeleted']
-            elif operation == "command":
-                if 'count' in obj["command"]:
-                    operation = "count"
-                    query = json_encoder.encode(obj['command']['query'])
-                elif 'aggregate' in obj["command"]:
-                    operation = "aggregate"
-                    query = json_encoder.encode(obj['command']['pipeline'])
-                elif 'distinct' in obj["command"]:
-                    operation = "distinct"
-                    query = json_encoder.encode(obj['command']['query'])
-                    query = '"%s", %s' % (obj['command']['key'], query)
-                elif 'drop' in obj["command"]:
-                    operation = "drop"
-                    query = ""
-                elif 'findandmodify' in obj["command"] or 'findAndModify' in obj["command"]:
-                    operation = "findandmodify" in obj["command"] and "findandmodify" or "findAndModify"
-                    query = "query: " + json_encoder.encode(obj['command']['query'])
-                    if 'sort' in obj["command"]:
-                        query += ", sort: " + json_encoder.encode(obj['command']['sort'])
-                    if 'update' in obj["command"]:
-                        query += ", update: " + json_encoder.encode(obj['command']['update'])
-                    if 'remove' in obj["command"]:
-                        query += ", remove: " + str(obj['command']['remove']).lower()
-                    if 'fields' in obj["command"]:
-                        query += ", fields: " + json_encoder.encode(obj['command']['fields'])
-                    if 'upsert' in obj["command"]:
-                        query += ", upsert: " + str(obj['command']['upsert']).lower()
-                    if 'new' in obj["command"]:
-                        query += ", new: " + str(obj['command']['new']).lower()
-                elif 'group' in obj["command"]:
-                    operation = "group"
-                    doc = obj["command"]['group']["ns"]
-                    if 'key' in obj['command']['group']:
-                        key = "key: " + json_encoder.encode(obj['command']['group']['key'])
-                    else:
-                        key = None
-                    if 'initial' in obj['command']['group']:
-                        initial = "initial: " + json_encoder.encode(obj['command']['group']['initial'])
-                    else:
-                        initial = None
-                    if 'cond' in obj['command']['group']:
-                        cond = "cond: " + json_encoder.encode(obj['command']['group']['cond'])
-                    else:
-                        cond = None
-                    if '$keyf' in obj['command']['group']:
-                        key_function = "keyf: " + min_script(obj['command']['group']['$keyf'])
-                    else:
-                        key_function = None
-                    if '$reduce' in obj['command']['group']:
-                        reduce_func = "reduce: " + min_script(obj['command']['group']['$reduce'])
-                    else:
-                        reduce_func = None
-                    if 'finalize' in obj['command']['group']:
-                        finalize_func = "finalize: " + min_script(obj['command']['group']['finalize'])
-                    else:
-                        finalize_func = None
-                    query = ", ".join(list(filter(lambda x: x, (key, reduce_func, initial, key_function, cond, finalize_func))))
-                elif 'map' in obj["command"]:
-                    operation = "map"
-                    mapreduce_key = "mapreduce" in obj["command"] and "mapreduce" or "mapReduce"
-                    doc = obj["command"][mapreduce_key]
-                    del obj["command"][mapreduce_key]
-                    map_func = min_script(obj['command']["map"])
-                    del obj['command']["map"]
-                    reduce_func = min_script(obj['command']["reduce"])
-                    del obj['command']["reduce"]
-                    query = "{%s, %s, %s}" % (map_func, reduce_func, json_encoder.encode(obj['command']))
-                else:
+            if operation == "command":
+                formatter = get_command_formatter(formatters, obj['command'])
+                if not formatter:
                     warn('Unknown command operation\nDump: %s' % json_encoder.encode(obj))
-                if not doc:
-                    doc = obj["command"][operation]
+                    return
             else:
-                warn('Unknown operation "%s"\nDump: %s' % (operation, json_encoder.encode(obj)))
+                formatter = formatters.get((operation, None))
+                if not formatter:
+                    warn('Unknown operation "%s"\nDump: %s' % (operation, json_encoder.encode(obj)))
+                    return
+            operation, doc, query = formatter(obj)
+            if full_ns:
+                doc = "%s.%s" % (obj['ns'].split(".", 1)[0], doc)
 
             if metadata:
                 met = []
                 for m in metadata:
-                    if m in obj and obj[m] != {}:
+                    if m in obj:
+                        value = obj[m]
                         q = m + ": "
-                        if isinstance(obj[m], str):
-                            q += '"%s"' % obj[m]
-                        elif isinstance(obj[m], dict):
-                            q += json_encoder.encode(obj[m])
+                        if isinstance(value, TEXT_TYPES):
+                            q += '"%s"' % value
+                        elif isinstance(value, Mapping):
+                            if not len(value):
+                                continue
+                            q += json_encoder.encode(value)
                         else:
-                            q += str(obj[m])
+                            q += str(value)
                         met.append(q)
                 if met:
                     if not query.endswith("."): query += ". "
                     if not query.endswith(" "): query += " "
                     query += ", ".join(met)
+            if plan:
+                if not query.endswith("."): query += ". "
+                if not query.endswith(" "): query += " "
+                query += "plan: " + plan
 
-            sys.stdout.write("%s %s [%s] : %s\n" % (ts_time.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
-                                                    operation.upper().ljust(9), doc, query))
-            sys.stdout.flush()  # Allows pipe the output during the execution with others tools like 'grep'
+            if source:
+                operation = source + " " + operation.upper().ljust(9)
+            else:
+                operation = operation.upper().ljust(9)
+            output.write("%s %s [%s] : %s\n" % (ts_time.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+                                                operation, doc, query))
         except (KeyError, TypeError):
             warn('Unknown registry\nDump: %s' % json_encoder.encode(obj))
 
 
+def print_gap(gap, verbose, metadata, formatters, full_ns=False, source=None):
+    """
+    Print the marker of the entries lost in the log, a :class:`~mongotail.checkpoint.Gap`.
+    The arguments are the same of :func:`print_obj`.
+    """
+    if output.record_format:
+        output.write(output.record_format.encode(gap, verbose, metadata, formatters, source))
+        return
+    doc = gap['ns'] if full_ns else gap['ns'].split(".", 1)[-1]
+    operation = source + " " + "GAP".ljust(9) if source else "GAP".ljust(9)
+    output.write("%s %s [%s] : %s\n" % (gap['ts'].strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+                                        operation, doc, gap))
+
+
+def parse_version(version):
+    """
+    Parse a MongoDB version string like "3.6.23" or "7.0.0-rc1"
+    into a tuple of integers that can be compared numerically,
+    eg. ``(3, 6, 23)``.
+    """
+    return tuple(int(n) for n in re.findall(r"\d+", version.split("-")[0]))
+
+
+def get_formatters(mongo_version):
+    """
+    Build the table of functions used to format each operation
+    logged by a server running `mongo_version`. The keys of
+    the table are tuples ``(op, command_name)``, where ``command_name``
+    is ``None`` for operations that are not commands, and each
+    function receives the log entry (and optionally the encoder of
+    the documents, :data:`json_encoder` by default) and returns a
+    tuple ``(operation, doc, query)`` with the strings to print.
+    """
+    version = parse_version(mongo_version)
+    formatters = {
+        ("query", None): format_query if version >= (3, 2) else format_query_legacy,
+        ("update", None): format_update if version >= (3, 6) else format_update_legacy,
+        ("insert", None): format_insert if version >= (3, 2) else format_insert_legacy,
+        ("remove", None): format_remove if version >= (3, 6) else format_remove_legacy,
+    }
+    for command, formatter in COMMAND_FORMATTERS:
+        formatters[("command", command)] = formatter
+    return formatters
+
+
+def get_command_formatter(formatters, command):
+    """
+    Get the formatter of the `command` document from the `formatters` table.
+    The name of the command is the first key of the document, but if
+    it's not a known command, the keys of all the known commands are
+    searched in the document.
+    """
+    for name in command:
+        formatter = formatters.get(("command", name))
+        if formatter:
+            return formatter
+        break
+    for name, formatter in COMMAND_FORMATTERS:
+        if name in command:
+            return formatter
+    return None
+
+
+def collection_name(obj):
+    return obj['ns'].split(".")[-1]
+
+
+def format_query_legacy(obj, encoder=json_encoder):
+    """Mongo < 3.2"""
+    query = encoder.encode(obj['query']) if 'query' in obj else "{}"
+    return "query", collection_name(obj), _returned(obj, query)
+
+
+def format_query(obj, encoder=json_encoder):
+    if "query" in obj:
+        cmd = obj['query']      # Mongo 3.2 - 3.4
+    else:
+        cmd = obj['command']    # Mongo 3.6+
+    query = encoder.encode(cmd['filter']) if 'filter' in cmd else "{}"
+    if 'sort' in cmd:
+        query += ', sort: ' + encoder.encode(cmd['sort'])
+    if 'limit' in cmd:
+        query += ', limit: ' + encoder.encode_number(cmd['limit'])
+    if 'skip' in cmd:
+        query += ', skip: ' + encoder.encode_number(cmd['skip'])
+    return "query", cmd['find'], _returned(obj, query)
+
+
+def _returned(obj, query):
+    if 'nreturned' in obj:
+        # If a query fails Mongo doesn't record nreturned
+        query += '. %s returned.' % obj['nreturned']
+    return query
+
+
+def format_update_legacy(obj, encoder=json_encoder):
+    """Mongo < 3.6"""
+    query = encoder.encode(obj['query']) if 'query' in obj else "{}"
+    query += ', ' + encoder.encode(obj['updateobj'])
+    return "update", collection_name(obj), _updated(obj, query)
+
+
+def format_update(obj, encoder=json_encoder):
+    query = encoder.encode(obj['command']['q']) if 'command' in obj and 'q' in obj['command'] else "{}"
+    query += ', ' + encoder.encode(obj['command']['u'])
+    return "update", collection_name(obj), _updated(obj, query)
+
+
+def _updated(obj, query):
+    if 'nModified' in obj:
+        query += '. %s updated.' % obj['nModified']
+    elif 'nMatched' in obj:
+        query += '. %s updated.' % obj['nMatched']
+    return query
+
+
+def format_insert_legacy(obj, encoder=json_encoder):
+    """Mongo < 3.2"""
+    query = encoder.encode(obj['query']) if 'query' in obj else "{}"
+    return "insert", collection_name(obj), _inserted(obj, query)
+
+
+def format_insert(obj, encoder=json_encoder):
+    if 'query' in obj:
+        doc = obj['query']['insert']
+        if 'documents' in obj['query']:
+            if isinstance(obj['query']['documents'], Iterable) \
+                    and len(obj['query']['documents']) > 1:
+                query = encoder.encode(obj['query']['documents']) + ". "
+            else:
+                query = encoder.encode(obj['query']['documents'][0]) + ". "
+        else:
+            query = ""
+    else:
+        # Mongo 3.6+ profiler looks like doens't record insert details (document object), and
+        # some tools like Robo 3T (formerly Robomongo) allows to duplicate collections
+        # but the profiler doesn't record the element inserted
+        doc = collection_name(obj)
+        query = ""
+    return "insert", doc, _inserted(obj, query)
+
+
+def _inserted(obj, query):
+    if 'ninserted' in obj:
+        return query + '%s inserted.' % obj['ninserted']
+    return query.rstrip(". ")
+
+
+def format_remove_legacy(obj, encoder=json_encoder):
+    """Mongo < 3.6"""
+    query = encoder.encode(obj['query']) if 'query' in obj else "{}"
+    return "remove", collection_name(obj), _deleted(obj, query)
+
+
+def format_remove(obj, encoder=json_encoder):
+    query = encoder.encode(obj['command']['q']) if 'command' in obj and 'q' in obj['command'] else "{}"
+    return "remove", collection_name(obj), _deleted(obj, query)
+
+
+def _deleted(obj, query):
+    if 'ndeleted' in obj:
+        query += '. %s deleted.' % obj['ndeleted']
+    return query
+
+
+def format_count(obj, encoder=json_encoder):
+    query = encoder.encode(obj['command']['query'])
+    return "count", obj['command']['count'], query
+
+
+def format_aggregate(obj, encoder=json_encoder):
+    query = encoder.encode(obj['command']['pipeline'])
+    return "aggregate", obj['command']['aggregate'], query
+
+
+def format_distinct(obj, encoder=json_encoder):
+    query = encoder.encode(obj['command']['query'])
+    query = '"%s", %s' % (obj['command']['key'], query)
+    return "distinct", obj['command']['distinct'], query
+
+
+def format_drop(obj, encoder=json_encoder):
+    return "drop", obj['command']['drop'], ""
+
+
+def format_findandmodify(obj, encoder=json_encoder):
+    command = obj["command"]
+    operation = "findandmodify" in command and "findandmodify" or "findAndModify"
+    query = "query: " + encoder.encode(command['query'])
+    if 'sort' in command:
+        query += ", sort: " + encoder.encode(command['sort'])
+    if 'update' in command:
+        query += ", update: " + encoder.encode(command['update'])
+    if 'remove' in command:
+        query += ", remove: " + str(command['remove']).lower()
+    if 'fields' in command:
+        query += ", fields: " + encoder.encode(command['fields'])
+    if 'upsert' in command:
+        query += ", upsert: " + str(command['upsert']).lower()
+    if 'new' in command:
+        query += ", new: " + str(command['new']).lower()
+    return operation, command[operation], query
+
+
+def format_group(obj, encoder=json_encoder):
+    group = obj["command"]['group']
+    if 'key' in group:
+        key = "key: " + encoder.encode(group['key'])
+    else:
+        key = None
+    if 'initial' in group:
+        initial = "initial: " + encoder.encode(group['initial'])
+    else:
+        initial = None
+    if 'cond' in group:
+        cond = "cond: " + encoder.encode(group['cond'])
+    else:
+        cond = None
+    if '$keyf' in group:
+        key_function = "keyf: " + min_script(group['$keyf'])
+    else:
+        key_function = None
+    if '$reduce' in group:
+        reduce_func = "reduce: " + min_script(group['$reduce'])
+    else:
+        reduce_func = None
+    if 'finalize' in group:
+        finalize_func = "finalize: " + min_script(group['finalize'])
+    else:
+        finalize_func = None
+    query = ", ".join(list(filter(lambda x: x, (key, reduce_func, initial, key_function, cond, finalize_func))))
+    return "group", group["ns"], query
+
+
+def format_mapreduce(obj, encoder=json_encoder):
+    command = dict(obj["command"])
+    mapreduce_key = "mapreduce" in command and "mapreduce" or "mapReduce"
+    doc = command.pop(mapreduce_key)
+    map_func = min_script(command.pop("map"))
+    reduce_func = min_script(command.pop("reduce"))
+    query = "{%s, %s, %s}" % (map_func, reduce_func, encoder.encode(command))
+    return "map", doc, query
+
+
+# Formatters of the commands, in the order the keys
+# are searched when the command name isn't recognized
+COMMAND_FORMATTERS = (
+    ("count", format_count),
+    ("aggregate", format_aggregate),
+    ("distinct", format_distinct),
+    ("drop", format_drop),
+    ("findandmodify", format_findandmodify),
+    ("findAndModify", format_findandmodify),
+    ("group", format_group),
+    ("map", format_mapreduce),
+    ("mapreduce", format_mapreduce),
+    ("mapReduce", format_mapreduce),
+)
+
+
 def min_script(js):
     """
     Minify script in a very insecure way.
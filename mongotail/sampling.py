@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Sampling and rate limit of the log entries printed, set with the
+``--sample`` and ``--max-rate`` options, to keep the CPU used bounded
+when the server logs more operations than can be printed.
+"""
+
+from __future__ import absolute_import
+import sys
+import time
+import zlib
+from .shape import get_shape
+
+SUMMARY_INTERVAL = 10   # Seconds between the summaries of the entries dropped
+
+
+def parse_sample(value):
+    """
+    Parse the sampling rate "1/N" (or only "N") and return N.
+    """
+    try:
+        numerator, _, denominator = value.rpartition("/")
+        if numerator not in ("", "1"):
+            raise ValueError()
+        n = int(denominator)
+        if n < 1:
+            raise ValueError()
+        return n
+    except ValueError:
+        raise ValueError('Invalid sample "%s", the format is 1/N, e.g. 1/10' % value)
+
+
+def parse_rate(value):
+    """
+    Parse the rate "R/s" (or only "R") of entries per second.
+    """
+    try:
+        rate = float(value[:-2] if value.endswith("/s") else value)
+        if rate <= 0:
+            raise ValueError()
+        return rate
+    except ValueError:
+        raise ValueError('Invalid rate "%s", the format is R/s, e.g. 100/s' % value)
+
+
+class NamespaceCounters(object):
+    __slots__ = ('seen', 'sampled_out', 'limited')
+
+    def __init__(self):
+        self.seen = 0
+        self.sampled_out = 0
+        self.limited = 0
+
+    @property
+    def dropped(self):
+        return self.sampled_out + self.limited
+
+
+class Sampler(object):
+    """
+    Choose the log entries printed. With `sample` = N, one of each N query
+    shapes is printed: the shape is hashed, so all the operations with the same
+    shape are either printed or dropped, giving a consistent picture of the
+    queries sampled. With `max_rate`, the entries are limited to that number per
+    second with a token bucket, allowing bursts of up to one second of entries.
+
+    The entries seen and dropped are counted by namespace, and a summary
+    is written in `stream` (the standard error by default) every
+    `summary_interval` seconds, and at the end with :meth:`close`.
+    """
+
+    def __init__(self, sample=None, max_rate=None, summary_interval=SUMMARY_INTERVAL, stream=None):
+        self.sample = sample
+        self.max_rate = max_rate
+        self.summary_interval = summary_interval
+        self._stream = stream
+        self.counters = {}
+        self._tokens = max_rate
+        self._last_refill = time.time()
+        self._next_summary = self._last_refill + summary_interval
+        self._changed = False
+
+    @property
+    def stream(self):
+        return self._stream or sys.stderr
+
+    def accept(self, obj, formatters):
+        """
+        Check whether the log entry `obj` has to be printed, counting it,
+        and write the summary if it's time to do it.
+        :param formatters: the table of formatters of the server version
+               (see :func:`~mongotail.out.get_formatters`) used to
+               get the shape of the operation
+        """
+        ns = obj.get('ns')
+        counters = self.counters.get(ns)
+        if counters is None:
+            counters = self.counters[ns] = NamespaceCounters()
+        counters.seen += 1
+        self._changed = True
+        accepted = True
+        if self.sample and self.sample > 1 and self.shape_hash(obj, formatters) % self.sample:
+            counters.sampled_out += 1
+            accepted = False
+        elif self.max_rate:
+            now = time.time()
+            self._tokens = min(self._tokens + (now - self._last_refill) * self.max_rate,
+                               max(self.max_rate, 1))
+            self._last_refill = now
+            if self._tokens < 1:
+                counters.limited += 1
+                accepted = False
+            else:
+                self._tokens -= 1
+        # When the server logs more than can be printed, the log never has no more entries for now
+        self.tick()
+        return accepted
+
+    @staticmethod
+    def shape_hash(obj, formatters):
+        """
+        Hash of the shape of `obj` that is the same in all the executions
+        (the built-in ``hash()`` of strings is randomized).
+        """
+        try:
+            shape = get_shape(obj, formatters)
+        except (KeyError, TypeError):
+            shape = None
+        if shape is None:
+            shape = (obj.get('op'), obj.get('ns'))
+        return zlib.crc32("\0".join(str(s) for s in shape).encode("utf-8"))
+
+    def tick(self):
+        """
+        Write the summary if it's time to do it.
+        """
+        now = time.time()
+        if now >= self._next_summary:
+            self._next_summary = now + self.summary_interval
+            if self._changed:
+                self.write_summary()
+
+    def write_summary(self):
+        """
+        Write the number of entries seen, printed and dropped in each namespace.
+        """
+        self._changed = False
+        lines = []
+        for ns in sorted(self.counters, key=str):
+            c = self.counters[ns]
+            lines.append("Mongotail SAMPLING - %s: %d seen, %d printed, %d dropped (%d sampled out, %d over the rate)\n"
+                         % (ns, c.seen, c.seen - c.dropped, c.dropped, c.sampled_out, c.limited))
+        self.stream.write("".join(lines))
+        self.stream.flush()
+
+    def close(self):
+        if self._changed:
+            self.write_summary()
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+"""
+Query shapes: the structure of the operations logged, with the literal
+values replaced by ``?``, used to group the operations that are the same
+query executed with different arguments.
+"""
+
+from __future__ import absolute_import
+from collections import OrderedDict
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping   # Python 2.7
+from .jsondec import JSONEncoder, TEXT_TYPES
+from .out import get_command_formatter, COMMAND_FORMATTERS
+
+PLACEHOLDER = "?"
+
+# Fields of the log entries with the operation arguments
+QUERY_FIELDS = ('query', 'command', 'updateobj')
+
+# Names of the commands, their value is the collection name
+COMMAND_NAMES = frozenset(["find", "insert", "update", "delete"] + [name for name, _ in COMMAND_FORMATTERS])
+
+# Command arguments that are part of the shape, eg. the field of "distinct"
+COMMAND_KEYS = ("key", "ns", "map", "reduce", "$reduce", "$keyf", "finalize")
+
+# Arguments of the commands logged that aren't part of the operation, and are not accepted
+# or don't make sense in an explain, besides the ones starting with "$", eg. "$db" or "$clusterTime"
+IGNORED_ARGS = frozenset(["lsid", "txnNumber", "autocommit", "startTransaction", "readConcern",
+                          "writeConcern", "maxTimeMS", "apiVersion", "apiStrict", "apiDeprecationErrors"])
+
+# Encoder of the shapes, that unlike the encoder of the output (with --max-doc-bytes)
+# never cuts the documents, so the shapes of long queries are not mixed
+shape_encoder = JSONEncoder()
+
+# Metrics fields of the log entries, and the names used in older versions
+STATS_FIELDS = ['millis', 'docsExamined', 'nscannedObjects', 'keysExamined', 'nscanned', 'nreturned']
+
+
+def normalize(value):
+    """
+    Replace the literal values in `value` by ``?``, keeping the keys of
+    the documents, and the field paths (strings starting with ``$``).
+    The documents in lists with the same shape are kept only once,
+    and lists without documents are replaced by ``?``.
+    """
+    if isinstance(value, Mapping):
+        return dict((k, normalize(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        items = []
+        shapes = set()
+        for v in value:
+            if isinstance(v, (Mapping, list, tuple)):
+                v = normalize(v)
+                shape = shape_encoder.encode(v)
+                if shape not in shapes:
+                    shapes.add(shape)
+                    items.append(v)
+        return items if items else PLACEHOLDER
+    if isinstance(value, TEXT_TYPES) and value.startswith("$"):
+        return value
+    return PLACEHOLDER
+
+
+def normalize_command(command):
+    """
+    Like :func:`normalize`, but keeping the collection name of the command
+    and the arguments that aren't values, eg. the functions of "mapReduce".
+    """
+    if not isinstance(command, Mapping):
+        return normalize(command)
+    shape = {}
+    for key, value in command.items():
+        if isinstance(value, TEXT_TYPES) and (key in COMMAND_NAMES or key in COMMAND_KEYS):
+            shape[key] = value
+        elif key == "group" and isinstance(value, Mapping):
+            shape[key] = normalize_command(value)
+        else:
+            shape[key] = normalize(value)
+    return shape
+
+
+def get_shape(obj, formatters):
+    """
+    Get the shape of the operation logged in `obj`, formatted by the same
+    function used to print it (see :func:`~mongotail.out.get_formatters`),
+    but with the whole documents.
+    :return: a tuple ``(operation, collection, shape)``, or ``None`` if
+             the operation is unknown
+    """
+    entry = {'op': obj['op'], 'ns': obj['ns']}
+    for field in QUERY_FIELDS:
+        if field in obj:
+            entry[field] = normalize_command(obj[field])
+    if entry['op'] == "command":
+        formatter = get_command_formatter(formatters, obj['command'])
+    else:
+        formatter = formatters.get((entry['op'], None))
+    if not formatter:
+        return None
+    try:
+        return formatter(entry, shape_encoder)
+    except (KeyError, TypeError, IndexError):
+        return None
+
+
+def get_shape_document(obj):
+    """
+    Get the shape of the operation logged in `obj` as a document, with the
+    :data:`QUERY_FIELDS` found in `obj` normalized, without the session,
+    transaction and internal (``$...``) arguments of the commands,
+    or ``None`` if `obj` has none of the fields.
+    """
+    shape = {}
+    for field in QUERY_FIELDS:
+        value = obj.get(field)
+        if isinstance(value, Mapping):
+            value = dict((k, v) for k, v in value.items() if not k.startswith("$") and k not in IGNORED_ARGS)
+        if value is not None:
+            shape[field] = normalize_command(value)
+    return shape or None
+
+
+class ShapeStats(object):
+    """
+    Counters of the operations logged with the same shape.
+    """
+    __slots__ = ('count', 'millis', 'max_millis', 'docs_examined', 'keys_examined', 'nreturned')
+
+    def __init__(self):
+        self.count = 0
+        self.millis = 0
+        self.max_millis = 0
+        self.docs_examined = 0
+        self.keys_examined = 0
+        self.nreturned = 0
+
+    def add(self, obj):
+        millis = obj.get('millis', 0)
+        self.count += 1
+        self.millis += millis
+        if millis > self.max_millis:
+            self.max_millis = millis
+        self.docs_examined += obj.get('docsExamined', obj.get('nscannedObjects', 0))
+        self.keys_examined += obj.get('keysExamined', obj.get('nscanned', 0))
+        self.nreturned += obj.get('nreturned', 0)
+
+    @property
+    def avg_millis(self):
+        return float(self.millis) / self.count if self.count else 0.0
+
+
+class QueryStats(object):
+    """
+    Incremental statistics of the operations logged, by query shape.
+    Only the `max_shapes` shapes seen more recently are kept,
+    so the memory used is bounded no matter how long it runs.
+    """
+
+    def __init__(self, formatters, max_shapes=1000):
+        self.formatters = formatters
+        self.max_shapes = max_shapes
+        self.shapes = OrderedDict()
+        self.count = 0      # Operations added
+        self.evicted = 0    # Shapes discarded
+
+    def add(self, obj):
+        """
+        Add the operation logged in `obj` to the statistics,
+        and return the key ``(operation, collection, shape)`` of its shape,
+        or ``None`` if the operation is unknown.
+        """
+        key = get_shape(obj, self.formatters)
+        if key is None:
+            return None
+        self.count += 1
+        stats = self.shapes.pop(key, None)
+        if stats is None:
+            stats = ShapeStats()
+            if len(self.shapes) >= self.max_shapes:
+                self.shapes.popitem(last=False)     # The least recently seen
+                self.evicted += 1
+        self.shapes[key] = stats
+        stats.add(obj)
+        return key
+
+    def top(self, n=None, sort="millis"):
+        """
+        Get a list of tuples ``(key, stats)`` with the `n` shapes with
+        the highest value of the `sort` attribute of :class:`ShapeStats`.
+        """
+        items = sorted(self.shapes.items(), key=lambda item: getattr(item[1], sort), reverse=True)
+        return items[:n] if n else items
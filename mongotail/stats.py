@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Self-instrumentation enabled with ``--stats-interval``: how far behind the
+log is the output, the end-to-end latency of the entries, the throughput, and the time spent in each stage of
+the processing of the log entries, reported periodically.
+"""
+
+from __future__ import absolute_import
+import sys
+import time
+import threading
+try:
+    from time import perf_counter
+except ImportError:
+    from time import time as perf_counter   # Python 2.7
+from datetime import datetime
+import bson
+from pymongo import monitoring
+
+# Stages of the processing of the log entries, in the order reported:
+# - cursor: reading the entries from the cursor, including the getMore
+#   round trips that returned entries
+# - decode: decoding the BSON entries (included in "cursor")
+# - print_obj: formatting and printing the entries
+# - encode: JSONEncoder.encode() calls (included in "print_obj")
+# - write: writing the output
+STAGES = ("cursor", "decode", "print_obj", "encode", "write")
+
+
+class GetMoreListener(monitoring.CommandListener):
+    """
+    Measure the round-trip time of the ``find`` and ``getMore`` commands
+    that return entries. The commands that return empty batches are not
+    measured, because a tailable cursor waits for new entries in the server.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if event.command_name in ("find", "getMore"):
+            try:
+                cursor = event.reply["cursor"]
+                batch = cursor.get("nextBatch", cursor.get("firstBatch"))
+            except (KeyError, TypeError, AttributeError):
+                return
+            if batch:
+                self.stats.add_round_trip(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        pass
+
+
+class Stats(object):
+    """
+    Counters and timers of the processing of the log entries. Nothing is
+    measured until :meth:`start` is called, and the code measured checks
+    :attr:`enabled` before reading the clock. Each counter is a plain
+    number only updated with additions, so the report is taken reading
+    them without locks.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.records = 0
+        self.bytes = 0
+        self.latest_ts = None
+        # Time between an entry is logged and printed, of the entries with "ts"
+        self.latencies = 0
+        self.latency_time = 0.0
+        self.latency_max = 0.0
+        self.times = dict((stage, 0.0) for stage in STAGES)
+        self.round_trips = 0
+        self.round_trip_time = 0.0
+        self.round_trip_max = 0.0
+        # Entries lost in the log, counted even when the stats are not enabled
+        self.gaps = 0
+        self.lost_seconds = 0.0
+        self.lost_entries = 0
+        self._stream = None
+        self._thread = None
+
+    def start(self, interval, stream=None):
+        """
+        Enable the counters, and write a report in `stream` (the standard
+        error by default) every `interval` seconds. Must be called before
+        connecting, to measure the round trips of the cursors.
+        """
+        self.enabled = True
+        self._stream = stream
+        monitoring.register(GetMoreListener(self))
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="stats")
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def stream(self):
+        return self._stream or sys.stderr
+
+    def add(self, stage, seconds):
+        self.times[stage] += seconds
+
+    def add_round_trip(self, seconds):
+        self.round_trips += 1
+        self.round_trip_time += seconds
+        if seconds > self.round_trip_max:
+            self.round_trip_max = seconds
+
+    def add_gap(self, gap):
+        """
+        Count the entries lost in the :class:`~mongotail.checkpoint.Gap` `gap`.
+        """
+        self.gaps += 1
+        self.lost_seconds += gap['seconds']
+        self.lost_entries += gap['entries'] or 0
+
+    def lost(self):
+        """
+        Description of the entries lost in all the gaps found.
+        """
+        return "%d gaps in the log, ~%d entries / %.1f seconds lost" % (self.gaps, self.lost_entries,
+                                                                        self.lost_seconds)
+
+    def add_record(self, obj):
+        self.records += 1
+        try:
+            ts = obj['ts']
+        except (KeyError, TypeError):
+            return
+        self.latest_ts = ts
+        # The time of the server is compared with the local time,
+        # so the clocks of both hosts must be synchronized
+        latency = (datetime.utcnow() - ts).total_seconds()
+        self.latencies += 1
+        self.latency_time += latency
+        if latency > self.latency_max:
+            self.latency_max = latency
+
+    def timed(self, stage, iterable):
+        """
+        Generator of the items of `iterable`, adding the time
+        spent getting each item to `stage`.
+        """
+        iterator = iter(iterable)
+        while True:
+            start = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.times[stage] += perf_counter() - start
+            yield item
+
+    def decode(self, raw, codec_options):
+        """
+        Decode the RawBSONDocument `raw` with `codec_options`, timing it.
+        """
+        start = perf_counter()
+        obj = bson.decode(raw.raw, codec_options)
+        self.times["decode"] += perf_counter() - start
+        return obj
+
+    def wrap(self, stage, function):
+        """
+        Wrap `function` adding the time spent in each call to `stage`.
+        """
+        def timed_function(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.times[stage] += perf_counter() - start
+        return timed_function
+
+    def snapshot(self):
+        """
+        Values of the counters, resetting the max round-trip time and latency.
+        """
+        round_trip_max, self.round_trip_max = self.round_trip_max, 0.0
+        latency_max, self.latency_max = self.latency_max, 0.0
+        return (time.time(), self.records, self.bytes, dict(self.times),
+                self.round_trips, self.round_trip_time, round_trip_max,
+                self.latencies, self.latency_time, latency_max)
+
+    def report(self, previous, current):
+        """
+        Line with the stats between the snapshots `previous` and `current`.
+        """
+        elapsed = current[0] - previous[0]
+        if self.latest_ts is not None:
+            lag = "%.1fs" % (datetime.utcnow() - self.latest_ts).total_seconds()
+        else:
+            lag = "-"
+        round_trips = current[4] - previous[4]
+        if round_trips:
+            rtt = "%.1fms (max %.1fms)" % ((current[5] - previous[5]) / round_trips * 1000, current[6] * 1000)
+        else:
+            rtt = "-"
+        latencies = current[7] - previous[7]
+        if latencies:
+            latency = "%.1fms (max %.1fms)" % ((current[8] - previous[8]) / latencies * 1000, current[9] * 1000)
+        else:
+            latency = "-"
+        stages = ", ".join("%s %.1f%%" % (stage, (current[3][stage] - previous[3][stage]) / elapsed * 100)
+                           for stage in STAGES)
+        lost = (", " + self.lost()) if self.gaps else ""
+        return ("Mongotail STATS - lag %s, latency %s, %.1f records/s, %.1f KB/s, getMore %s, time in %s%s\n"
+                % (lag, latency, (current[1] - previous[1]) / elapsed, (current[2] - previous[2]) / elapsed / 1024,
+                   rtt, stages, lost))
+
+    def _run(self, interval):
+        previous = self.snapshot()
+        while True:
+            time.sleep(interval)
+            current = self.snapshot()
+            try:
+                self.stream.write(self.report(previous, current))
+                self.stream.flush()
+            except (IOError, ValueError):
+                return
+            previous = current
+
+
+stats = Stats()
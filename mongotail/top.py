@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+"""
+Live view of the query shapes with more load, like the ``top`` command.
+"""
+
+from __future__ import absolute_import
+import threading
+import time
+from .shape import QueryStats
+from .err import error
+
+REFRESH_INTERVAL = 1.0
+
+# Keys to change the column used to sort the shapes
+SORT_KEYS = {
+    ord("t"): ("millis", "total time"),
+    ord("c"): ("count", "count"),
+    ord("m"): ("max_millis", "max time"),
+    ord("a"): ("avg_millis", "average time"),
+    ord("e"): ("docs_examined", "docs examined"),
+}
+
+COLUMNS = "%7s %10s %8s %8s %10s %9s  %-13s %-20s %s"
+
+
+def top(entries, formatters, title, max_shapes=1000):
+    """
+    Show in the terminal the query shapes of the operations in `entries`,
+    an iterable of log entries (``None`` items are ignored) that is read
+    in a separated thread, sorted by the total time spent on each one.
+    The screen is refreshed each second until the ``q`` key is pressed.
+    """
+    try:
+        import curses
+    except ImportError:
+        error("The --top option needs the curses module, not available in this platform", 1)
+    stats = QueryStats(formatters, max_shapes)
+    lock = threading.Lock()
+    failures = []
+
+    def read():
+        try:
+            for entry in entries:
+                if entry is not None:
+                    with lock:
+                        stats.add(entry)
+        except Exception as e:
+            failures.append(e)
+
+    reader = threading.Thread(target=read, name="mongotail-top")
+    reader.daemon = True
+    reader.start()
+
+    def screen(stdscr):
+        curses.curs_set(0)
+        stdscr.timeout(int(REFRESH_INTERVAL * 1000))
+        sort, sort_name = SORT_KEYS[ord("t")]
+        while True:
+            with lock:
+                shapes = stats.top(sort=sort)
+                count, nshapes = stats.count, len(stats.shapes)
+            stdscr.erase()
+            height, width = stdscr.getmaxyx()
+            lines = [
+                "mongotail top - %s - %s - %d operations, %d shapes - sorted by %s"
+                % (title, time.strftime("%H:%M:%S"), count, nshapes, sort_name),
+                "Keys: q quit, t total time, c count, m max time, a average time, e docs examined",
+                "",
+                COLUMNS % ("COUNT", "TOTAL ms", "AVG ms", "MAX ms", "EXAMINED", "RETURNED",
+                           "OPERATION", "COLLECTION", "SHAPE"),
+            ]
+            if failures:
+                lines[2] = "Error reading the log: %s" % failures[0]
+            for (operation, doc, shape), s in shapes[:max(height - len(lines), 0)]:
+                lines.append(COLUMNS % (s.count, s.millis, "%.1f" % s.avg_millis, s.max_millis,
+                                        s.docs_examined, s.nreturned, operation.upper(), doc, shape))
+            for y, line in enumerate(lines[:height]):
+                try:
+                    stdscr.addnstr(y, 0, line, width - 1, curses.A_REVERSE if y == 3 else curses.A_NORMAL)
+                except curses.error:
+                    pass    # The terminal was resized
+            stdscr.refresh()
+            key = stdscr.getch()
+            if key in (ord("q"), ord("Q")):
+                return
+            if key in SORT_KEYS:
+                sort, sort_name = SORT_KEYS[key]
+
+    curses.wrapper(screen)
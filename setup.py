@@ -51,6 +51,12 @@ setup(
         'pymongo[srv]>=3.12,<5.0.0',
         'res-address>=2.0.0,<3.0.0',
     ],
+    extras_require={
+        'zstd': ['zstandard'],
+        'msgpack': ['msgpack'],
+        'orjson': ['orjson'],
+        'compression': ['pymongo[snappy,zstd]'],
+    },
     entry_points={
         'console_scripts': [
             'mongotail = mongotail.mongotail:main',
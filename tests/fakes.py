@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+"""
+Fakes of the PyMongo objects used by Mongotail, to run the
+tests without a MongoDB server.
+"""
+
+from datetime import datetime, timedelta
+
+START = datetime(2023, 1, 2, 14, 2)
+
+
+def entry(i, millis=0, **fields):
+    """
+    Log entry of a query, logged `i` seconds after :data:`START`.
+    """
+    obj = {'ts': START + timedelta(seconds=i), 'op': 'query', 'ns': 'test.users',
+           'command': {'find': 'users', 'filter': {'n': i}}, 'nreturned': 1, 'millis': millis}
+    obj.update(fields)
+    return obj
+
+
+class FakeCursor(object):
+    """
+    Cursor returning `docs` in batches of `batch_size` entries (all at
+    once by default), closed after the last one, like non tailable cursors.
+    """
+
+    def __init__(self, docs, batch_size=None):
+        self.docs = list(docs)
+        self.batch_size = batch_size
+        self.batch = []
+        self.retrieved = 0
+        self.alive = True
+
+    def sort(self, key, direction):
+        if direction == -1:
+            self.docs.reverse()
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    def max_await_time_ms(self, ms):
+        return self
+
+    def close(self):
+        self.alive = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.batch:
+            if not self.docs:
+                self.alive = False
+                raise StopIteration
+            n = self.batch_size or len(self.docs)
+            self.batch, self.docs = self.docs[:n], self.docs[n:]
+            self.retrieved += len(self.batch)
+        return self.batch.pop(0)
+
+    next = __next__     # Python 2.7
+
+
+class FakeCollection(object):
+
+    codec_options = None
+
+    def __init__(self, docs, full_name="test.system.profile"):
+        self.docs = docs
+        self.full_name = full_name
+
+    def find(self, query=None, projection=None, **kwargs):
+        docs = self.docs
+        ts = (query or {}).get('ts', {})
+        if '$gte' in ts:
+            docs = [d for d in docs if d['ts'] >= ts['$gte']]
+        if '$lte' in ts:
+            docs = [d for d in docs if d['ts'] <= ts['$lte']]
+        return FakeCursor(docs, kwargs.get('batch_size'))
+
+    def with_options(self, codec_options=None):
+        return self
+
+
+class FakeProfileDatabase(object):
+    """
+    Database with the profile collection holding `docs`.
+    """
+
+    def __init__(self, docs, name="test"):
+        self.name = name
+        self.system = type("System", (object,), {})()
+        self.system.profile = FakeCollection(docs)
+
+
+class FakeClient(object):
+    """
+    Client of a server running the MongoDB `version`.
+    """
+
+    def __init__(self, version="6.0.0"):
+        self.version = version
+
+    def server_info(self):
+        return {'version': self.version}
+
+
+class FakeTime(object):
+    """
+    Replacement of the ``time`` module of a Mongotail module, with
+    the clock moved by hand.
+    """
+
+    def __init__(self, now=1672668120.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeStream(object):
+    """
+    Stream that keeps all the text written, and the
+    number of flushes, like a terminal if `tty` is true.
+    """
+
+    def __init__(self, tty=False):
+        self.parts = []
+        self.flushes = 0
+        self.tty = tty
+
+    def isatty(self):
+        return self.tty
+
+    def write(self, text):
+        self.parts.append(text)
+
+    def flush(self):
+        self.flushes += 1
+
+    def getvalue(self):
+        return "".join(self.parts)
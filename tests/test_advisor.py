@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+import unittest
+from bson.regex import Regex
+from mongotail.advisor import Advisor, get_index_key, is_prefix
+from .fakes import entry
+
+
+def scan(i, filter, sort=None, examined=1000, returned=1, millis=100):
+    command = {'find': 'users', 'filter': filter}
+    if sort:
+        command['sort'] = sort
+    return entry(i, millis=millis, command=command, docsExamined=examined, nreturned=returned,
+                 planSummary="COLLSCAN")
+
+
+class FakeCollection(object):
+
+    def __init__(self, indexes):
+        self.indexes = indexes
+
+    def list_indexes(self):
+        return [{'name': name, 'key': key} for name, key in self.indexes]
+
+
+class FakeDatabase(object):
+
+    def __init__(self, indexes):
+        self.indexes = indexes
+
+    def __getitem__(self, name):
+        return FakeCollection(self.indexes)
+
+
+class IndexKeyTest(unittest.TestCase):
+
+    def test_equality_sort_range(self):
+        key = get_index_key({'age': {'$gt': 18}, 'name': Regex('^a'), 'status': 'A', 'type': {'$in': [1, 2]}},
+                            {'created': -1})
+        self.assertEqual(key, ((('status', None), ('type', None), ('created', -1), ('age', None), ('name', None)), 2))
+
+    def test_and_conditions(self):
+        self.assertEqual(get_index_key({'$and': [{'a': 1}, {'b': {'$lt': 2}}], '$or': [{'c': 1}]}),
+                         ((('a', None), ('b', None)), 1))
+
+    def test_equality_fields_sorted(self):
+        key = get_index_key({'b': 1, 'a': 2, 'c': {'$gt': 3}}, {'d': 1})
+        self.assertEqual(key, ((('a', None), ('b', None), ('d', 1), ('c', None)), 2))
+        self.assertEqual(get_index_key({'a': 2, 'c': {'$gt': 3}, 'b': 1}, {'d': 1}), key)
+
+    def test_prefix(self):
+        self.assertTrue(is_prefix((('a', None), ('b', -1)), (('a', 1), ('b', 1), ('c', 1))))
+        self.assertFalse(is_prefix((('b', -1), ('c', 1)), (('b', 1), ('c', 1))))
+        self.assertFalse(is_prefix((('a', None), ('b', 1)), (('a', 1),)))
+
+    def test_prefix_equality_any_order(self):
+        self.assertTrue(is_prefix((('a', None), ('b', None), ('c', 1)), (('b', 1), ('a', -1), ('c', 1)), 2))
+        self.assertFalse(is_prefix((('a', None), ('b', None), ('c', 1)), (('b', 1), ('c', 1), ('a', 1)), 2))
+        self.assertTrue(is_prefix((('b', 1),), (('a', None), ('b', None)), 2))
+        self.assertFalse(is_prefix((('b', 1), ('a', 1)), (('a', None), ('b', None)), 1))
+
+
+class AdvisorTest(unittest.TestCase):
+
+    def test_id_equality_not_suggested(self):
+        advisor = Advisor()     # Like with --replay, the indexes are unknown
+        self.assertIsNone(advisor.add(scan(0, {'_id': 1})))
+        self.assertIsNone(advisor.add(scan(1, {'_id': {'$in': [1, 2]}, 'status': 'A'})))
+        self.assertIsNone(advisor.add(scan(2, {'x': 1, '_id': 2})))
+        self.assertIsNone(advisor.add(scan(3, {'_id': 2, 'x': 1})))
+        self.assertIsNone(advisor.add(scan(4, {'_id': {'$gt': 2}})))
+        self.assertEqual(advisor.advise(), [])
+
+    def test_same_filter_in_any_order(self):
+        advisor = Advisor(FakeDatabase([('_id_', {'_id': 1}), ('a_1_b_1', {'a': 1, 'b': 1})]))
+        first = advisor.add(scan(0, {'a': 1, 'b': 2}))
+        self.assertEqual(advisor.add(scan(1, {'b': 1, 'a': 2})), first)
+        [(ns, key, equality, stats)] = advisor.advise()
+        self.assertEqual(stats.count, 2)
+        self.assertEqual(advisor.get_note(ns, key, equality), "(exists: a_1_b_1)")
+        advisor = Advisor(FakeDatabase([('b_1_a_1', {'b': 1, 'a': 1})]))
+        ns, key, equality = advisor.add(scan(0, {'a': 1, 'b': 2}))
+        self.assertEqual(advisor.get_note(ns, key, equality), "(exists: b_1_a_1)")
+
+    def test_efficient_operations_skipped(self):
+        advisor = Advisor()
+        self.assertIsNone(advisor.add(dict(scan(0, {'a': 1}, examined=5, returned=1), planSummary="IXSCAN")))
+        self.assertIsNotNone(advisor.add(dict(scan(1, {'a': 1}, examined=50, returned=1), planSummary="IXSCAN")))
+
+    def test_ranked_by_time_saved(self):
+        advisor = Advisor()
+        advisor.add(scan(0, {'a': 1}, millis=10))
+        advisor.add(scan(1, {'b': 1}, millis=500))
+        advisor.add(scan(2, {'a': 2}, millis=10))
+        self.assertEqual([key for _, key, _, _ in advisor.advise()], [(('b', None),), (('a', None),)])
+
+    def test_existing_indexes(self):
+        advisor = Advisor(FakeDatabase([('_id_', {'_id': 1}), ('a_1_b_1', {'a': 1, 'b': 1}), ('c_1', {'c': 1})]))
+        self.assertEqual(advisor.get_note('test.users', (('a', None),), 1), "(exists: a_1_b_1)")
+        self.assertEqual(advisor.get_note('test.users', (('c', None), ('d', 1)), 1), "(extends: c_1)")
+        self.assertEqual(advisor.get_note('test.users', (('b', None), ('c', None)), 2), "(extends: c_1)")
+        self.assertEqual(advisor.get_note('test.users', (('d', None),), 1), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
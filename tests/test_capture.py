@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from datetime import timedelta
+import bson
+from bson.raw_bson import RawBSONDocument
+from mongotail import out
+from mongotail.out import Output
+from mongotail.capture import Recorder, read_capture, read_index
+from mongotail.mongotail import record, replay, main
+from .fakes import FakeClient, FakeProfileDatabase, FakeStream, entry, START
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def raw_entries(n):
+    """
+    `n` entries logged every half second, as returned by the server.
+    """
+    return [RawBSONDocument(bson.encode(entry(i * 0.5, i))) for i in range(n)]
+
+
+class CaptureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self._stderr, sys.stderr = sys.stderr, FakeStream()
+
+    def tearDown(self):
+        sys.stderr = self._stderr
+        shutil.rmtree(self.dir)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def write(self, path, entries):
+        recorder = Recorder(path, "6.0.0", "test")
+        for obj in entries:
+            recorder.write(obj)
+        recorder.close()
+
+    def assert_record_replay(self, name):
+        path = self.path(name)
+        entries = raw_entries(20)
+        self.write(path, entries)
+        header, read = read_capture(path)
+        self.assertEqual((header['serverVersion'], header['db']), ("6.0.0", "test"))
+        self.assertEqual([e.raw for e in read], [e.raw for e in entries])
+        # One index entry each second of log
+        timestamps, offsets = read_index(path)
+        self.assertEqual(len(timestamps), 10)
+        self.assertEqual(timestamps, sorted(timestamps))
+        # Seek with the index
+        since, until = START + timedelta(seconds=3.2), START + timedelta(seconds=6)
+        header, read = read_capture(path, since, until)
+        self.assertEqual([e['ts'] for e in read], [e['ts'] for e in entries[7:13]])
+        header, read = read_capture(path, START + timedelta(seconds=30))
+        self.assertEqual(list(read), [])
+
+    def test_plain(self):
+        self.assert_record_replay("capture.bson")
+
+    def test_gzip(self):
+        self.assert_record_replay("capture.bson.gz")
+
+    @unittest.skipIf(zstandard is None, "zstandard isn't installed")
+    def test_zstd(self):
+        self.assert_record_replay("capture.bson.zst")
+
+    def test_index_offsets(self):
+        path = self.path("capture.bson")
+        entries = raw_entries(6)
+        self.write(path, entries)
+        with open(path, "rb") as f:
+            data = f.read()
+        # The offsets point to the first entry logged in each second
+        timestamps, offsets = read_index(path)
+        self.assertEqual([bson.decode(data[offset:offset + len(entries[0].raw)])['ts'] for offset in offsets],
+                         [e['ts'] for e in entries[::2]])
+
+    def test_without_index(self):
+        path = self.path("capture.bson.gz")
+        entries = raw_entries(6)
+        self.write(path, entries)
+        os.remove(path + ".idx")
+        header, read = read_capture(path, START + timedelta(seconds=1))
+        self.assertEqual([e.raw for e in read], [e.raw for e in entries[2:]])
+
+    def test_interrupted(self):
+        path = self.path("capture.bson")
+        entries = raw_entries(4)
+        self.write(path, entries)
+        with open(path, "ab") as f:
+            f.write(entries[0].raw[:10])
+        header, read = read_capture(path)
+        self.assertEqual(len(list(read)), 4)
+
+    def test_not_a_capture(self):
+        path = self.path("other.bson")
+        with open(path, "wb") as f:
+            f.write(bson.encode({'a': 1}))
+        self.assertRaises(ValueError, read_capture, path)
+
+    def test_record_and_replay(self):
+        path = self.path("capture.bson.gz")
+        record(FakeClient("4.4.0"), FakeProfileDatabase(raw_entries(6)), path, "ALL", False)
+        stream = FakeStream()
+        _output, out.output = out.output, Output(stream)
+        try:
+            replay(path, False, None, since=START + timedelta(seconds=1))
+        finally:
+            out.output = _output
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith("2023-01-02 14:02:01.000 QUERY     [users] : {\"n\": 1.0}"))
+
+
+class ReplayOptionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self._argv = sys.argv
+        self._stderr, sys.stderr = sys.stderr, FakeStream()
+
+    def tearDown(self):
+        sys.argv = self._argv
+        sys.stderr = self._stderr
+
+    def test_options_rejected(self):
+        for options in (["-n", "5"], ["-f"], ["--top"], ["--serve", ":9216"], ["--record", "other.bson"],
+                        ["--checkpoint", "pos"], ["--cluster"], ["-l", "1"]):
+            sys.argv = ["mongotail", "--replay", "capture.bson"] + options
+            self.assertRaises(SystemExit, main)
+            self.assertIn("can't be used", sys.stderr.getvalue())
+            sys.stderr.parts = []
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+import os
+import shutil
+import tempfile
+import unittest
+from mongotail.checkpoint import Checkpoint
+from mongotail.mongotail import read_log, LOG_FIELDS
+from .fakes import FakeProfileDatabase, entry
+
+
+class ReadLogCheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "checkpoint.json")
+        self.db = FakeProfileDatabase([entry(i) for i in range(10)])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def read(self, lines, n, interrupt=None):
+        """
+        Read `n` entries with a new checkpoint, closing the log after
+        that, or raising `interrupt` in it.
+        """
+        log = read_log(self.db, lines, False, LOG_FIELDS, checkpoint=Checkpoint(self.path))
+        read = []
+        while len(read) < n:
+            result = next(log)
+            if result is not None:
+                read.append(result)
+        if interrupt:
+            self.assertRaises(interrupt, log.throw, interrupt)
+        else:
+            log.close()
+        return read
+
+    def test_saved_when_closed(self):
+        read = self.read(None, 3)
+        self.assertEqual(Checkpoint(self.path).ts, read[-1]['ts'])
+
+    def test_saved_when_interrupted(self):
+        read = self.read(None, 3, KeyboardInterrupt)
+        self.assertEqual(Checkpoint(self.path).ts, read[-1]['ts'])
+
+    def test_last_lines_saved_when_interrupted(self):
+        read = self.read(5, 2, KeyboardInterrupt)
+        self.assertEqual(read[-1]['ts'], entry(6)['ts'])
+        self.assertEqual(Checkpoint(self.path).ts, read[-1]['ts'])
+
+    def test_resumed_without_duplicates(self):
+        first = self.read(None, 3, KeyboardInterrupt)
+        rest = [r for r in read_log(self.db, 10, False, LOG_FIELDS, checkpoint=Checkpoint(self.path))
+                if r is not None]
+        self.assertEqual(first + rest, self.db.system.profile.docs)
+
+
+if __name__ == "__main__":
+    unittest.main()
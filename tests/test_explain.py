@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+import unittest
+from mongotail.explain import Explainer, explain_command, EXPLAIN_TIMEOUT_MS
+from mongotail.out import get_formatters
+from .fakes import FakeStream, entry
+
+SESSION = {"lsid": {"id": 1}, "$db": "test", "$clusterTime": {}}
+
+
+def command(**fields):
+    return dict(fields, **SESSION)
+
+
+OPERATIONS = {
+    "find": entry(0, command=command(find="users", filter={"n": 1}, sort={"n": -1})),
+    "aggregate": entry(0, op="command", command=command(aggregate="users", pipeline=[{"$match": {"n": 1}}],
+                                                        cursor={})),
+    "count": entry(0, op="command", command=command(count="users", query={"n": 1})),
+    "distinct": entry(0, op="command", command=command(distinct="users", key="name", query={"n": 1})),
+    "findAndModify": entry(0, op="command", command=command(findAndModify="users", query={"n": 1},
+                                                            update={"$set": {"m": 1}})),
+    "update": entry(0, op="update", command={"q": {"n": 1}, "u": {"$set": {"m": 1}}, "multi": True}),
+    "delete": entry(0, op="remove", command={"q": {"n": 1}, "limit": 0}),
+}
+
+
+class FakeDatabase(object):
+
+    def __init__(self, commands):
+        self.commands = commands
+
+    def command(self, cmd):
+        self.commands.append(cmd)
+        return {"queryPlanner": {"winningPlan": {"stage": "FETCH",
+                                                 "inputStage": {"stage": "IXSCAN", "keyPattern": {"n": 1}}}},
+                "executionStats": {"totalKeysExamined": 1, "totalDocsExamined": 1, "nReturned": 1,
+                                   "executionTimeMillis": 0}}
+
+
+class FakeClient(object):
+
+    def __init__(self):
+        self.commands = []
+
+    def __getitem__(self, name):
+        return FakeDatabase(self.commands)
+
+
+class ExplainCommandTest(unittest.TestCase):
+
+    def test_time_bound_of_each_operation(self):
+        for name, obj in OPERATIONS.items():
+            cmd = explain_command(obj)
+            self.assertIsNotNone(cmd, name)
+            self.assertEqual(list(cmd)[0], name, name)
+            self.assertEqual(cmd["maxTimeMS"], EXPLAIN_TIMEOUT_MS, name)
+
+    def test_session_arguments_removed(self):
+        for name, obj in OPERATIONS.items():
+            cmd = explain_command(obj)
+            statement = (cmd.get("updates") or cmd.get("deletes") or [cmd])[0]
+            self.assertFalse(set(statement) & set(SESSION), name)
+
+    def test_not_explainable(self):
+        self.assertIsNone(explain_command(entry(0, op="insert", command=command(insert="users"))))
+        self.assertIsNone(explain_command(entry(0, op="command", command=command(drop="users"))))
+        self.assertIsNone(explain_command(entry(0, command=None, query={"n": 1})))
+
+
+class ExplainerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeClient()
+        self.formatters = get_formatters("6.0.0")
+
+    def test_shape_explained_once(self):
+        explainer = Explainer(self.client, 10, "executionStats", max_rate=1e6, max_load=1,
+                              stream=FakeStream())
+        plans = [explainer.get_plan(entry(i, millis=20), self.formatters) for i in range(5)]
+        self.assertEqual(len(self.client.commands), 1)
+        self.assertEqual(self.client.commands[0]["verbosity"], "executionStats")
+        self.assertEqual(set(plans), set(['FETCH > IXSCAN {"n": 1} (1 keys, 1 docs examined, 1 returned, 0 ms)']))
+
+    def test_fast_operations_not_explained(self):
+        explainer = Explainer(self.client, 10, stream=FakeStream())
+        self.assertIsNone(explainer.get_plan(entry(0, millis=5), self.formatters))
+        self.assertEqual(self.client.commands, [])
+
+    def test_rate_limit(self):
+        explainer = Explainer(self.client, 10, max_rate=0.001, stream=FakeStream())
+        explainer.get_plan(dict(OPERATIONS["find"], millis=20), self.formatters)
+        explainer.get_plan(dict(OPERATIONS["count"], millis=20), self.formatters)
+        self.assertEqual(len(self.client.commands), 1)
+        self.assertEqual(explainer.limited, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+import re
+import unittest
+from mongotail.filters import LogFilter
+from .fakes import entry
+
+REGEX_TYPE = type(re.compile(""))
+
+
+def server_match(query, doc):
+    """
+    Evaluate the `query` sent to the server on `doc`, like MongoDB
+    does it, with the operators used by :class:`LogFilter`.
+    """
+    for field, condition in query.items():
+        if field == "$and":
+            if not all(server_match(q, doc) for q in condition):
+                return False
+            continue
+        if field == "$or":
+            if not any(server_match(q, doc) for q in condition):
+                return False
+            continue
+        value = doc
+        for key in field.split("."):
+            value = value.get(key, KeyError) if isinstance(value, dict) else KeyError
+        if not match_condition(condition, value):
+            return False
+    return True
+
+
+def match_condition(condition, value):
+    if isinstance(condition, REGEX_TYPE):
+        condition = {"$regex": condition.pattern}
+    if not isinstance(condition, dict) or not any(k.startswith("$") for k in condition):
+        return value == condition
+    for op, arg in condition.items():
+        if op == "$exists":
+            ok = (value is not KeyError) == arg
+        elif op == "$in":
+            ok = value in arg
+        elif op == "$regex":
+            ok = isinstance(value, str) and re.search(arg, value) is not None
+        elif op == "$gte":
+            ok = isinstance(value, (int, float)) and value >= arg
+        else:
+            raise ValueError("Unsupported operator %s" % op)
+        if not ok:
+            return False
+    return True
+
+
+def legacy(op, millis=5, ns="test.users", **fields):
+    """Entry logged by MongoDB < 3.2"""
+    obj = {'op': op, 'ns': ns, 'millis': millis}
+    obj.update(fields)
+    return obj
+
+
+ENTRIES = [
+    # Mongo < 3.2
+    legacy('query', query={'name': "Juan"}),
+    legacy('query', 120, ns="test.$cmd", query={'count': "users", 'query': {}}),
+    legacy('command', 120, ns="test.$cmd", command={'count': "users", 'query': {}}),
+    legacy('command', 40, ns="test.$cmd", command={'mapreduce': "users", 'map': "", 'reduce': ""}),
+    legacy('update', 0, query={'_id': 1}, updateobj={'$set': {'n': 1}}),
+    legacy('insert', 2, ns="other.orders"),
+    # Mongo 3.2 - 3.4
+    legacy('query', 300, query={'find': "users", 'filter': {'name': "Juan"}}, planSummary="COLLSCAN"),
+    legacy('command', 8, command={'aggregate': "users", 'pipeline': []}, planSummary="IXSCAN { n: 1 }"),
+    legacy('getmore', 1, query={'getMore': 1, 'collection': "users"}),
+    # Mongo 3.6+
+    entry(0, 100, appName="app", user="admin@admin"),
+    entry(1, 7, op='command', command={'count': "users", 'query': {}, '$db': "test"}),
+    entry(2, 99, op='command', command={'findAndModify': "users", 'query': {}, 'update': {}}),
+    entry(3, 3, op='command', command={'mapReduce': "users", 'map': "", 'reduce': ""}),
+    entry(4, 0, op='remove', ns="test.orders", command={'q': {}, 'limit': 1}),
+    entry(5, 50, op='getmore', command={'getMore': 1, 'collection': "users"}),
+    entry(6, 10, op='command', ns="test.users2", command={'distinct': "users2", 'key': "n"}),
+    # Fields missing
+    {'op': 'query', 'ns': "test.users"},
+    {'op': 'command', 'ns': "test.users"},
+]
+
+FILTERS = [
+    dict(ops=["query"]),
+    dict(ops=["find", "update", "remove"]),
+    dict(ops=["count"]),
+    dict(ops=["map"]),
+    dict(ops=["findandmodify", "distinct"]),
+    dict(ops=["command"]),
+    dict(ops=["query", "aggregate"]),
+    dict(ns="users"),
+    dict(ns="test.*"),
+    dict(ns="*.user?"),
+    dict(ns="/^(test|other)\\.(users|orders)$/"),
+    dict(min_millis=0),
+    dict(min_millis=100),
+    dict(plan_summary="IXSCAN"),
+    dict(app_name="app"),
+    dict(user="admin"),
+    dict(user="admin@test"),
+    dict(ops=["count", "query"], ns="users", min_millis=100),
+]
+
+
+class LogFilterTest(unittest.TestCase):
+
+    def test_query_and_match_agree(self):
+        # The server-side filter (--op, --ns ...) and the client-side
+        # filter used with --replay accept the same entries
+        for kwargs in FILTERS:
+            log_filter = LogFilter(**kwargs)
+            query = log_filter.query({})
+            for obj in ENTRIES:
+                self.assertEqual(server_match(query, obj), log_filter.match(obj),
+                                 "%s on %s" % (kwargs, obj))
+
+    def accepted(self, **kwargs):
+        log_filter = LogFilter(**kwargs)
+        return [i for i, obj in enumerate(ENTRIES) if log_filter.match(obj)]
+
+    def test_ops(self):
+        self.assertEqual(self.accepted(ops=["query"]), [0, 1, 6, 9, 16])
+        self.assertEqual(self.accepted(ops=["count"]), [2, 10])
+        self.assertEqual(self.accepted(ops=["mapreduce"]), [3, 12])
+        self.assertEqual(self.accepted(ops=["findAndModify"]), [11])
+
+    def test_ns(self):
+        self.assertEqual(self.accepted(ns="orders"), [5, 13])
+        self.assertEqual(self.accepted(ns="test.users"), [0, 4, 6, 7, 8, 9, 10, 11, 12, 14, 16, 17])
+
+    def test_min_millis(self):
+        self.assertEqual(self.accepted(min_millis=100), [1, 2, 6, 9])
+
+    def test_unknown_op(self):
+        self.assertRaises(ValueError, LogFilter, ops=["fetch"])
+
+    def test_empty(self):
+        log_filter = LogFilter()
+        self.assertFalse(log_filter)
+        self.assertEqual(log_filter.query({'a': 1}), {'a': 1})
+        self.assertTrue(log_filter.match(ENTRIES[0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
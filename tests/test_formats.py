@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+import csv
+import io
+import json
+import unittest
+from datetime import timedelta
+from bson import json_util, ObjectId
+from mongotail.out import get_formatters
+from mongotail.checkpoint import Gap
+from mongotail.formats import get_record_format, JSON_OPTIONS, RECORD_FIELDS, GAP_FIELDS
+from .fakes import entry, START
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def entries():
+    oid = ObjectId("548b164144ae122dc430376b")
+    return [
+        entry(0, 12, command={'find': 'users', 'filter': {'_id': oid}, 'lsid': {'id': 1}, '$db': 'test'},
+              planSummary="IXSCAN { _id: 1 }"),
+        entry(1, 30, docsExamined=10500),
+        Gap('test.users', START + timedelta(seconds=1), START + timedelta(seconds=5), 300),
+        entry(5, 2, op='insert', command={'insert': 'users', 'documents': [{'_id': oid, 'name': "Juan"}]}),
+    ]
+
+
+class FormatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.formatters = get_formatters("6.0.0")
+        self.metadata = ['planSummary', 'docsExamined']
+
+    def encode(self, name, source=None):
+        record_format = get_record_format(name, self.metadata, bool(source))
+        return [record_format.encode(obj, False, self.metadata, self.formatters, source) for obj in entries()]
+
+    def assert_records(self, records):
+        self.assertEqual([r['op'] for r in records], ["query", "query", "gap", "insert"])
+        self.assertEqual([r['millis'] for r in records], [12, 30, None, 2])
+        self.assertEqual(records[0]['shape'], {'command': {'find': 'users', 'filter': {'_id': "?"}}})
+        self.assertEqual(records[3]['shape'], {'command': {'insert': 'users', 'documents': [{'_id': "?",
+                                                                                            'name': "?"}]}})
+        self.assertEqual(records[0]['planSummary'], "IXSCAN { _id: 1 }")
+        self.assertEqual(records[1]['docsExamined'], 10500)
+        self.assertEqual((records[2]['lost_entries'], records[2]['lost_seconds']), (300, 4.0))
+
+    def test_ndjson(self):
+        lines = self.encode("ndjson")
+        self.assertTrue(all(line.endswith("\n") and line.count("\n") == 1 for line in lines))
+        records = [json_util.loads(line, json_options=JSON_OPTIONS) for line in lines]
+        self.assert_records(records)
+        self.assertEqual(records[0]['ts'].replace(tzinfo=None), START)
+        self.assertEqual(json.loads(lines[0])['ts'], {"$date": "2023-01-02T14:02:00Z"})
+
+    @unittest.skipIf(msgpack is None, "msgpack isn't installed")
+    def test_msgpack(self):
+        unpacker = msgpack.Unpacker(raw=False, timestamp=3)
+        unpacker.feed(b"".join(self.encode("msgpack")))
+        records = list(unpacker)
+        self.assert_records(records)
+        self.assertEqual(records[1]['ts'].replace(tzinfo=None), START + timedelta(seconds=1))
+
+    def test_csv(self):
+        lines = self.encode("csv", source="rs0/host1:27017")
+        rows = list(csv.reader(io.StringIO(u"".join(lines))))
+        header = ["source"] + RECORD_FIELDS + self.metadata + GAP_FIELDS
+        self.assertEqual(rows[0], header)
+        self.assertEqual(len(rows), 5)
+        self.assertTrue(all(len(row) == len(header) for row in rows))
+        records = [dict(zip(header, row)) for row in rows[1:]]
+        for record in records:
+            record['shape'] = json.loads(record['shape']) if record['shape'] else None
+            record['millis'] = int(record['millis']) if record['millis'] else None
+            record['docsExamined'] = int(record['docsExamined']) if record['docsExamined'] else None
+            if record['op'] == "gap":
+                record['lost_entries'] = int(record['lost_entries'])
+                record['lost_seconds'] = float(record['lost_seconds'])
+        self.assert_records(records)
+        self.assertEqual(records[0]['source'], "rs0/host1:27017")
+        self.assertEqual(records[0]['ts'], "2023-01-02T14:02:00.000Z")
+        # The columns missing in the first record are still in the header
+        self.assertEqual(records[0]['docsExamined'], None)
+
+
+if __name__ == "__main__":
+    unittest.main()
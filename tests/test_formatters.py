@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+import unittest
+from datetime import timedelta
+from bson import ObjectId, regex
+from bson.son import SON
+from mongotail import out
+from mongotail.out import Output, get_formatters, parse_version, print_obj
+from mongotail.out import format_query, format_query_legacy, format_update, format_update_legacy
+from mongotail.out import format_insert, format_insert_legacy, format_remove, format_remove_legacy
+from .fakes import FakeStream, START
+
+OID = ObjectId("548b164144ae122dc430376b")
+
+
+def log(i, op, **fields):
+    obj = {'ts': START + timedelta(seconds=i), 'op': op, 'ns': "shop.users", 'millis': i}
+    obj.update(fields)
+    return obj
+
+
+def commands():
+    """Commands, logged the same way by all the versions"""
+    return [
+        log(10, "command", command=SON([("count", "users"), ("query", {"age": {"$gt": 18}})])),
+        log(11, "command", command=SON([("aggregate", "users"), ("pipeline", [{"$match": {"n": 1}},
+                                                                            {"$limit": 5}])])),
+        log(12, "command", command=SON([("distinct", "users"), ("key", "name"), ("query", {})])),
+        log(13, "command", command=SON([("drop", "sessions")])),
+        log(14, "command", command=SON([("findandmodify", "users"), ("query", {"_id": OID}),
+                                        ("update", {"$inc": {"n": 1}}), ("new", True)])),
+        log(15, "command", command=SON([("findAndModify", "users"), ("query", {"_id": OID}),
+                                        ("sort", {"n": -1}), ("remove", True)])),
+        log(16, "command", command=SON([("mapReduce", "users"), ("map", "function() {\n emit(this.n, 1) }"),
+                                        ("reduce", "function(k, v) {\n return 1 }"), ("out", "totals")])),
+        log(17, "command", command=SON([("group", SON([("ns", "users"), ("key", {"n": 1}),
+                                                        ("$reduce", "function(c, r) {\n r.n++ }"),
+                                                        ("initial", {"n": 0})]))])),
+        log(18, "command", command=SON([("$db", "shop"), ("count", "users"), ("query", {})])),
+    ]
+
+
+# Entries logged by each MongoDB version
+LEGACY = [  # Mongo < 3.2
+    log(0, "query", query={"name": regex.Regex("^mac")}, nreturned=2),
+    log(1, "query", nreturned=0),
+    log(2, "update", query={"_id": OID}, updateobj={"$set": {"name": "Juan"}}, nModified=1),
+    log(3, "update", query={"_id": OID}, updateobj={"name": "Juan"}, nMatched=1),
+    log(4, "insert", query=SON([("_id", OID), ("name", "Juan")]), ninserted=1),
+    log(5, "remove", query={"_id": OID}, ndeleted=1),
+] + commands()
+V32 = [     # Mongo 3.2 - 3.4
+    log(0, "query", query=SON([("find", "users"), ("filter", {"name": "Juan"}), ("sort", {"n": 1}),
+                               ("limit", 10.0), ("skip", 5.0)]), nreturned=3),
+    log(1, "query", query={"find": "users"}),
+    log(2, "update", query={"_id": OID}, updateobj={"$set": {"name": "Juan"}}, nModified=1),
+    log(3, "insert", query=SON([("insert", "users"), ("documents", [{"n": 1}, {"n": 2}])]), ninserted=2),
+    log(4, "insert", query=SON([("insert", "users"), ("documents", [{"n": 1}])]), ninserted=1),
+    log(5, "remove", query={"_id": OID}, ndeleted=1),
+] + commands()
+V36 = [     # Mongo 3.6+
+    log(0, "query", command=SON([("find", "users"), ("filter", {"name": "Juan"}), ("limit", 1)]), nreturned=1),
+    log(1, "query", command=SON([("find", "users"), ("sort", {"n": -1})])),
+    log(2, "update", command=SON([("q", {"_id": OID}), ("u", {"$set": {"name": "Juan"}})]), nModified=1),
+    log(3, "update", command=SON([("u", {"$set": {"n": 1}})]), nMatched=0),
+    log(4, "insert", ninserted=1),
+    log(5, "remove", command=SON([("q", {"n": {"$lt": 0}}), ("limit", 0)]), ndeleted=4),
+    log(6, "remove", ndeleted=0),
+] + commands()
+
+ENTRIES = {"legacy": LEGACY, "3.2": V32, "3.6": V36}
+
+# Lines printed by the baseline version of Mongotail, that checked
+# the server version on each entry
+BASELINE = {
+    'legacy': [
+        '2023-01-02 14:02:00.000 QUERY     [users] : {"name": {"$regex": "^mac"}}. 2 returned.',
+        '2023-01-02 14:02:01.000 QUERY     [users] : {}. 0 returned.',
+        '2023-01-02 14:02:02.000 UPDATE    [users] : {"_id": ObjectId("548b164144ae122dc430376b")}, {"$set": {"name": "Juan"}}. 1 updated.',
+        '2023-01-02 14:02:03.000 UPDATE    [users] : {"_id": ObjectId("548b164144ae122dc430376b")}, {"name": "Juan"}. 1 updated.',
+        '2023-01-02 14:02:04.000 INSERT    [users] : {"_id": ObjectId("548b164144ae122dc430376b"), "name": "Juan"}1 inserted.',
+        '2023-01-02 14:02:05.000 REMOVE    [users] : {"_id": ObjectId("548b164144ae122dc430376b")}. 1 deleted.',
+        '2023-01-02 14:02:10.000 COUNT     [users] : {"age": {"$gt": 18}}',
+        '2023-01-02 14:02:11.000 AGGREGATE [users] : [{"$match": {"n": 1}}, {"$limit": 5}]',
+        '2023-01-02 14:02:12.000 DISTINCT  [users] : "name", {}',
+        '2023-01-02 14:02:13.000 DROP      [sessions] : ',
+        '2023-01-02 14:02:14.000 FINDANDMODIFY [users] : query: {"_id": ObjectId("548b164144ae122dc430376b")}, update: {"$inc": {"n": 1}}, new: true',
+        '2023-01-02 14:02:15.000 FINDANDMODIFY [users] : query: {"_id": ObjectId("548b164144ae122dc430376b")}, sort: {"n": -1}, remove: true',
+        '2023-01-02 14:02:16.000 MAP       [users] : {function() {  emit(this.n, 1) }, function(k, v) {  return 1 }, {"out": "totals"}}',
+        '2023-01-02 14:02:17.000 GROUP     [users] : key: {"n": 1}, reduce: function(c, r) {  r.n++ }, initial: {"n": 0}',
+        '2023-01-02 14:02:18.000 COUNT     [users] : {}',
+    ],
+    '3.2': [
+        '2023-01-02 14:02:00.000 QUERY     [users] : {"name": "Juan"}, sort: {"n": 1}, limit: 10, skip: 5. 3 returned.',
+        '2023-01-02 14:02:01.000 QUERY     [users] : {}',
+        '2023-01-02 14:02:02.000 UPDATE    [users] : {"_id": ObjectId("548b164144ae122dc430376b")}, {"$set": {"name": "Juan"}}. 1 updated.',
+        '2023-01-02 14:02:03.000 INSERT    [users] : [{"n": 1}, {"n": 2}]. 2 inserted.',
+        '2023-01-02 14:02:04.000 INSERT    [users] : {"n": 1}. 1 inserted.',
+        '2023-01-02 14:02:05.000 REMOVE    [users] : {"_id": ObjectId("548b164144ae122dc430376b")}. 1 deleted.',
+        '2023-01-02 14:02:10.000 COUNT     [users] : {"age": {"$gt": 18}}',
+        '2023-01-02 14:02:11.000 AGGREGATE [users] : [{"$match": {"n": 1}}, {"$limit": 5}]',
+        '2023-01-02 14:02:12.000 DISTINCT  [users] : "name", {}',
+        '2023-01-02 14:02:13.000 DROP      [sessions] : ',
+        '2023-01-02 14:02:14.000 FINDANDMODIFY [users] : query: {"_id": ObjectId("548b164144ae122dc430376b")}, update: {"$inc": {"n": 1}}, new: true',
+        '2023-01-02 14:02:15.000 FINDANDMODIFY [users] : query: {"_id": ObjectId("548b164144ae122dc430376b")}, sort: {"n": -1}, remove: true',
+        '2023-01-02 14:02:16.000 MAP       [users] : {function() {  emit(this.n, 1) }, function(k, v) {  return 1 }, {"out": "totals"}}',
+        '2023-01-02 14:02:17.000 GROUP     [users] : key: {"n": 1}, reduce: function(c, r) {  r.n++ }, initial: {"n": 0}',
+        '2023-01-02 14:02:18.000 COUNT     [users] : {}',
+    ],
+    '3.6': [
+        '2023-01-02 14:02:00.000 QUERY     [users] : {"name": "Juan"}, limit: 1. 1 returned.',
+        '2023-01-02 14:02:01.000 QUERY     [users] : {}, sort: {"n": -1}',
+        '2023-01-02 14:02:02.000 UPDATE    [users] : {"_id": ObjectId("548b164144ae122dc430376b")}, {"$set": {"name": "Juan"}}. 1 updated.',
+        '2023-01-02 14:02:03.000 UPDATE    [users] : {}, {"$set": {"n": 1}}. 0 updated.',
+        '2023-01-02 14:02:04.000 INSERT    [users] : 1 inserted.',
+        '2023-01-02 14:02:05.000 REMOVE    [users] : {"n": {"$lt": 0}}. 4 deleted.',
+        '2023-01-02 14:02:06.000 REMOVE    [users] : {}. 0 deleted.',
+        '2023-01-02 14:02:10.000 COUNT     [users] : {"age": {"$gt": 18}}',
+        '2023-01-02 14:02:11.000 AGGREGATE [users] : [{"$match": {"n": 1}}, {"$limit": 5}]',
+        '2023-01-02 14:02:12.000 DISTINCT  [users] : "name", {}',
+        '2023-01-02 14:02:13.000 DROP      [sessions] : ',
+        '2023-01-02 14:02:14.000 FINDANDMODIFY [users] : query: {"_id": ObjectId("548b164144ae122dc430376b")}, update: {"$inc": {"n": 1}}, new: true',
+        '2023-01-02 14:02:15.000 FINDANDMODIFY [users] : query: {"_id": ObjectId("548b164144ae122dc430376b")}, sort: {"n": -1}, remove: true',
+        '2023-01-02 14:02:16.000 MAP       [users] : {function() {  emit(this.n, 1) }, function(k, v) {  return 1 }, {"out": "totals"}}',
+        '2023-01-02 14:02:17.000 GROUP     [users] : key: {"n": 1}, reduce: function(c, r) {  r.n++ }, initial: {"n": 0}',
+        '2023-01-02 14:02:18.000 COUNT     [users] : {}',
+    ],
+}
+
+
+class GetFormattersTest(unittest.TestCase):
+
+    def test_parse_version(self):
+        self.assertEqual(parse_version("3.6.23"), (3, 6, 23))
+        self.assertEqual(parse_version("7.0.0-rc1"), (7, 0, 0))
+        self.assertEqual(parse_version("4.4"), (4, 4))
+        self.assertTrue(parse_version("10.0.1") > parse_version("3.6.0"))
+        self.assertTrue(parse_version("3.10.0") > parse_version("3.2.0"))
+
+    def test_formatters_chosen(self):
+        for version, formatters in (
+                ("2.6.12", (format_query_legacy, format_update_legacy, format_insert_legacy, format_remove_legacy)),
+                ("3.0.15", (format_query_legacy, format_update_legacy, format_insert_legacy, format_remove_legacy)),
+                ("3.2.0", (format_query, format_update_legacy, format_insert, format_remove_legacy)),
+                ("3.4.24", (format_query, format_update_legacy, format_insert, format_remove_legacy)),
+                ("3.6.0", (format_query, format_update, format_insert, format_remove)),
+                ("5.0.14", (format_query, format_update, format_insert, format_remove)),
+                ("10.0.0", (format_query, format_update, format_insert, format_remove))):
+            table = get_formatters(version)
+            self.assertEqual(tuple(table[(op, None)] for op in ("query", "update", "insert", "remove")),
+                             formatters, version)
+
+
+class BaselineOutputTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = FakeStream()
+        self._output, out.output = out.output, Output(self.stream)
+
+    def tearDown(self):
+        out.output = self._output
+
+    def test_same_output(self):
+        for version, entries in (("2.6.12", "legacy"), ("3.0.15", "legacy"), ("3.2.22", "3.2"), ("3.4.24", "3.2"),
+                                 ("3.6.23", "3.6"), ("4.4.18", "3.6"), ("5.0.14", "3.6"), ("7.0.0-rc1", "3.6")):
+            self.stream.parts = []
+            formatters = get_formatters(version)
+            for obj in ENTRIES[entries]:
+                print_obj(obj, False, None, formatters)
+            out.output.flush()
+            self.assertEqual(self.stream.getvalue().splitlines(), BASELINE[entries], version)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+
+import re
+import unittest
+from collections import OrderedDict
+from datetime import datetime
+from uuid import UUID
+import bson
+from bson import ObjectId, DBRef, MinKey, MaxKey, Int64
+from bson.binary import Binary
+from bson.decimal128 import Decimal128
+from bson.raw_bson import RawBSONDocument
+from bson.regex import Regex
+from bson.timestamp import Timestamp
+from mongotail.jsondec import JSONEncoder, PLACEHOLDER
+from .legacy import LegacyJSONEncoder
+
+OID = ObjectId("548b164144ae122dc430376b")
+
+# A value of each type found in the log entries, with the same output than the legacy encoder
+VALUES = [
+    ("string", u"user é中\n\"quoted\""),
+    ("int", 42),
+    ("negative int", -7),
+    ("int64", Int64(2 ** 40)),
+    ("float", 1.5),
+    ("integer float", 10.0),
+    ("nan", float("nan")),
+    ("infinity", float("inf")),
+    ("negative infinity", float("-inf")),
+    ("true", True),
+    ("false", False),
+    ("null", None),
+    ("objectid", OID),
+    ("uuid", UUID("3f9a1a4e-0b2d-4c1e-9a6b-1f2e3d4c5b6a")),
+    ("dbref", DBRef("users", OID)),
+    ("datetime", datetime(2023, 5, 12, 19, 17, 1, 194000)),
+    ("datetime without millis", datetime(2023, 5, 12, 19, 17, 1)),
+    ("datetime before 1900", datetime(1850, 1, 2, 3, 4, 5, 6000)),
+    ("timestamp", Timestamp(1683919021, 3)),
+    ("regex", Regex("^mac", "i")),
+    ("compiled regex", re.compile("^mac")),
+    ("decimal", Decimal128("1234.5678")),
+    ("minkey", MinKey()),
+    ("binary", Binary(b"\x00\x01binary")),
+    ("empty dict", {}),
+    ("empty list", []),
+    ("list", [1, "a", None, [OID]]),
+    ("nested", OrderedDict([("a", {"b": [{"c": OID}]}), ("d", Timestamp(1, 2))])),
+    ("int key", {1: "a"}),
+]
+
+
+class LegacyOutputTest(unittest.TestCase):
+
+    def setUp(self):
+        self.encoder = JSONEncoder()
+        self.legacy = LegacyJSONEncoder()
+
+    def assertSameOutput(self, name, value):
+        expected = self.legacy.encode(value)
+        self.assertEqual(self.encoder.encode(value), expected, name)
+        # The encoder with a limit that is not reached prints the same
+        self.assertEqual(JSONEncoder(max_bytes=10000).encode(value), expected, name)
+
+    def test_each_type(self):
+        for name, value in VALUES:
+            self.assertSameOutput(name, value)
+
+    def test_each_type_in_a_document(self):
+        for name, value in VALUES:
+            self.assertSameOutput(name, {"filter": {"field": value}, "values": [value, value]})
+
+    def test_all_types_in_a_document(self):
+        self.assertSameOutput("all", OrderedDict(VALUES))
+
+    def test_raw_document(self):
+        doc = OrderedDict([("_id", OID), ("at", datetime(2023, 5, 12, 19, 17, 1, 194000)), ("n", 1)])
+        raw = RawBSONDocument(bson.BSON.encode(doc))
+        self.assertEqual(self.encoder.encode({"command": raw}), self.legacy.encode({"command": doc}))
+
+    def test_maxkey(self):
+        # The legacy encoder printed them as MinKey()
+        self.assertEqual(self.encoder.encode({"max": MaxKey()}), '{"max": MaxKey()}')
+
+    def test_placeholder_in_strings(self):
+        doc = {"comment": PLACEHOLDER, "_id": OID}
+        self.assertEqual(self.encoder.encode(doc), self.legacy.encode(doc))
+
+
+if __name__ == "__main__":
+    unittest.main()
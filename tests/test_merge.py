@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+
+import threading
+import unittest
+from mongotail.merge import LogMerger, SortedLogMerger
+from .fakes import entry
+
+
+def entries(merger):
+    return [(name, obj['n']) for name, obj in (item for item in merger if item is not None)]
+
+
+def held(docs, released, free=1):
+    """
+    Source of `docs`, the ones after the first `free` held until `released` is set.
+    """
+    for i, doc in enumerate(docs):
+        if i >= free:
+            released.wait(5)
+        yield doc
+
+
+def numbered(*seconds):
+    return [entry(i, n=i) for i in seconds]
+
+
+class LogMergerTest(unittest.TestCase):
+
+    def test_sorted_by_ts(self):
+        merger = LogMerger(window=float("inf"), max_size=float("inf"))
+        merger.add_source("a", numbered(1, 4, 5))
+        merger.add_source("b", [None] + numbered(2, 3, 6) + [None])
+        self.assertEqual(entries(merger), [("a", 1), ("b", 2), ("b", 3), ("a", 4), ("a", 5), ("b", 6)])
+
+    def test_window(self):
+        released = threading.Event()
+        merger = LogMerger(window=0.1)
+        merger.add_source("a", held(numbered(5, 1), released))
+        result = []
+        for item in merger:
+            if item is not None:
+                result.append(item[1]['n'])
+                released.set()      # The entry 5 was held no more than the window
+        self.assertEqual(result, [5, 1])
+
+    def test_max_size(self):
+        released = threading.Event()
+        merger = LogMerger(window=float("inf"), max_size=2)
+        merger.add_source("a", held(numbered(5, 6, 7, 1), released, free=3))
+        items = iter(merger)
+        # More entries than max_size waiting, the oldest one is returned without waiting for the rest
+        first = next(item for item in items if item is not None)
+        self.assertEqual(first[1]['n'], 5)
+        released.set()
+        self.assertEqual(entries(items), [("a", 1), ("a", 6), ("a", 7)])
+
+    def test_source_error(self):
+        def failing():
+            yield entry(1, n=1)
+            raise ValueError("lost")
+        merger = LogMerger(window=float("inf"), max_size=float("inf"))
+        merger.add_source("a", failing())
+        errors = [item for item in merger if item is not None and isinstance(item[1], Exception)]
+        self.assertEqual([(name, str(e)) for name, e in errors], [("a", "lost")])
+
+
+class SortedLogMergerTest(unittest.TestCase):
+
+    def test_sorted_by_ts(self):
+        merger = SortedLogMerger()
+        merger.add_source("a", numbered(1, 4, 5))
+        merger.add_source("b", [None] + numbered(2, 3, 6) + [None])
+        merger.add_source("c", [])
+        self.assertEqual(entries(merger), [("a", 1), ("b", 2), ("b", 3), ("a", 4), ("a", 5), ("b", 6)])
+
+    def test_same_ts_in_source_order(self):
+        merger = SortedLogMerger()
+        merger.add_source("a", numbered(1, 1))
+        merger.add_source("b", numbered(1))
+        self.assertEqual(entries(merger), [("a", 1), ("a", 1), ("b", 1)])
+
+    def test_entries_read_when_returned(self):
+        read = []
+
+        def source(name, seconds):
+            for i in seconds:
+                read.append((name, i))
+                yield entry(i, n=i)
+        merger = SortedLogMerger()
+        merger.add_source("a", source("a", range(0, 100, 2)))
+        merger.add_source("b", source("b", range(1, 100, 2)))
+        items = iter(merger)
+        for _ in range(4):
+            next(items)
+        # Only the entries returned, and the next one of each source
+        self.assertEqual(len(read), 5)
+
+    def test_source_error(self):
+        def failing():
+            yield entry(1, n=1)
+            raise ValueError("lost")
+        merger = SortedLogMerger()
+        merger.add_source("a", failing())
+        merger.add_source("b", numbered(0, 2))
+        items = [item for item in merger if item is not None]
+        self.assertEqual([item[0] for item in items], ["b", "a", "a", "b"])
+        self.assertIsInstance(items[2][1], ValueError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+
+import unittest
+from mongotail import out
+from mongotail.out import Output
+from mongotail.mongotail import iter_cursor, tail
+from .fakes import FakeClient, FakeCursor, FakeProfileDatabase, FakeStream, FakeTime, entry
+
+
+class OutputTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeTime()
+        self._time, out.time = out.time, self.clock
+
+    def tearDown(self):
+        out.time = self._time
+
+    def test_terminal_line_buffered(self):
+        stream = FakeStream(tty=True)
+        output = Output(stream)
+        output.write("a\n")
+        output.write("b\n")
+        self.assertEqual(stream.parts, ["a\n", "b\n"])
+        self.assertEqual(stream.flushes, 2)
+
+    def test_line_buffered_option(self):
+        stream = FakeStream()
+        output = Output(stream, line_buffered=True)
+        output.write("a\n")
+        self.assertEqual(stream.parts, ["a\n"])
+        self.assertEqual(stream.flushes, 1)
+
+    def test_buffered_when_not_terminal(self):
+        stream = FakeStream()
+        output = Output(stream)
+        output.write("a\n")
+        output.write("b\n")
+        self.assertEqual(stream.parts, [])
+        output.flush()
+        self.assertEqual(stream.parts, ["a\nb\n"])
+        self.assertEqual(stream.flushes, 1)
+
+    def test_flushed_when_full(self):
+        stream = FakeStream()
+        output = Output(stream, buffer_size=10)
+        output.write("12345\n")
+        self.assertEqual(stream.parts, [])
+        output.write("67890\n")
+        self.assertEqual(stream.parts, ["12345\n67890\n"])
+
+    def test_flushed_after_interval(self):
+        stream = FakeStream()
+        output = Output(stream, flush_interval=0.2)
+        output.write("a\n")
+        self.clock.sleep(0.1)
+        output.write("b\n")
+        self.assertEqual(stream.parts, [])
+        self.clock.sleep(0.15)
+        output.write("c\n")
+        self.assertEqual(stream.parts, ["a\nb\nc\n"])
+
+    def test_empty_flush_flushes_stream(self):
+        stream = FakeStream()
+        Output(stream).flush()
+        self.assertEqual(stream.parts, [])
+        self.assertEqual(stream.flushes, 1)
+
+
+class FlushTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = FakeStream()
+        self._output, out.output = out.output, Output(self.stream)
+
+    def tearDown(self):
+        out.output = self._output
+
+    def test_flushed_when_no_more_entries(self):
+        tail(FakeClient(), FakeProfileDatabase([entry(i) for i in range(3)]), "3", False, False, None)
+        self.assertEqual(len(self.stream.parts), 1)
+        self.assertEqual(self.stream.getvalue().count("\n"), 3)
+
+    def test_flushed_after_each_batch(self):
+        tail(FakeClient(), FakeProfileDatabase([entry(i) for i in range(5)]), "ALL", False, False, None,
+             batch_size=2)
+        self.assertEqual([part.count("\n") for part in self.stream.parts], [2, 2, 1])
+
+
+class IterCursorTest(unittest.TestCase):
+
+    def test_none_when_batch_drained(self):
+        docs = [entry(i) for i in range(5)]
+        results = list(iter_cursor(FakeCursor(docs, batch_size=2)))
+        self.assertEqual(results, docs[:2] + [None] + docs[2:4] + [None] + docs[4:] + [None])
+
+    def test_none_when_empty(self):
+        self.assertEqual(list(iter_cursor(FakeCursor([]))), [None])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+import unittest
+from mongotail import sampling
+from mongotail.out import get_formatters
+from mongotail.sampling import Sampler, SUMMARY_INTERVAL
+from .fakes import FakeStream, FakeTime, entry
+
+
+class SamplerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.formatters = get_formatters("6.0.0")
+        self.stream = FakeStream()
+        self.clock = FakeTime()
+        self._time, sampling.time = sampling.time, self.clock
+
+    def tearDown(self):
+        sampling.time = self._time
+
+    def accept(self, sampler, n, seconds_between):
+        for i in range(n):
+            sampler.accept(entry(i), self.formatters)
+            self.clock.sleep(seconds_between)
+
+    def test_summary_written_while_accepting(self):
+        sampler = Sampler(max_rate=1, stream=self.stream)
+        # Entries faster than the rate, without any tick() between them
+        self.accept(sampler, int(SUMMARY_INTERVAL * 10) + 10, 0.1)
+        summary = self.stream.getvalue()
+        self.assertIn("Mongotail SAMPLING - test.users:", summary)
+        self.assertIn("over the rate", summary)
+
+    def test_no_summary_before_interval(self):
+        sampler = Sampler(max_rate=1, stream=self.stream)
+        self.accept(sampler, 10, 0.1)
+        self.assertEqual(self.stream.getvalue(), "")
+
+    def test_sample_drops_whole_shapes(self):
+        sampler = Sampler(sample=2, stream=self.stream)
+        accepted = [sampler.accept(entry(i), self.formatters) for i in range(10)]
+        # All the entries have the same shape, only the filter value changes
+        self.assertEqual(len(set(accepted)), 1)
+        self.assertEqual(sampler.counters["test.users"].seen, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#  Mongotail, Log all MongoDB queries in a "tail"able way.
+#  Copyright (C) 2015-2023 Mariano Ruiz <https://github.com/mrsarm/mongotail>
+#
+#  Author: Mariano Ruiz <mrsarm@gmail.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+
+
+
+import unittest
+from mongotail import out
+from mongotail.out import get_formatters
+from mongotail.shape import get_shape, QueryStats
+from .fakes import entry
+
+
+def find(i, filter):
+    return entry(i, command={'find': 'users', 'filter': filter})
+
+
+class ShapeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.formatters = get_formatters("6.0.0")
+
+    def tearDown(self):
+        out.json_encoder.max_bytes = None
+
+    def test_values_replaced(self):
+        self.assertEqual(get_shape(find(0, {'age': {'$gt': 18, '$lt': 65}}), self.formatters),
+                         get_shape(find(0, {'age': {'$gt': 20, '$lt': 30}}), self.formatters))
+        self.assertEqual(get_shape(find(0, {'tags': {'$in': [1, 2]}}), self.formatters),
+                         ("query", "users", '{"tags": {"$in": "?"}}'))
+        self.assertEqual(get_shape(find(0, {'name': "a"}), self.formatters),
+                         get_shape(find(1, {'name': "b"}), self.formatters))
+
+    def test_long_filters_not_cut(self):
+        # Like with --max-doc-bytes, the output is cut but not the shapes
+        out.json_encoder.max_bytes = 20
+        long_filter = dict(('field%d' % i, i) for i in range(20))
+        first = get_shape(find(0, dict(long_filter, a=1)), self.formatters)
+        second = get_shape(find(1, dict(long_filter, b=1)), self.formatters)
+        self.assertNotEqual(first, second)
+        self.assertNotIn(u"…", first[2])
+        stats = QueryStats(self.formatters)
+        stats.add(find(0, dict(long_filter, a=1)))
+        stats.add(find(1, dict(long_filter, b=1)))
+        self.assertEqual(len(stats.shapes), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()